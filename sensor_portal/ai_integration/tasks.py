@@ -4,7 +4,8 @@ from typing import Any, Dict, List, Optional, Union
 from celery import chain, chord, group, shared_task, signature
 from celery.app import Celery
 from data_models.job_handling_functions import register_job
-from data_models.models import DataFile
+from data_models.models import DataFile, DeploymentDailyFileStats
+from data_models.search_functions import update_search_documents_pks
 from django.conf import settings
 from django.db.models import CharField, QuerySet
 from django.db.models.functions import Lower
@@ -25,7 +26,7 @@ CharField.register_lookup(Lower)
 
 @app.task(name="do_ultra_inference")
 @register_job("Do Ultralytic AI model inference", "do_ultra_inference", "datafile", True,
-              default_args={"model_name": "yolov8s"})
+              default_args={"model_name": "yolov8s"}, chunked=True)
 def do_ultra_inference(
     datafile_pks: Union[int, List[int]],
     model_name: str,
@@ -198,6 +199,8 @@ def handle_ultra_results(
     through_class.objects.bulk_create(
         all_through_objs, batch_size=500, ignore_conflicts=True)
     logger.info(f"Created {len(new_observations)} observations")
+    update_search_documents_pks(set(file_objs_pks))
     # Update datafiles if human is present
-    DataFile.objects.filter(pk__in=file_objs_human_pks).update(
-        has_human=True, modified_on=timezone.now())
+    human_files = DataFile.objects.filter(pk__in=file_objs_human_pks)
+    human_files.update(has_human=True, modified_on=timezone.now())
+    DeploymentDailyFileStats.refresh(human_files)
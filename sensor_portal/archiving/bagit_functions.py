@@ -1,11 +1,12 @@
 import os
-from typing import List
+from typing import Dict, List, Optional
 
 from data_models.models import DataFile
 from utils.general import get_md5
 
 
-def bag_info_from_files(file_objs: DataFile, output_path: str) -> List[str]:
+def bag_info_from_files(file_objs: DataFile, output_path: str,
+                        checksums: Optional[Dict[str, str]] = None) -> List[str]:
     """
     Generate the necessary BagIt metadata files for a set of data files, writing them to the specified output directory.
 
@@ -16,6 +17,8 @@ def bag_info_from_files(file_objs: DataFile, output_path: str) -> List[str]:
     Args:
         file_objs (DataFile): Queryset or iterable of DataFile objects representing files to be included in the bag.
         output_path (str): Directory path where the BagIt files should be created.
+        checksums (Dict[str, str], optional): MD5 of files by relative path, if already calculated.
+            Files without a checksum are read to calculate it. Defaults to None.
 
     Returns:
         List[str]: List of absolute paths to the generated BagIt files.
@@ -35,8 +38,10 @@ def bag_info_from_files(file_objs: DataFile, output_path: str) -> List[str]:
     file_objs = file_objs.full_paths()
     all_full_paths = file_objs.values_list("full_path", flat=True)
     all_relative_paths = file_objs.values_list("relative_path", flat=True)
+    if checksums is None:
+        checksums = {}
     manifest_lines = [
-        f"{get_md5(full_path)}  {os.path.join('data', relative_path)}\n"
+        f"{checksums.get(relative_path) or get_md5(full_path)}  {os.path.join('data', relative_path)}\n"
         for full_path, relative_path in zip(all_full_paths, all_relative_paths)
     ]
     manifest_path = os.path.join(output_path, "manifest-md5.txt")
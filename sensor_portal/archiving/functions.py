@@ -3,6 +3,7 @@ import os
 import traceback
 
 from celery import chord, group
+from data_models.count_cache_functions import invalidate_file_counts_for_files
 from data_models.models import DataFile
 from django.conf import settings
 from scp import SCPException
@@ -95,7 +96,7 @@ def check_archive_upload(archive: Archive) -> None:
         tar_obj.uploading = True
         tar_obj.save()
 
-        tar_full_name = tar_obj.name + ".tar.gz"
+        tar_full_name = tar_obj.full_name
 
         upload_path = os.path.join(archive.root_folder,
                                    os.path.relpath(tar_obj.path,
@@ -132,6 +133,7 @@ def check_archive_upload(archive: Archive) -> None:
             tar_obj.archived = True
             tar_obj.path = upload_path
             tar_obj.files.update(archived=True)
+            invalidate_file_counts_for_files(tar_obj.files.all())
 
         else:
             logger.info(f"{tar_obj.name} uploading failed")
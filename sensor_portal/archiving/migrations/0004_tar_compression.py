@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archiving', '0003_remove_tarfile_comboproject_alter_tarfile_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archive',
+            name='compression',
+            field=models.CharField(choices=[('gzip', 'gzip'), ('zstd', 'zstd'), ('none', 'None')], default='gzip', help_text='Compression of new TAR files in this archive.', max_length=4),
+        ),
+        migrations.AddField(
+            model_name='archive',
+            name='compression_threads',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Number of threads used to compress new TAR files. Only used by zstd.'),
+        ),
+        migrations.AddField(
+            model_name='tarfile',
+            name='compression',
+            field=models.CharField(choices=[('gzip', 'gzip'), ('zstd', 'zstd'), ('none', 'None')], default='gzip', help_text='Compression of the TAR archive.', max_length=4),
+        ),
+    ]
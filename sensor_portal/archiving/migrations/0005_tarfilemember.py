@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 18:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0041_jobselection'),
+        ('archiving', '0004_tar_compression'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarFileMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='Path of the member inside the TAR.', max_length=500)),
+                ('offset', models.BigIntegerField(help_text='Byte offset of the compressed member in the TAR file.')),
+                ('compressed_size', models.BigIntegerField(help_text='Size in bytes of the compressed member in the TAR file.')),
+                ('header_size', models.IntegerField(help_text='Size in bytes of the TAR header before the file, once decompressed.')),
+                ('size', models.BigIntegerField(help_text='Size in bytes of the file.')),
+                ('data_file', models.ForeignKey(help_text='DataFile stored in this member, if it is not a metadata file.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tar_members', to='data_models.datafile')),
+                ('tar_file', models.ForeignKey(help_text='TAR file containing this member.', on_delete=django.db.models.deletion.CASCADE, related_name='members', to='archiving.tarfile')),
+            ],
+        ),
+    ]
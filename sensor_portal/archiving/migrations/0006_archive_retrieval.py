@@ -0,0 +1,45 @@
+# Generated by Django 4.2 on 2026-10-17 18:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0041_jobselection'),
+        ('archiving', '0005_tarfilemember'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveRetrievalRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('modified_on', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed')], default='pending', help_text='Status of this request.', max_length=10)),
+                ('callback', models.JSONField(blank=True, help_text='Celery signature to start once the files have been retrieved.', null=True)),
+                ('data_files', models.ManyToManyField(blank=True, help_text='Requested DataFiles.', related_name='archive_retrieval_requests', to='data_models.datafile')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TarRetrieval',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('modified_on', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed')], default='pending', help_text='Status of this retrieval.', max_length=10)),
+                ('data_files', models.ManyToManyField(blank=True, help_text='DataFiles to retrieve from the TAR.', related_name='tar_retrievals', to='data_models.datafile')),
+                ('requests', models.ManyToManyField(blank=True, help_text='Requests waiting on this retrieval.', related_name='tar_retrievals', to='archiving.archiveretrievalrequest')),
+                ('tar_file', models.ForeignKey(help_text='TAR file to retrieve files from.', on_delete=django.db.models.deletion.CASCADE, related_name='retrievals', to='archiving.tarfile')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='tarretrieval',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('tar_file',), name='unique_pending_tar_retrieval'),
+        ),
+    ]
@@ -2,6 +2,7 @@ import logging
 import os
 from posixpath import join as posixjoin
 
+from data_models.count_cache_functions import invalidate_file_counts_for_files
 from django.conf import settings
 from django.db import models
 from django.db.models.signals import pre_delete
@@ -15,6 +16,25 @@ from utils.ssh_client import SSH_client
 logger = logging.getLogger(__name__)
 
 
+class TarCompression(models.TextChoices):
+    GZIP = "gzip", "gzip"
+    ZSTD = "zstd", "zstd"
+    NONE = "none", "None"
+
+
+# File extension and GNU tar decompression flag of each compression
+TAR_COMPRESSION_EXTENSIONS = {
+    TarCompression.GZIP: ".tar.gz",
+    TarCompression.ZSTD: ".tar.zst",
+    TarCompression.NONE: ".tar",
+}
+TAR_COMPRESSION_FLAGS = {
+    TarCompression.GZIP: "-z",
+    TarCompression.ZSTD: "--zstd",
+    TarCompression.NONE: "",
+}
+
+
 class Archive(BaseModel):
     name = models.CharField(
         max_length=200,
@@ -47,6 +67,16 @@ class Archive(BaseModel):
         unique=True,
         help_text="Root folder path on the archive server."
     )
+    compression = models.CharField(
+        max_length=4,
+        choices=TarCompression.choices,
+        default=TarCompression.GZIP,
+        help_text="Compression of new TAR files in this archive."
+    )
+    compression_threads = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Number of threads used to compress new TAR files. Only used by zstd."
+    )
 
     def __str__(self) -> str:
         """Return the name of the archive."""
@@ -101,11 +131,30 @@ class TarFile(BaseModel):
         null=True,
         help_text="Archive to which this TAR file belongs."
     )
+    compression = models.CharField(
+        max_length=4,
+        choices=TarCompression.choices,
+        default=TarCompression.GZIP,
+        help_text="Compression of the TAR archive."
+    )
 
     def __str__(self) -> str:
         """Return the name of the TAR file."""
         return self.name
 
+    @property
+    def full_name(self) -> str:
+        """Filename of the TAR archive, with the extension of its compression."""
+        extension = TAR_COMPRESSION_EXTENSIONS[self.compression]
+        if self.name.endswith(extension):
+            return self.name
+        return self.name + extension
+
+    @property
+    def compression_flag(self) -> str:
+        """GNU tar flag to decompress the TAR archive."""
+        return TAR_COMPRESSION_FLAGS[self.compression]
+
     def clean_tar(self, delete_obj: bool = False, force_delete: bool = False) -> bool:
         """
         Remove the TAR file from storage and update the database accordingly.
@@ -124,11 +173,8 @@ class TarFile(BaseModel):
                 f"Clean TAR file {self.name} - object exists only in database")
             return True
         if self.local_storage:
-            tar_name = self.name
-            if ".tar.gz" not in tar_name:
-                tar_name = tar_name + ".tar.gz"
             tar_path = os.path.join(
-                settings.FILE_STORAGE_ROOT, self.path, tar_name)
+                settings.FILE_STORAGE_ROOT, self.path, self.full_name)
             logger.info(
                 f"Clean TAR file {self.name} - try to delete local TAR")
 
@@ -156,11 +202,12 @@ class TarFile(BaseModel):
                     f"{self.name}: Some files contained in this TAR are no longer stored locally. The remote TAR cannot be deleted.")
                 return False
             self.files.all().update(archived=False)
+            invalidate_file_counts_for_files(self.files.all())
             ssh_client = self.archive.init_ssh_client()
             ssh_connect_success = ssh_client.connect_to_ssh()
             if not ssh_connect_success:
                 return False
-            remote_path = posixjoin(self.path, self.name + ".tar.gz")
+            remote_path = posixjoin(self.path, self.full_name)
             status_code, stdout, stderr = ssh_client.send_ssh_command(
                 f"rm {remote_path}")
             if status_code != 0:
@@ -179,6 +226,123 @@ class TarFile(BaseModel):
             return False
 
 
+class TarFileMember(models.Model):
+    """
+    Position of a file inside a TAR. Members of indexed TARs are compressed independently,
+    so that a single member can be read from its offset without decompressing the rest of the TAR.
+    """
+    tar_file = models.ForeignKey(
+        TarFile,
+        related_name="members",
+        on_delete=models.CASCADE,
+        help_text="TAR file containing this member."
+    )
+    data_file = models.ForeignKey(
+        "data_models.DataFile",
+        related_name="tar_members",
+        on_delete=models.SET_NULL,
+        null=True,
+        help_text="DataFile stored in this member, if it is not a metadata file."
+    )
+    path = models.CharField(
+        max_length=500,
+        help_text="Path of the member inside the TAR."
+    )
+    offset = models.BigIntegerField(
+        help_text="Byte offset of the compressed member in the TAR file."
+    )
+    compressed_size = models.BigIntegerField(
+        help_text="Size in bytes of the compressed member in the TAR file."
+    )
+    header_size = models.IntegerField(
+        help_text="Size in bytes of the TAR header before the file, once decompressed."
+    )
+    size = models.BigIntegerField(
+        help_text="Size in bytes of the file."
+    )
+
+    def __str__(self) -> str:
+        """Return the path of the member."""
+        return self.path
+
+
+class RetrievalStatus(models.TextChoices):
+    PENDING = "pending", "Pending"
+    RUNNING = "running", "Running"
+    COMPLETE = "complete", "Complete"
+    FAILED = "failed", "Failed"
+
+
+class ArchiveRetrievalRequest(BaseModel):
+    """
+    A request for files to be retrieved from archives, such as to build a data package.
+    Its callback is started once every TarRetrieval it is waiting on has finished.
+    """
+    status = models.CharField(
+        max_length=10,
+        choices=RetrievalStatus.choices,
+        default=RetrievalStatus.PENDING,
+        help_text="Status of this request."
+    )
+    callback = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Celery signature to start once the files have been retrieved."
+    )
+    data_files = models.ManyToManyField(
+        "data_models.DataFile",
+        related_name="archive_retrieval_requests",
+        blank=True,
+        help_text="Requested DataFiles."
+    )
+
+    def __str__(self) -> str:
+        """Return a description of the request."""
+        return f"Archive retrieval request {self.pk}"
+
+
+class TarRetrieval(BaseModel):
+    """
+    A single retrieval of files from a TAR. Requests for files in the same TAR made while
+    the retrieval is pending are added to it, so that the TAR is only read once.
+    """
+    tar_file = models.ForeignKey(
+        TarFile,
+        related_name="retrievals",
+        on_delete=models.CASCADE,
+        help_text="TAR file to retrieve files from."
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=RetrievalStatus.choices,
+        default=RetrievalStatus.PENDING,
+        help_text="Status of this retrieval."
+    )
+    data_files = models.ManyToManyField(
+        "data_models.DataFile",
+        related_name="tar_retrievals",
+        blank=True,
+        help_text="DataFiles to retrieve from the TAR."
+    )
+    requests = models.ManyToManyField(
+        ArchiveRetrievalRequest,
+        related_name="tar_retrievals",
+        blank=True,
+        help_text="Requests waiting on this retrieval."
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tar_file'],
+                                    condition=models.Q(status="pending"),
+                                    name='unique_pending_tar_retrieval'),
+        ]
+
+    def __str__(self) -> str:
+        """Return a description of the retrieval."""
+        return f"Retrieval from {self.tar_file}"
+
+
 @receiver(pre_delete, sender=TarFile)
 def pre_remove_tar(sender, instance: "TarFile", **kwargs) -> None:
     """
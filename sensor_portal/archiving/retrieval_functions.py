@@ -0,0 +1,216 @@
+import logging
+from datetime import timedelta
+from typing import List, Optional
+
+from celery import chain, signature
+from celery.canvas import Signature
+from data_models.models import DataFile
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone as djtimezone
+
+from .models import ArchiveRetrievalRequest, RetrievalStatus, TarRetrieval
+
+logger = logging.getLogger(__name__)
+
+
+def plan_file_retrieval(file_pks: List[int], callback: Optional[Signature] = None) -> ArchiveRetrievalRequest:
+    """
+    Request files to be retrieved from their archives.
+
+    Files are added to the pending TarRetrieval of their TAR, which is created and scheduled to start after
+    ARCHIVE_RETRIEVAL_WINDOW seconds if there is none, so that requests made close together read each TAR once.
+    Files which are already stored locally are not retrieved again.
+
+    Args:
+        file_pks (List[int]): Primary keys of DataFiles to retrieve.
+        callback (Signature, optional): Celery task to start once all files have been retrieved.
+            Its error callbacks are started instead if any retrieval fails. Defaults to None.
+
+    Returns:
+        ArchiveRetrievalRequest: New request.
+    """
+    from .tasks import run_tar_retrieval_task
+
+    file_objs = DataFile.objects.filter(
+        pk__in=file_pks, archived=True, tar_file__isnull=False)
+    # Files already restored locally do not need to be retrieved again
+    files_to_retrieve = file_objs.filter(local_storage=False)
+
+    new_retrieval_pks = []
+    with transaction.atomic():
+        retrieval_request = ArchiveRetrievalRequest.objects.create(
+            callback=dict(callback) if callback is not None else None)
+        retrieval_request.data_files.add(
+            *file_objs.values_list('pk', flat=True))
+
+        tar_file_pks = files_to_retrieve.order_by().values_list(
+            'tar_file_id', flat=True).distinct()
+        for tar_file_pk in tar_file_pks:
+            # Lock the pending retrieval, so that it cannot start until these files are added
+            retrieval, created = TarRetrieval.objects.select_for_update().get_or_create(
+                tar_file_id=tar_file_pk, status=RetrievalStatus.PENDING)
+            if created:
+                new_retrieval_pks.append(retrieval.pk)
+            retrieval.data_files.add(*files_to_retrieve.filter(
+                tar_file_id=tar_file_pk).values_list('pk', flat=True))
+            retrieval.requests.add(retrieval_request)
+            logger.info(f"{retrieval}: added {retrieval_request}")
+
+        transaction.on_commit(lambda: [
+            run_tar_retrieval_task.apply_async([x], countdown=settings.ARCHIVE_RETRIEVAL_WINDOW)
+            for x in new_retrieval_pks])
+
+    # Nothing to wait for if all files are already local
+    check_retrieval_request(retrieval_request.pk)
+    return retrieval_request
+
+
+def start_tar_retrieval(retrieval_pk: int) -> None:
+    """
+    Start a pending TarRetrieval, extracting all of its files that are not yet stored locally in one task.
+
+    Args:
+        retrieval_pk (int): Primary key of the TarRetrieval.
+    """
+    from .tasks import (fail_tar_retrieval_task, finish_tar_retrieval_task,
+                        get_files_from_archived_tar_task)
+
+    with transaction.atomic():
+        retrieval = TarRetrieval.objects.select_for_update().get(pk=retrieval_pk)
+        if retrieval.status != RetrievalStatus.PENDING:
+            return
+        retrieval.status = RetrievalStatus.RUNNING
+        retrieval.save()
+
+    file_pks = list(retrieval.data_files.filter(
+        local_storage=False).values_list('pk', flat=True))
+    logger.info(f"{retrieval}: start with {len(file_pks)} files")
+    if len(file_pks) == 0:
+        finish_tar_retrieval(retrieval_pk, [])
+        return
+
+    retrieval_chain = chain(
+        get_files_from_archived_tar_task.si(retrieval.tar_file_id, file_pks),
+        finish_tar_retrieval_task.s(retrieval_pk)
+    ).on_error(fail_tar_retrieval_task.si(retrieval_pk))
+    retrieval_chain.apply_async()
+
+
+def finish_tar_retrieval(retrieval_pk: int, retrieved_pks: List[int], failed: bool = False) -> None:
+    """
+    Mark a TarRetrieval as finished, post-process its retrieved files, and check the requests waiting on it.
+    A retrieval which has already finished, such as one failed by sweep_tar_retrievals, keeps its status.
+
+    Args:
+        retrieval_pk (int): Primary key of the TarRetrieval.
+        retrieved_pks (List[int]): Primary keys of DataFiles retrieved.
+        failed (bool, optional): True if the retrieval failed. Defaults to False.
+    """
+    from .tasks import post_get_file_from_archive_task
+
+    with transaction.atomic():
+        retrieval = TarRetrieval.objects.select_for_update().get(pk=retrieval_pk)
+        already_finished = retrieval.status in [
+            RetrievalStatus.COMPLETE, RetrievalStatus.FAILED]
+        if not already_finished:
+            retrieval.status = RetrievalStatus.FAILED if failed else RetrievalStatus.COMPLETE
+            retrieval.save()
+    logger.info(f"{retrieval}: {retrieval.status}")
+
+    if len(retrieved_pks) > 0:
+        post_get_file_from_archive_task.si([retrieved_pks]).apply_async()
+
+    if already_finished:
+        return
+    for retrieval_request_pk in retrieval.requests.values_list('pk', flat=True):
+        check_retrieval_request(retrieval_request_pk)
+
+
+def check_retrieval_request(retrieval_request_pk: int) -> None:
+    """
+    Finish an ArchiveRetrievalRequest and start its callback, if all of its TarRetrievals have finished.
+
+    Args:
+        retrieval_request_pk (int): Primary key of the ArchiveRetrievalRequest.
+    """
+    with transaction.atomic():
+        retrieval_request = ArchiveRetrievalRequest.objects.select_for_update().get(
+            pk=retrieval_request_pk)
+        if retrieval_request.status != RetrievalStatus.PENDING:
+            return
+        retrievals = retrieval_request.tar_retrievals.all()
+        if retrievals.filter(status__in=[RetrievalStatus.PENDING, RetrievalStatus.RUNNING]).exists():
+            return
+        failed = retrievals.filter(status=RetrievalStatus.FAILED).exists()
+        retrieval_request.status = RetrievalStatus.FAILED if failed else RetrievalStatus.COMPLETE
+        retrieval_request.save()
+    logger.info(f"{retrieval_request}: {retrieval_request.status}")
+
+    if retrieval_request.callback is None:
+        return
+    callback = signature(retrieval_request.callback)
+    if failed:
+        for error_callback in callback.options.get("link_error") or []:
+            signature(error_callback).apply_async()
+    else:
+        retrieved_pks = list(retrieval_request.data_files.filter(
+            local_storage=True).values_list('pk', flat=True))
+        callback.apply_async([[retrieved_pks]])
+
+
+def sweep_tar_retrievals() -> None:
+    """
+    Recover retrievals which have stopped progressing, such as after a worker was lost.
+
+    Pending TarRetrievals older than ARCHIVE_RETRIEVAL_PENDING_TIMEOUT seconds are started again, as their start
+    task may have been lost. Running TarRetrievals not updated for ARCHIVE_RETRIEVAL_RUNNING_TIMEOUT seconds are
+    marked as failed, so that the requests waiting on them start their error callbacks.
+    Pending requests whose retrievals have all finished are then checked again.
+    """
+    from .tasks import run_tar_retrieval_task
+
+    now = djtimezone.now()
+    stale_pending_pks = list(TarRetrieval.objects.filter(
+        status=RetrievalStatus.PENDING,
+        created_on__lt=now - timedelta(seconds=settings.ARCHIVE_RETRIEVAL_PENDING_TIMEOUT)
+    ).values_list('pk', flat=True))
+    for retrieval_pk in stale_pending_pks:
+        logger.info(f"Tar retrieval {retrieval_pk}: restart stale pending retrieval")
+        run_tar_retrieval_task.apply_async([retrieval_pk])
+
+    stale_running_pks = list(TarRetrieval.objects.filter(
+        status=RetrievalStatus.RUNNING,
+        modified_on__lt=now - timedelta(seconds=settings.ARCHIVE_RETRIEVAL_RUNNING_TIMEOUT)
+    ).values_list('pk', flat=True))
+    for retrieval_pk in stale_running_pks:
+        logger.info(f"Tar retrieval {retrieval_pk}: fail stale running retrieval")
+        finish_tar_retrieval(retrieval_pk, [], failed=True)
+
+    waiting_request_pks = list(ArchiveRetrievalRequest.objects.filter(
+        status=RetrievalStatus.PENDING,
+        created_on__lt=now - timedelta(seconds=settings.ARCHIVE_RETRIEVAL_PENDING_TIMEOUT)
+    ).exclude(
+        tar_retrievals__status__in=[RetrievalStatus.PENDING, RetrievalStatus.RUNNING]
+    ).values_list('pk', flat=True))
+    for retrieval_request_pk in waiting_request_pks:
+        check_retrieval_request(retrieval_request_pk)
+
+
+def clean_finished_retrievals() -> None:
+    """
+    Delete ArchiveRetrievalRequests and TarRetrievals which finished more than ARCHIVE_RETRIEVAL_KEEP_DAYS ago,
+    along with their links to files and to each other.
+    TarRetrievals are kept while any request which has not been deleted still links to them.
+    """
+    finished_statuses = [RetrievalStatus.COMPLETE, RetrievalStatus.FAILED]
+    cutoff_dt = djtimezone.now() - timedelta(days=settings.ARCHIVE_RETRIEVAL_KEEP_DAYS)
+
+    n_total, n_requests = ArchiveRetrievalRequest.objects.filter(
+        status__in=finished_statuses, modified_on__lt=cutoff_dt).delete()
+    logger.info(
+        f"Removed {n_requests.get(ArchiveRetrievalRequest._meta.label, 0)} finished retrieval requests")
+    n_total, n_retrievals = TarRetrieval.objects.filter(
+        status__in=finished_statuses, modified_on__lt=cutoff_dt, requests__isnull=True).delete()
+    logger.info(
+        f"Removed {n_retrievals.get(TarRetrieval._meta.label, 0)} finished TAR retrievals")
@@ -1,23 +1,38 @@
+import gzip
 import logging
 import os
+import posixpath
+import stat
+import tarfile
+from contextlib import contextmanager
 from datetime import datetime
 from posixpath import join as posixjoin
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import zstandard
 from data_models.file_handling_functions import group_files_by_size
 from data_models.metadata_functions import metadata_json_from_files
 from data_models.models import DataFile
 from django.conf import settings
 from django.db.models import QuerySet
-from utils.general import (call_with_output, try_remove_file_clean_dirs,
-                           try_to_remove_dirs)
+from django.utils import timezone as djtimezone
+from utils.general import (HashingReader, divide_chunks,
+                           try_remove_file_clean_dirs, try_to_remove_dirs)
 from utils.ssh_client import SSH_client
 
 from .bagit_functions import bag_info_from_files
-from .models import Archive, TarFile
+from .models import (TAR_COMPRESSION_EXTENSIONS, Archive, TarCompression,
+                     TarFile, TarFileMember)
 
 logger = logging.getLogger(__name__)
 
+# gzip's own default level, as used by 'tar z'
+GZIP_LEVEL = 6
+# zstd's own default level
+ZSTD_LEVEL = 3
+# Bytes read from each file at a time when writing it into a TAR
+COPY_BUFFER_SIZE = 1024 * 1024
+
 
 def create_tar_files(file_pks: List[int], archive_pk: int) -> None:
     """
@@ -59,8 +74,8 @@ def create_tar_file_and_obj(
     Returns:
         bool: True if tar file creation succeeded, False otherwise.
     """
-    success, tar_name, full_tar_path = create_tar_file(
-        file_objs, name_suffix)
+    success, tar_name, full_tar_path, members = create_tar_file(
+        file_objs, name_suffix, archive_obj.compression, archive_obj.compression_threads)
     if not success:
         # Free data file objects
         file_objs.update(tar_file=None)
@@ -69,7 +84,10 @@ def create_tar_file_and_obj(
         new_tar_obj = TarFile.objects.create(
             name=tar_name,
             path=os.path.split(full_tar_path)[0],
-            archive=archive_obj)
+            archive=archive_obj,
+            compression=archive_obj.compression)
+        TarFileMember.objects.bulk_create(
+            [TarFileMember(tar_file=new_tar_obj, **x) for x in members], batch_size=5000)
         file_objs.update(tar_file=new_tar_obj)
         return True
 
@@ -126,23 +144,167 @@ def get_tar_name(file_objs: QuerySet, suffix: int = 0) -> str:
     return tar_name
 
 
+class SeekableTarWriter():
+    """
+    Writes a TAR in which every member is compressed independently, as its own gzip member or zstd frame.
+    The result is still a valid compressed TAR that tar can extract as a whole, but each member can also be
+    decompressed on its own from its offset in the file. The position of each member is kept in `members`.
+    """
+
+    def __init__(self, fileobj: Any, compression: str = TarCompression.GZIP, compression_threads: int = 1) -> None:
+        """
+        Args:
+            fileobj (Any): Binary file object to write the TAR to.
+            compression (str, optional): TarCompression of the TAR. Defaults to gzip.
+            compression_threads (int, optional): Number of threads used to compress with zstd. Defaults to 1.
+        """
+        self.fileobj = fileobj
+        self.compression = compression
+        self.members: List[Dict[str, Any]] = []
+        self._uncompressed_size = 0
+        if compression == TarCompression.ZSTD:
+            # zstd compresses on worker threads while this thread reads the files
+            self._zstd_compressor = zstandard.ZstdCompressor(
+                level=ZSTD_LEVEL, threads=compression_threads)
+
+    @contextmanager
+    def _frame(self) -> Iterator[Any]:
+        if self.compression == TarCompression.GZIP:
+            with gzip.GzipFile(filename="", mode="wb", compresslevel=GZIP_LEVEL,
+                               fileobj=self.fileobj, mtime=0) as frame:
+                yield frame
+        elif self.compression == TarCompression.ZSTD:
+            with self._zstd_compressor.stream_writer(self.fileobj, closefd=False) as frame:
+                yield frame
+        else:
+            yield self.fileobj
+
+    def add_file(self, full_path: str, arcname: str, data_file_id: Optional[int] = None) -> str:
+        """
+        Stream a file into the TAR as a new member, calculating its MD5 from the same read.
+
+        Args:
+            full_path (str): Path of the file on disk.
+            arcname (str): Path of the file inside the TAR.
+            data_file_id (int, optional): Primary key of the DataFile stored in this member. Defaults to None.
+
+        Returns:
+            str: MD5 of the file.
+        """
+        file_stat = os.stat(full_path)
+        tar_info = tarfile.TarInfo(arcname)
+        tar_info.size = file_stat.st_size
+        tar_info.mtime = int(file_stat.st_mtime)
+        tar_info.mode = stat.S_IMODE(file_stat.st_mode)
+        tar_info.uid = file_stat.st_uid
+        tar_info.gid = file_stat.st_gid
+        header = tar_info.tobuf(tarfile.GNU_FORMAT, tarfile.ENCODING, "surrogateescape")
+        padding = -tar_info.size % tarfile.BLOCKSIZE
+
+        offset = self.fileobj.tell()
+        with open(full_path, "rb") as f, self._frame() as frame:
+            reader = HashingReader(f)
+            frame.write(header)
+            remaining = tar_info.size
+            while remaining > 0:
+                chunk = reader.read(min(COPY_BUFFER_SIZE, remaining))
+                if not chunk:
+                    raise OSError(f"{full_path} changed size while being archived")
+                frame.write(chunk)
+                remaining -= len(chunk)
+            frame.write(tarfile.NUL * padding)
+        self._uncompressed_size += len(header) + tar_info.size + padding
+
+        self.members.append({
+            "path": arcname,
+            "data_file_id": data_file_id,
+            "offset": offset,
+            "compressed_size": self.fileobj.tell() - offset,
+            "header_size": len(header),
+            "size": tar_info.size,
+        })
+        return reader.hexdigest()
+
+    def close(self) -> None:
+        """
+        Write the end of the TAR, two empty blocks padded to a whole record as tar does.
+        """
+        end_size = 2 * tarfile.BLOCKSIZE
+        end_size += -(self._uncompressed_size + end_size) % tarfile.RECORDSIZE
+        with self._frame() as frame:
+            frame.write(tarfile.NUL * end_size)
+
+
+def read_tar_member(tar_fileobj: Any, member: TarFileMember, compression: str, output_fileobj: Any) -> None:
+    """
+    Decompress a single member of a TAR written by SeekableTarWriter, and write its file to output_fileobj.
+    Only the compressed bytes of this member are read.
+
+    Args:
+        tar_fileobj (Any): Seekable binary file object of the TAR, such as an SFTP file.
+        member (TarFileMember): Member to read.
+        compression (str): TarCompression of the TAR.
+        output_fileobj (Any): Binary file object to write the member's file to.
+    """
+    tar_fileobj.seek(member.offset)
+    if compression == TarCompression.GZIP:
+        frame = gzip.GzipFile(fileobj=tar_fileobj, mode="rb")
+    elif compression == TarCompression.ZSTD:
+        frame = zstandard.ZstdDecompressor().stream_reader(
+            tar_fileobj, read_across_frames=False, closefd=False)
+    else:
+        frame = tar_fileobj
+
+    # Skip the TAR header, then copy the file
+    for n_bytes, output in [(member.header_size, None), (member.size, output_fileobj)]:
+        while n_bytes > 0:
+            chunk = frame.read(min(COPY_BUFFER_SIZE, n_bytes))
+            if not chunk:
+                raise EOFError(f"{member.path}: unexpected end of TAR")
+            if output is not None:
+                output.write(chunk)
+            n_bytes -= len(chunk)
+
+
+def tar_data_path(relative_path: str) -> str:
+    """
+    Get the path of a data file inside a TAR, under the 'data' directory of the bag.
+
+    Args:
+        relative_path (str): Path of the file relative to the file storage root.
+
+    Returns:
+        str: Path inside the TAR.
+    """
+    return posixjoin("data", posixpath.normpath(relative_path).lstrip("/"))
+
+
 def create_tar_file(
     file_objs: QuerySet,
-    name_suffix: int = 0
-) -> Tuple[bool, str, Optional[str]]:
+    name_suffix: int = 0,
+    compression: str = TarCompression.GZIP,
+    compression_threads: int = 1
+) -> Tuple[bool, str, Optional[str], List[Dict[str, Any]]]:
     """
-    Create a tar.gz archive for the given files, add metadata, and clean up.
+    Create a TAR archive for the given files, add metadata, and clean up.
+
+    Each file is read once, and streamed into the TAR while its checksum for the BagIt manifest is calculated.
+    The BagIt tag files and metadata.json are added at the root of the TAR once all files are written.
+    Each member is compressed independently, so that it can later be retrieved on its own.
 
     Args:
         file_objs (QuerySet): QuerySet of DataFile objects to be archived.
         name_suffix (int, optional): Suffix for the tar file name.
+        compression (str, optional): TarCompression of the TAR. Defaults to gzip.
+        compression_threads (int, optional): Number of threads used to compress with zstd. Defaults to 1.
 
     Returns:
-        Tuple[bool, str, Optional[str]]: (Success status, tar file name, full tar file path if successful, else None)
+        Tuple[bool, str, Optional[str], List[Dict[str, Any]]]: (Success status, tar file name,
+            full tar file path if successful, else None, position of each member in the TAR)
     """
     # get TAR name
     tar_name = get_tar_name(file_objs, name_suffix)
-    tar_name_format = tar_name+".tar.gz"
+    tar_name_format = tar_name+TAR_COMPRESSION_EXTENSIONS[compression]
 
     device_type = file_objs.device_type().values_list(
         "device_type", flat=True).first().replace(" ", "")
@@ -153,40 +315,40 @@ def create_tar_file(
                             datetime.now().strftime("%Y%m%d"))
     os.makedirs(tar_path, exist_ok=True)
     full_tar_path = os.path.join(tar_path, tar_name_format)
-    # get list of file paths
-    relative_paths = list(file_objs.relative_paths(
-    ).values_list("relative_path", flat=True))
 
     metadata_dir_path = os.path.join(tar_path, tar_name)
-    relative_metadata_dir_path = os.path.relpath(
-        metadata_dir_path, settings.FILE_STORAGE_ROOT)
 
-    # Generate bagit metadata
     all_metadata_paths = []
+    members = []
     try:
-        logger.info(f"{tar_name}: generating bagit data")
-        all_metadata_paths = bag_info_from_files(file_objs, metadata_dir_path)
-
-        logger.info(f"{tar_name}: generating metadata file")
-        # Generate metadata file
-        metadata_json_path = metadata_json_from_files(
-            file_objs, metadata_dir_path)
-
-        all_metadata_paths.append(metadata_json_path)
-
-        relative_metadata_paths = [os.path.relpath(
-            x, settings.FILE_STORAGE_ROOT) for x in all_metadata_paths]
-
         logger.info(f"{tar_name}: generating TAR file")
-        # Use transform command to generate data dir inside the TAR, move metadata files to root
-        tar_command = ["tar", "zcvf", full_tar_path,
-                       "--transform", f"s,^,data/,;s,data/{relative_metadata_dir_path}/,,",] + relative_paths + relative_metadata_paths
-        success, output = call_with_output(
-            tar_command, settings.FILE_STORAGE_ROOT)
+        with open(full_tar_path, "wb") as f:
+            tar = SeekableTarWriter(f, compression, compression_threads)
+            checksums = {}
+            for pk, full_path, relative_path in file_objs.full_paths().values_list(
+                    "pk", "full_path", "relative_path").iterator():
+                checksums[relative_path] = tar.add_file(
+                    full_path, tar_data_path(relative_path), pk)
+
+            logger.info(f"{tar_name}: generating bagit data")
+            all_metadata_paths = bag_info_from_files(
+                file_objs, metadata_dir_path, checksums)
+
+            logger.info(f"{tar_name}: generating metadata file")
+            # Generate metadata file
+            metadata_json_path = metadata_json_from_files(
+                file_objs, metadata_dir_path)
+            all_metadata_paths.append(metadata_json_path)
+
+            # Metadata files go at the root of the TAR
+            for metadata_path in all_metadata_paths:
+                tar.add_file(metadata_path, os.path.basename(metadata_path))
+            tar.close()
+        members = tar.members
+        success = True
 
     except Exception as e:
         logger.error(e)
-        output = ""
         success = False
 
     # regardless of status, we remove the metadata files
@@ -195,10 +357,167 @@ def create_tar_file(
 
     if not success:
         logger.error(f"{tar_name}: Error creating TAR")
-        logger.error(output)
-        return False, tar_name, None
+        if os.path.exists(full_tar_path):
+            try_remove_file_clean_dirs(full_tar_path)
+        return False, tar_name, None, []
     logger.info(f"{tar_name}: succesfully created")
-    return True, tar_name, full_tar_path
+    return True, tar_name, full_tar_path, members
+
+
+def get_files_from_tar_members(
+    ssh_client: SSH_client,
+    tar_file_obj: TarFile,
+    tar_path: str,
+    members: QuerySet
+) -> Tuple[List[DataFile], List[int]]:
+    """
+    Copy files from an indexed remote TAR to local storage, reading only the bytes of their members over SFTP.
+
+    Args:
+        ssh_client (SSH_client): SSH client with an open SFTP connection.
+        tar_file_obj (TarFile): TarFile containing the files.
+        tar_path (str): Path of the TAR on the remote system.
+        members (QuerySet): TarFileMembers of the files to retrieve.
+
+    Returns:
+        Tuple[List[DataFile], List[int]]: DataFiles now stored locally, and their primary keys.
+    """
+    file_objs_to_update: List[DataFile] = []
+    all_pks: List[int] = []
+    with ssh_client.ftp_sftp.open(tar_path, "rb", bufsize=COPY_BUFFER_SIZE) as tar_fileobj:
+        for member in members.select_related("data_file").order_by("offset"):
+            file_obj = member.data_file
+            try:
+                local_dir = os.path.join(settings.FILE_STORAGE_ROOT, file_obj.path)
+                os.makedirs(local_dir, exist_ok=True)
+                local_file_path = os.path.join(
+                    local_dir, file_obj.file_name + file_obj.file_format)
+                if not os.path.exists(local_file_path):
+                    # Write to a temporary name, so that a failed read does not leave a partial file
+                    partial_file_path = local_file_path + ".part"
+                    with open(partial_file_path, "wb") as output_fileobj:
+                        read_tar_member(tar_fileobj, member,
+                                        tar_file_obj.compression, output_fileobj)
+                    os.replace(partial_file_path, local_file_path)
+
+                # Mark file as locally available and update metadata
+                file_obj.modified_on = djtimezone.now()
+                file_obj.local_path = settings.FILE_STORAGE_ROOT
+                file_obj.local_storage = True
+                file_objs_to_update.append(file_obj)
+                all_pks.append(file_obj.pk)
+            except Exception as e:
+                # Log and continue on any per-file errors
+                logger.info(f"{tar_path}: Error retrieving file: {repr(e)}")
+    return file_objs_to_update, all_pks
+
+
+def extract_files_from_tar(
+    ssh_client: SSH_client,
+    tar_file_obj: TarFile,
+    tar_path: str,
+    file_objs: QuerySet,
+    temp_path: str
+) -> Tuple[List[DataFile], List[int]]:
+    """
+    Copy files from a remote TAR without a member index to local storage, by listing and extracting the TAR
+    on the remote system and copying the extracted files over SCP.
+
+    Args:
+        ssh_client (SSH_client): SSH client with an open SFTP connection.
+        tar_file_obj (TarFile): TarFile containing the files.
+        tar_path (str): Path of the TAR on the remote system.
+        file_objs (QuerySet): DataFiles to retrieve.
+        temp_path (str): Temporary directory on the remote system to extract files to.
+
+    Returns:
+        Tuple[List[DataFile], List[int]]: DataFiles now stored locally, and their primary keys.
+    """
+    file_names = file_objs.full_names().values_list("full_name", flat=True)
+
+    ssh_client.mkdir_p(temp_path)
+
+    # List files inside the TAR to locate the desired files
+    status_code, stdout, stderr = ssh_client.send_ssh_command(
+        f"tar {tar_file_obj.compression_flag} -tvf {tar_path}", return_strings=False)
+    logger.info(f"{tar_path}: List files in TAR")
+
+    in_tar_file_paths: List[str] = []
+    in_tar_found_files: List[Any] = []
+    for file_line in stdout:
+        # Parse each line of tar output to extract the file path
+        split_file_line = file_line.split(" ")
+        line_file_path = split_file_line[-1].replace("\n", "")
+        # Check if this is one of our requested files
+        found_file_paths = [x for x in file_names if x in line_file_path]
+        if len(found_file_paths) > 0:
+            in_tar_file_paths.append(line_file_path)
+            in_tar_found_files.append(found_file_paths[0])
+            logger.info(
+                f"{tar_path}: {len(in_tar_file_paths)}/{len(file_names)}")
+        if len(in_tar_file_paths) == len(file_names):
+            # Stop early if all target files found
+            logger.info(f"{tar_path}: All files_found")
+            break
+
+    if len(in_tar_file_paths) == 0:
+        # None of the requested files were found in the TAR archive
+        raise Exception(f"{tar_path}: No files found in TAR")
+    else:
+        # Log any requested files not found in the archive
+        missing_files = [x for x in file_names if x not in in_tar_found_files]
+        if len(missing_files) > 0:
+            logger.info(f"{tar_path}: Files not found: {missing_files}")
+
+    # Extract files in manageable chunks to avoid command length limits
+    chunked_in_tar_file_paths = [
+        x for x in divide_chunks(in_tar_file_paths, 500)]
+    for idx, in_tar_file_paths_set in enumerate(chunked_in_tar_file_paths):
+        logger.info(
+            f"{tar_path}: Extract file chunk {idx}/{len(chunked_in_tar_file_paths)}")
+        combined_in_tar_file_paths = (
+            " ".join([f"'{x}'" for x in in_tar_file_paths_set]))
+        status_code, stdout, stderr = ssh_client.send_ssh_command(
+            f"tar {tar_file_obj.compression_flag} -xvf {tar_path} -C {temp_path} {combined_in_tar_file_paths}")
+        logger.info(
+            f"{tar_path}: Extract file chunk {idx}/{len(chunked_in_tar_file_paths)} {status_code}")
+
+    # Connect to SCP for file transfer from archive to local storage
+    ssh_client.connect_to_scp()
+    file_objs_to_update: List[DataFile] = []
+    all_pks: List[int] = []
+    for idx, in_tar_file_path in enumerate(in_tar_file_paths):
+        try:
+            full_file_name = os.path.split(in_tar_file_path)[1]
+            file_name = os.path.splitext(full_file_name)[0]
+            # Get the corresponding DataFile object
+            file_obj = file_objs.get(file_name=file_name)
+            # Prepare the local storage directory
+            local_dir = os.path.join(settings.FILE_STORAGE_ROOT, file_obj.path)
+            os.makedirs(local_dir, exist_ok=True)
+            local_file_path = os.path.join(local_dir, full_file_name)
+
+            temp_file_path = posixjoin(temp_path, in_tar_file_path)
+            if not os.path.exists(local_file_path):
+                # Transfer file from archive temp path to local storage
+                ssh_client.scp_c.get(
+                    temp_file_path, local_file_path, preserve_times=True)
+
+            # Mark file as locally available and update metadata
+            file_obj.modified_on = djtimezone.now()
+            file_obj.local_path = settings.FILE_STORAGE_ROOT
+            file_obj.local_storage = True
+            file_objs_to_update.append(file_obj)
+            all_pks.append(file_obj.pk)
+        except Exception as e:
+            # Log and continue on any per-file errors
+            logger.info(f"{tar_path}: Error retrieving file: {repr(e)}")
+
+    logger.info(f"{tar_path}: Clear temporary files")
+    # Remove temporary extraction files from the archive server
+    status_code, stdout, stderr = ssh_client.send_ssh_command(
+        f"rm -rf {temp_path}")
+    return file_objs_to_update, all_pks
 
 
 def check_tar_status(
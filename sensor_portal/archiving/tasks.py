@@ -4,19 +4,23 @@ import subprocess
 from posixpath import join as posixjoin
 from typing import Any, Callable, List, Optional
 
-from celery import chord, group, shared_task
+from celery import shared_task
+from data_models.count_cache_functions import invalidate_file_counts_for_files
 from data_models.job_handling_functions import register_job
 from data_models.models import DataFile, TarFile
 from django.conf import settings
-from django.utils import timezone as djtimezone
-from utils.general import call_with_output, divide_chunks
-from utils.task_functions import TooManyTasks, check_simultaneous_tasks
+from utils.general import call_with_output
+from utils.task_functions import TooManyTasks, limit_concurrency
 
 from sensor_portal.celery import app
 
 from .exceptions import TAROffline
-from .models import Archive
-from .tar_functions import check_tar_status, create_tar_files
+from .models import Archive, TarFileMember
+from .retrieval_functions import (clean_finished_retrievals,
+                                  finish_tar_retrieval, plan_file_retrieval,
+                                  start_tar_retrieval, sweep_tar_retrievals)
+from .tar_functions import (check_tar_status, create_tar_files,
+                            extract_files_from_tar, get_files_from_tar_members)
 
 logger = logging.getLogger(__name__)
 
@@ -81,42 +85,59 @@ def check_archive_upload_task(archive_pk: int) -> None:
 @app.task()
 def get_files_from_archive_task(file_pks: List[int], callback: Optional[Callable] = None) -> None:
     """
-    For a list of DataFile PKs, orchestrate their retrieval from archives using Celery groups and chords.
+    For a list of DataFile PKs, request their retrieval from archives.
+    Requests for files in the same TAR made within ARCHIVE_RETRIEVAL_WINDOW seconds are combined,
+    so that each TAR is only read once.
 
     Args:
         file_pks (List[int]): Primary keys of files to retrieve.
         callback (Optional[Callable]): Optional callback task to run after retrieval.
     """
-    # Filter for only archived files matching the provided PKs
-    file_objs = DataFile.objects.filter(pk__in=file_pks, archived=True)
-
-    logger.info("Get TAR files")
-
-    # Get unique TAR files containing these files
-    tar_file_objs = TarFile.objects.filter(
-        pk__in=file_objs.values_list('tar_file__pk', flat=True).distinct())
-    tar_file_pks = list(tar_file_objs.values_list('pk', flat=True))
-
-    all_tasks = []
-    # For each TAR, create an async job for its files
-    for tar_file_pk in tar_file_pks:
-        target_file_pks = list(file_objs.filter(
-            tar_file__pk=tar_file_pk).values_list('pk', flat=True))
-        logger.info(f"TAR {tar_file_pk} has {len(target_file_pks)} files")
-        all_tasks.append(get_files_from_archived_tar_task.si(
-            tar_file_pk, target_file_pks))
-
-    task_group = group(all_tasks)  # Celery group for parallel execution
-
-    # Callback tasks to run after all file retrieval jobs
-    post_tasks = [post_get_file_from_archive_task.s()]
-    if callback is not None:
-        post_tasks.append(callback)
-    post_task_group = group(post_tasks)
-    # Chord schedules post-tasks after all group tasks
-    task_chord = chord(task_group, post_task_group)
-    logger.info("Start unarchiving tasks")
-    task_chord.apply_async()
+    retrieval_request = plan_file_retrieval(file_pks, callback)
+    logger.info(f"Requested unarchiving: {retrieval_request}")
+
+
+@app.task()
+def run_tar_retrieval_task(retrieval_pk: int) -> None:
+    """
+    Start retrieving the files of a pending TarRetrieval.
+
+    Args:
+        retrieval_pk (int): Primary key of the TarRetrieval.
+    """
+    start_tar_retrieval(retrieval_pk)
+
+
+@app.task()
+def finish_tar_retrieval_task(retrieved_pks: List[int], retrieval_pk: int) -> None:
+    """
+    Finish a TarRetrieval after its files have been retrieved.
+
+    Args:
+        retrieved_pks (List[int]): Primary keys of retrieved files, returned by get_files_from_archived_tar_task.
+        retrieval_pk (int): Primary key of the TarRetrieval.
+    """
+    finish_tar_retrieval(retrieval_pk, retrieved_pks)
+
+
+@app.task()
+def fail_tar_retrieval_task(retrieval_pk: int) -> None:
+    """
+    Mark a TarRetrieval as failed.
+
+    Args:
+        retrieval_pk (int): Primary key of the TarRetrieval.
+    """
+    finish_tar_retrieval(retrieval_pk, [], failed=True)
+
+
+@app.task()
+def sweep_tar_retrievals_task() -> None:
+    """
+    Restart or fail stale TarRetrievals, and remove retrievals and requests which finished long enough ago.
+    """
+    sweep_tar_retrievals()
+    clean_finished_retrievals()
 
 
 @app.task()
@@ -170,6 +191,7 @@ def post_get_file_from_archive_task(all_file_pks: List[List[int]]) -> None:
           retry_backoff_max=60 * 60,
           retry_jitter=True,
           bind=True)
+@limit_concurrency(4)
 def get_files_from_archived_tar_task(self: Any, tar_file_pk: int, target_file_pks: List[int]) -> List[int]:
     """
     Retrieve specified files from a TAR archive, handling staging, extraction, and local placement.
@@ -182,12 +204,8 @@ def get_files_from_archived_tar_task(self: Any, tar_file_pk: int, target_file_pk
     Returns:
         List[int]: Primary keys of successfully retrieved DataFile objects.
     """
-    # Limit the number of simultaneous tasks of this type to avoid overloading resources
-    check_simultaneous_tasks(self, 4)
-
     tar_file_obj = TarFile.objects.get(pk=tar_file_pk)
     file_objs = DataFile.objects.filter(pk__in=target_file_pks)
-    file_names = file_objs.full_names().values_list("full_name", flat=True)
 
     # Connect to the archive server via SSH
     archive_obj = tar_file_obj.archive
@@ -195,17 +213,14 @@ def get_files_from_archived_tar_task(self: Any, tar_file_pk: int, target_file_pk
 
     # Try to locate the compressed TAR file first
 
-    tar_name = tar_file_obj.name
-
-    if not tar_name.endswith('.tar.gz'):
-        tar_name = tar_file_obj.name + '.tar.gz'
+    tar_name = tar_file_obj.full_name
     tar_path = posixjoin(tar_file_obj.path, tar_name)
 
     # Check if the TAR file is online or needs to be staged from tape
     status_code, target_tar_status = check_tar_status(ssh_client, tar_path)
     logger.info(f"{tar_path}: Get TAR status {status_code}")
 
-    # If not found, try without .tar.gz extension
+    # If not found, try without extension
     if status_code == 1:
         tar_name = tar_file_obj.name
         tar_path = posixjoin(tar_file_obj.path, tar_name)
@@ -239,96 +254,27 @@ def get_files_from_archived_tar_task(self: Any, tar_file_pk: int, target_file_pk
     else:
         initial_offline = False
 
-    # Create a temporary extraction directory for this job
-    temp_path = posixjoin(tar_file_obj.path, "temp", self.request.id)
     ftp_connection_success = ssh_client.connect_to_ftp()
     if not ftp_connection_success:
         raise Exception("Unable to connect to FTP")
 
-    ssh_client.mkdir_p(temp_path)
-
-    # List files inside the TAR to locate the desired files
-    status_code, stdout, stderr = ssh_client.send_ssh_command(
-        f"tar tvf {tar_path}", return_strings=False)
-    logger.info(f"{tar_path}: List files in TAR")
-
-    in_tar_file_paths: List[str] = []
-    in_tar_found_files: List[Any] = []
-    for file_line in stdout:
-        # Parse each line of tar output to extract the file path
-        split_file_line = file_line.split(" ")
-        line_file_path = split_file_line[-1].replace("\n", "")
-        # Check if this is one of our requested files
-        found_file_paths = [x for x in file_names if x in line_file_path]
-        if len(found_file_paths) > 0:
-            in_tar_file_paths.append(line_file_path)
-            in_tar_found_files.append(found_file_paths[0])
-            logger.info(
-                f"{tar_path}: {len(in_tar_file_paths)}/{len(file_names)}")
-        if len(in_tar_file_paths) == len(file_names):
-            # Stop early if all target files found
-            logger.info(f"{tar_path}: All files_found")
-            break
-
-    if len(in_tar_file_paths) == 0:
-        # None of the requested files were found in the TAR archive
-        raise Exception(f"{tar_path}: No files found in TAR")
+    indexed_members = TarFileMember.objects.filter(
+        tar_file=tar_file_obj, data_file__in=file_objs)
+    if indexed_members.exists():
+        # Read just the members of these files from the TAR
+        logger.info(f"{tar_path}: Read indexed files")
+        file_objs_to_update, all_pks = get_files_from_tar_members(
+            ssh_client, tar_file_obj, tar_path, indexed_members)
     else:
-        # Log any requested files not found in the archive
-        missing_files = [x for x in file_names if x not in in_tar_found_files]
-        if len(missing_files) > 0:
-            logger.info(f"{tar_path}: Files not found: {missing_files}")
-
-    # Extract files in manageable chunks to avoid command length limits
-    chunked_in_tar_file_paths = [
-        x for x in divide_chunks(in_tar_file_paths, 500)]
-    for idx, in_tar_file_paths_set in enumerate(chunked_in_tar_file_paths):
-        logger.info(
-            f"{tar_path}: Extract file chunk {idx}/{len(chunked_in_tar_file_paths)}")
-        combined_in_tar_file_paths = (
-            " ".join([f"'{x}'" for x in in_tar_file_paths_set]))
-        status_code, stdout, stderr = ssh_client.send_ssh_command(
-            f"tar -zxvf {tar_path} -C {temp_path} {combined_in_tar_file_paths}")
-        logger.info(
-            f"{tar_path}: Extract file chunk {idx}/{len(chunked_in_tar_file_paths)} {status_code}")
-
-    # Connect to SCP for file transfer from archive to local storage
-    ssh_client.connect_to_scp()
-    file_objs_to_update: List[DataFile] = []
-    all_pks: List[int] = []
-    for idx, in_tar_file_path in enumerate(in_tar_file_paths):
-        try:
-            full_file_name = os.path.split(in_tar_file_path)[1]
-            file_name = os.path.splitext(full_file_name)[0]
-            # Get the corresponding DataFile object
-            file_obj = file_objs.get(file_name=file_name)
-            # Prepare the local storage directory
-            local_dir = os.path.join(settings.FILE_STORAGE_ROOT, file_obj.path)
-            os.makedirs(local_dir, exist_ok=True)
-            local_file_path = os.path.join(local_dir, full_file_name)
-
-            temp_file_path = posixjoin(temp_path, in_tar_file_path)
-            if not os.path.exists(local_file_path):
-                # Transfer file from archive temp path to local storage
-                ssh_client.scp_c.get(
-                    temp_file_path, local_file_path, preserve_times=True)
-
-            # Mark file as locally available and update metadata
-            file_obj.modified_on = djtimezone.now()
-            file_obj.local_path = settings.FILE_STORAGE_ROOT
-            file_obj.local_storage = True
-            file_objs_to_update.append(file_obj)
-            all_pks.append(file_obj.pk)
-        except Exception as e:
-            # Log and continue on any per-file errors
-            logger.info(f"{tar_path}: Error retrieving file: {repr(e)}")
+        # Create a temporary extraction directory for this job
+        temp_path = posixjoin(tar_file_obj.path, "temp", self.request.id)
+        file_objs_to_update, all_pks = extract_files_from_tar(
+            ssh_client, tar_file_obj, tar_path, file_objs, temp_path)
+
     logger.info(f"{tar_path}: Update database")
     DataFile.objects.bulk_update(file_objs_to_update, fields=[
                                  "local_path", "local_storage", "modified_on"])
-    logger.info(f"{tar_path}: Clear temporary files")
-    # Remove temporary extraction files from the archive server
-    status_code, stdout, stderr = ssh_client.send_ssh_command(
-        f"rm -rf {temp_path}")
+    invalidate_file_counts_for_files(DataFile.objects.filter(pk__in=all_pks))
 
     ssh_client.close_connection()
 
@@ -0,0 +1,229 @@
+from datetime import timedelta
+
+import archiving.tasks as archiving_tasks
+import pytest
+from archiving.models import (ArchiveRetrievalRequest, RetrievalStatus,
+                             TarFile, TarRetrieval)
+from archiving.retrieval_functions import (clean_finished_retrievals,
+                                           finish_tar_retrieval,
+                                           plan_file_retrieval,
+                                           sweep_tar_retrievals)
+from celery import signature
+from celery.canvas import Signature
+from data_models.factories import DataFileFactory, DeploymentFactory
+from data_models.models import DataFile
+from django.utils import timezone as djtimezone
+from utils.general import try_remove_file_clean_dirs
+
+
+@pytest.fixture
+def sent_tasks(monkeypatch):
+    """
+    Record tasks started by retrievals, rather than sending them to the broker.
+    """
+    sent = []
+
+    def apply_async(self, args=None, kwargs=None, **options):
+        sent.append((self.task, list(args or []) + list(self.args)))
+    monkeypatch.setattr(Signature, "apply_async", apply_async)
+
+    def run_tar_retrieval_apply_async(args=None, kwargs=None, **options):
+        sent.append((archiving_tasks.run_tar_retrieval_task.name, list(args or [])))
+    monkeypatch.setattr(archiving_tasks.run_tar_retrieval_task,
+                        "apply_async", run_tar_retrieval_apply_async)
+    return sent
+
+
+def create_archived_files(tar_file, n_files, local_storage=False):
+    """
+    Create DataFiles which have been archived in tar_file.
+    """
+    deployment = DeploymentFactory()
+    data_files = [DataFileFactory(deployment=deployment) for i in range(n_files)]
+    DataFile.objects.filter(pk__in=[x.pk for x in data_files]).update(
+        archived=True, local_storage=local_storage, tar_file=tar_file)
+    return data_files
+
+
+def remove_files(data_files):
+    for data_file in data_files:
+        try_remove_file_clean_dirs(data_file.full_path())
+
+
+@pytest.mark.django_db
+def test_plan_file_retrieval_merge(sent_tasks):
+    """
+    Test: Are requests for files in the same TAR added to a single pending retrieval?
+    """
+    tar_file = TarFile.objects.create(name="test_tar")
+    other_tar_file = TarFile.objects.create(name="other_test_tar")
+    data_files = create_archived_files(tar_file, 2)
+    other_data_files = create_archived_files(other_tar_file, 1)
+
+    request_1 = plan_file_retrieval([data_files[0].pk])
+    request_2 = plan_file_retrieval(
+        [data_files[1].pk, other_data_files[0].pk])
+
+    retrieval = TarRetrieval.objects.get(tar_file=tar_file)
+    assert retrieval.status == RetrievalStatus.PENDING
+    assert set(retrieval.data_files.values_list("pk", flat=True)) == {
+        x.pk for x in data_files}
+    assert set(retrieval.requests.all()) == {request_1, request_2}
+
+    other_retrieval = TarRetrieval.objects.get(tar_file=other_tar_file)
+    assert list(other_retrieval.requests.all()) == [request_2]
+    assert request_1.status == RetrievalStatus.PENDING
+    assert request_2.status == RetrievalStatus.PENDING
+
+    remove_files(data_files + other_data_files)
+
+
+@pytest.mark.django_db
+def test_plan_file_retrieval_local_files(sent_tasks):
+    """
+    Test: Are files already restored locally left out of retrievals, and is a request for only these files
+    finished straight away?
+    """
+    tar_file = TarFile.objects.create(name="test_tar")
+    local_files = create_archived_files(tar_file, 1, local_storage=True)
+    remote_files = create_archived_files(tar_file, 1)
+
+    retrieval_request = plan_file_retrieval(
+        [local_files[0].pk, remote_files[0].pk], signature("test_callback"))
+    assert set(retrieval_request.data_files.all()) == set(
+        local_files + remote_files)
+    retrieval = retrieval_request.tar_retrievals.get()
+    assert list(retrieval.data_files.all()) == remote_files
+    assert sent_tasks == []
+
+    local_request = plan_file_retrieval(
+        [local_files[0].pk], signature("test_callback"))
+    local_request.refresh_from_db()
+    assert not local_request.tar_retrievals.exists()
+    assert local_request.status == RetrievalStatus.COMPLETE
+    assert sent_tasks == [("test_callback", [[[local_files[0].pk]]])]
+
+    remove_files(local_files + remote_files)
+
+
+@pytest.mark.django_db
+def test_finish_tar_retrieval_callbacks(sent_tasks):
+    """
+    Test: Is a request's callback started with its retrieved files once its retrieval completes,
+    and are its error callbacks started instead if the retrieval fails?
+    """
+    tar_file = TarFile.objects.create(name="test_tar")
+    other_tar_file = TarFile.objects.create(name="other_test_tar")
+    data_files = create_archived_files(tar_file, 1)
+    other_data_files = create_archived_files(other_tar_file, 1)
+
+    callback = signature("test_callback")
+    callback.on_error(signature("test_error_callback"))
+
+    # Complete
+    retrieval_request = plan_file_retrieval([data_files[0].pk], callback)
+    retrieval = retrieval_request.tar_retrievals.get()
+    DataFile.objects.filter(pk=data_files[0].pk).update(local_storage=True)
+    finish_tar_retrieval(retrieval.pk, [data_files[0].pk])
+
+    retrieval.refresh_from_db()
+    retrieval_request.refresh_from_db()
+    assert retrieval.status == RetrievalStatus.COMPLETE
+    assert retrieval_request.status == RetrievalStatus.COMPLETE
+    assert (archiving_tasks.post_get_file_from_archive_task.name,
+            [[[data_files[0].pk]]]) in sent_tasks
+    assert ("test_callback", [[[data_files[0].pk]]]) in sent_tasks
+    assert "test_error_callback" not in [x[0] for x in sent_tasks]
+
+    # Fail
+    sent_tasks.clear()
+    retrieval_request = plan_file_retrieval([other_data_files[0].pk], callback)
+    retrieval = retrieval_request.tar_retrievals.get()
+    finish_tar_retrieval(retrieval.pk, [], failed=True)
+
+    retrieval.refresh_from_db()
+    retrieval_request.refresh_from_db()
+    assert retrieval.status == RetrievalStatus.FAILED
+    assert retrieval_request.status == RetrievalStatus.FAILED
+    assert sent_tasks == [("test_error_callback", [])]
+
+    # A retrieval finishing after it has been failed keeps its status
+    sent_tasks.clear()
+    finish_tar_retrieval(retrieval.pk, [other_data_files[0].pk])
+    retrieval.refresh_from_db()
+    assert retrieval.status == RetrievalStatus.FAILED
+    assert "test_callback" not in [x[0] for x in sent_tasks]
+
+    remove_files(data_files + other_data_files)
+
+
+@pytest.mark.django_db
+def test_sweep_tar_retrievals(sent_tasks, settings):
+    """
+    Test: Are stale pending retrievals started again, and stale running retrievals failed?
+    """
+    tar_file = TarFile.objects.create(name="test_tar")
+    other_tar_file = TarFile.objects.create(name="other_test_tar")
+    data_files = create_archived_files(tar_file, 1)
+    other_data_files = create_archived_files(other_tar_file, 1)
+
+    pending_request = plan_file_retrieval([data_files[0].pk])
+    running_request = plan_file_retrieval([other_data_files[0].pk])
+    pending_retrieval = pending_request.tar_retrievals.get()
+    running_retrieval = running_request.tar_retrievals.get()
+    running_retrieval.status = RetrievalStatus.RUNNING
+    running_retrieval.save()
+
+    # Nothing is stale yet
+    sweep_tar_retrievals()
+    assert sent_tasks == []
+
+    stale_dt = djtimezone.now() - timedelta(
+        seconds=max(settings.ARCHIVE_RETRIEVAL_PENDING_TIMEOUT, settings.ARCHIVE_RETRIEVAL_RUNNING_TIMEOUT) + 1)
+    TarRetrieval.objects.update(created_on=stale_dt, modified_on=stale_dt)
+    ArchiveRetrievalRequest.objects.update(created_on=stale_dt)
+    sweep_tar_retrievals()
+
+    assert sent_tasks == [
+        (archiving_tasks.run_tar_retrieval_task.name, [pending_retrieval.pk])]
+    pending_retrieval.refresh_from_db()
+    running_retrieval.refresh_from_db()
+    running_request.refresh_from_db()
+    assert pending_retrieval.status == RetrievalStatus.PENDING
+    assert running_retrieval.status == RetrievalStatus.FAILED
+    assert running_request.status == RetrievalStatus.FAILED
+
+    remove_files(data_files + other_data_files)
+
+
+@pytest.mark.django_db
+def test_clean_finished_retrievals(sent_tasks, settings):
+    """
+    Test: Are old finished requests and retrievals deleted with their links, while retrievals still linked
+    to a request are kept?
+    """
+    tar_file = TarFile.objects.create(name="test_tar")
+    other_tar_file = TarFile.objects.create(name="other_test_tar")
+    data_files = create_archived_files(tar_file, 1)
+    other_data_files = create_archived_files(other_tar_file, 1)
+
+    old_request = plan_file_retrieval([data_files[0].pk])
+    new_request = plan_file_retrieval([other_data_files[0].pk])
+    for retrieval in TarRetrieval.objects.all():
+        finish_tar_retrieval(retrieval.pk, [])
+
+    old_dt = djtimezone.now() - timedelta(days=settings.ARCHIVE_RETRIEVAL_KEEP_DAYS + 1)
+    TarRetrieval.objects.update(modified_on=old_dt)
+    ArchiveRetrievalRequest.objects.filter(
+        pk=old_request.pk).update(modified_on=old_dt)
+    clean_finished_retrievals()
+
+    assert list(ArchiveRetrievalRequest.objects.all()) == [new_request]
+    assert list(TarRetrieval.objects.values_list("tar_file", flat=True)) == [
+        other_tar_file.pk]
+    assert not TarRetrieval.data_files.through.objects.filter(
+        datafile=data_files[0]).exists()
+    assert not ArchiveRetrievalRequest.data_files.through.objects.filter(
+        datafile=data_files[0]).exists()
+
+    remove_files(data_files + other_data_files)
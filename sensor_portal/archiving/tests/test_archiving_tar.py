@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import os
+import tarfile
+from io import BytesIO
+
+import pytest
+import zstandard
+from archiving.models import (TAR_COMPRESSION_EXTENSIONS, TarCompression,
+                             TarFileMember)
+from archiving.tar_functions import (SeekableTarWriter, create_tar_file,
+                                     read_tar_member)
+from data_models.factories import DataFileFactory, DeploymentFactory
+from data_models.models import DataFile
+
+
+def read_whole_tar(tar_path: str, compression: str) -> tarfile.TarFile:
+    """
+    Decompress a whole TAR the way tar would, rather than by its member index.
+    """
+    with open(tar_path, "rb") as f:
+        data = f.read()
+    if compression == TarCompression.GZIP:
+        data = gzip.decompress(data)
+    elif compression == TarCompression.ZSTD:
+        with zstandard.ZstdDecompressor().stream_reader(BytesIO(data), read_across_frames=True) as reader:
+            data = reader.read()
+    return tarfile.open(fileobj=BytesIO(data), mode="r:")
+
+
+@pytest.mark.django_db
+def test_create_tar_file_layout():
+    """
+    Test: Are data files stored under data/ in the TAR, with a BagIt manifest of their checksums at its root?
+    """
+    deployment = DeploymentFactory()
+    data_files = [DataFileFactory(deployment=deployment) for i in range(3)]
+    file_objs = DataFile.objects.filter(pk__in=[x.pk for x in data_files])
+
+    success, tar_name, full_tar_path, members = create_tar_file(file_objs)
+    assert success
+    assert full_tar_path.endswith(tar_name + ".tar.gz")
+
+    relative_paths = {relative_path: full_path for relative_path, full_path in
+                      file_objs.full_paths().values_list("relative_path", "full_path")}
+    with read_whole_tar(full_tar_path, TarCompression.GZIP) as tar:
+        tar_names = tar.getnames()
+        assert sorted(tar_names) == sorted(
+            [os.path.join("data", x) for x in relative_paths.keys()] +
+            ["bagit.txt", "manifest-md5.txt", "tagmanifest-md5.txt", "metadata.json"])
+
+        for relative_path, full_path in relative_paths.items():
+            with open(full_path, "rb") as f:
+                assert tar.extractfile(os.path.join("data", relative_path)).read() == f.read()
+
+        manifest = tar.extractfile("manifest-md5.txt").read().decode()
+    manifest_lines = sorted(manifest.splitlines())
+    expected_lines = []
+    for relative_path, full_path in relative_paths.items():
+        with open(full_path, "rb") as f:
+            expected_lines.append(
+                f"{hashlib.md5(f.read()).hexdigest()}  {os.path.join('data', relative_path)}")
+    assert manifest_lines == sorted(expected_lines)
+
+    assert [x["path"] for x in members] == tar_names
+
+    os.remove(full_tar_path)
+    for data_file in data_files:
+        data_file.delete()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("compression", [TarCompression.GZIP, TarCompression.ZSTD, TarCompression.NONE])
+def test_create_tar_file_compression(compression):
+    """
+    Test: Can TARs written with each compression be decompressed as a whole, with their files unchanged?
+    """
+    deployment = DeploymentFactory()
+    data_files = [DataFileFactory(deployment=deployment) for i in range(2)]
+    file_objs = DataFile.objects.filter(pk__in=[x.pk for x in data_files])
+
+    success, tar_name, full_tar_path, members = create_tar_file(
+        file_objs, compression=compression, compression_threads=2)
+    assert success
+    assert full_tar_path.endswith(
+        tar_name + TAR_COMPRESSION_EXTENSIONS[compression])
+
+    with read_whole_tar(full_tar_path, compression) as tar:
+        for relative_path, full_path in file_objs.full_paths().values_list("relative_path", "full_path"):
+            with open(full_path, "rb") as f:
+                assert tar.extractfile(os.path.join("data", relative_path)).read() == f.read()
+
+    os.remove(full_tar_path)
+    for data_file in data_files:
+        data_file.delete()
+
+
+@pytest.mark.parametrize("compression", [TarCompression.GZIP, TarCompression.ZSTD, TarCompression.NONE])
+def test_seekable_tar_writer_read_member(tmp_path, compression):
+    """
+    Test: Can each member of a TAR written by SeekableTarWriter be read on its own from its offset,
+    including members whose names are too long for a plain TAR header?
+    """
+    contents = {
+        "data/short.txt": b"short file",
+        "data/" + "long_directory_name/" * 6 + "long_file_name.bin": os.urandom(70000),
+        "data/empty.txt": b"",
+    }
+    tar_path = os.path.join(tmp_path, "test" + TAR_COMPRESSION_EXTENSIONS[compression])
+    with open(tar_path, "wb") as f:
+        tar = SeekableTarWriter(f, compression)
+        for idx, (arcname, content) in enumerate(contents.items()):
+            file_path = os.path.join(tmp_path, f"file_{idx}")
+            with open(file_path, "wb") as content_file:
+                content_file.write(content)
+            assert tar.add_file(file_path, arcname) == hashlib.md5(content).hexdigest()
+        tar.close()
+    assert len(list(contents.keys())[1]) > 100
+
+    with open(tar_path, "rb") as f:
+        # Read members out of order
+        for member in reversed(tar.members):
+            output = BytesIO()
+            read_tar_member(f, TarFileMember(**member), compression, output)
+            assert output.getvalue() == contents[member["path"]]
+
+    with read_whole_tar(tar_path, compression) as whole_tar:
+        assert whole_tar.getnames() == list(contents.keys())
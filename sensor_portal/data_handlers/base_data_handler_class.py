@@ -1,8 +1,11 @@
 import importlib
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Callable, Tuple
+from typing import Callable, List, Tuple
+
+from django.conf import settings
 
 from .tasks import *
 
@@ -23,6 +26,10 @@ class DataTypeHandler():
     validity_description = "No validity description provided"
     handling_description = "No handling description provided"
     post_handling_description = "No post handling description provided"
+    # Set to False if handle_file is not safe to run on several files at once
+    concurrent_handling = True
+    # Maximum number of threads used by handle_files. If None, settings.DATA_HANDLER_MAX_WORKERS is used.
+    max_handling_workers = None
 
     def format_check(self, file, device_label=None):
         """
@@ -90,6 +97,37 @@ class DataTypeHandler():
 
         return recording_dt, extra_data, data_type, self.get_post_download_task(file_format)
 
+    def handle_files(self,
+                     files: list,
+                     recording_dts: List[datetime],
+                     extra_datas: List[dict],
+                     data_type: str = None) -> List[Tuple[datetime, dict, str, str]]:
+        """
+        Handle a list of files, running handle_file on several files at once in a bounded thread pool
+        if this handler allows concurrent handling.
+
+        Args:
+            files (list): File-like objects with a 'name' attribute.
+            recording_dts (List[datetime]): Recording datetime of each file.
+            extra_datas (List[dict]): Additional data of each file.
+            data_type (str, optional): The type of data.
+
+        Returns:
+            list: (recording_dt, extra_data, data_type, post_download_task) for each file, in input order.
+        """
+        max_workers = self.max_handling_workers or settings.DATA_HANDLER_MAX_WORKERS
+        max_workers = min(max_workers, len(files))
+        data_types = [data_type] * len(files)
+
+        if not self.concurrent_handling or max_workers <= 1:
+            return [self.handle_file(*x) for x in zip(files, recording_dts, extra_datas, data_types)]
+
+        logger.info(
+            f"Handling {len(files)} files with {max_workers} threads")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map returns results in input order
+            return list(executor.map(self.handle_file, files, recording_dts, extra_datas, data_types))
+
     def get_post_download_task(self, file_extension: str, first_time: bool = True):
         """
         Get a post-download task for the given file extension.
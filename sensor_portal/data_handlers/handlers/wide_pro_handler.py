@@ -8,6 +8,7 @@ import pandas as pd
 from data_handlers.functions import (check_exif_keys, get_image_recording_dt,
                                      open_exif)
 from data_handlers.handlers.default_image_handler import DataTypeHandler
+from data_models.plotting_functions import store_report_metrics
 from django.core.files import File
 
 from sensor_portal.celery import app
@@ -170,7 +171,7 @@ def convert_daily_report_task(file_pks: List[int]) -> None:
 
 def convert_daily_report(data_file: Any) -> Tuple[Optional[Any], Optional[List[str]]]:
     """
-    Converts a daily report text file to CSV and updates the file object.
+    Converts a daily report text file to CSV, stores its values as report metrics and updates the file object.
 
     Args:
         data_file: The file object to process.
@@ -219,6 +220,8 @@ def convert_daily_report(data_file: Any) -> Tuple[Optional[Any], Optional[List[s
             data_file_path_split[0], data_file_name + ".csv")
 
         report_df.to_csv(data_file_csv_path, index_label=False, index=False)
+        # parse values once, so that metrics do not need to read the CSV
+        store_report_metrics(data_file, report_df)
         # update file object
         data_file.file_size = os.stat(data_file_csv_path).st_size
         data_file.modified_on = datetime.now()
@@ -2,7 +2,8 @@ import logging
 import traceback
 from typing import Callable, List, Tuple
 
-from data_models.models import DataFile
+from data_models.models import DataFile, DeploymentDailyFileStats
+from data_models.search_functions import update_search_documents_pks
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +48,8 @@ def post_upload_task_handler(
 
     do_not_remove_initial = list(data_file_objs.values_list(
         "do_not_remove", flat=True))
+    # Daily file statistics rows the files are counted in, in case their recording datetimes are corrected
+    previous_stats_keys = DeploymentDailyFileStats.file_keys(data_file_objs)
 
     # lock datafiles
     data_file_objs.update(do_not_remove=True)
@@ -73,4 +76,10 @@ def post_upload_task_handler(
 
     # update objects
     update = DataFile.objects.bulk_update(updated_data_objs, modified_fields)
+    if not {"file_name", "tag"}.isdisjoint(modified_fields):
+        # bulk_update does not send post_save signals
+        update_search_documents_pks([x.pk for x in updated_data_objs])
+    if not {"recording_dt", "file_size", "has_human"}.isdisjoint(modified_fields):
+        DeploymentDailyFileStats.refresh(
+            DataFile.objects.filter(pk__in=[x.pk for x in updated_data_objs]), previous_stats_keys)
     logger.info(f"Running job {str(task_function)} updated {update} files")
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import QuerySet
+
+logger = logging.getLogger(__name__)
+
+# Query parameters which do not change a count
+IGNORED_COUNT_PARAMS = ["page", "page_size", "ordering",
+                        "cursor", "pagination", "format", "ctdp", "geojson"]
+
+# Query parameters which filter files by their favourites
+FAVOURITE_COUNT_PARAMS = ["is_favourite", "favourite_of__id", "favourite_of__id__contains"]
+
+
+def _generation_key(scope: str) -> str:
+    return f"file_count_generation:{scope}"
+
+
+def get_generation(scope: str) -> int:
+    """
+    Get the current generation of a count scope. Cached counts of older generations are no longer used.
+
+    Args:
+        scope (str): Count scope, such as 'all' or 'deployment:1'.
+
+    Returns:
+        int: Current generation.
+    """
+    cache.add(_generation_key(scope), 1, timeout=None)
+    return cache.get(_generation_key(scope), 1)
+
+
+def bump_generation(scope: str) -> None:
+    """
+    Start a new generation of a count scope, invalidating its cached counts.
+
+    Args:
+        scope (str): Count scope, such as 'all' or 'deployment:1'.
+    """
+    try:
+        cache.incr(_generation_key(scope))
+    except ValueError:
+        # Key does not exist yet, so there are no cached counts to invalidate
+        cache.add(_generation_key(scope), 1, timeout=None)
+
+
+def normalize_count_params(query_params: Any) -> str:
+    """
+    Turn request query parameters into a stable string, so that the same filters give the same cache key.
+
+    Args:
+        query_params (QueryDict): Request query parameters.
+
+    Returns:
+        str: Sorted JSON of the parameters which affect the count.
+    """
+    params = {k: sorted(query_params.getlist(k)) for k in query_params.keys()
+              if k not in IGNORED_COUNT_PARAMS}
+    return json.dumps(params, sort_keys=True)
+
+
+def get_count_scope(query_params: Any) -> str:
+    """
+    Get the narrowest invalidation scope of a file count from its filter parameters,
+    so that counts filtered to one deployment or device are not invalidated by changes to other files.
+
+    Args:
+        query_params (QueryDict): Request query parameters.
+
+    Returns:
+        str: Count scope, such as 'all' or 'deployment:1'.
+    """
+    deployment_pk = query_params.get("deployment__id", "")
+    if deployment_pk.isdigit():
+        return f"deployment:{int(deployment_pk)}"
+    device_pk = query_params.get("deployment__device", "")
+    if device_pk.isdigit():
+        return f"device:{int(device_pk)}"
+    return "all"
+
+
+def cached_file_count(request: Any, route: str, scope: str, count_function: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Return the file count of a filtered queryset from the cache, calling count_function on a miss.
+
+    Counts are cached per user, route, scope and filter parameters for FILE_COUNT_CACHE_TIMEOUT seconds,
+    and are invalidated early when files of a deployment in their scope are added, deleted or archived.
+    Counts filtered by favourites are also invalidated when any favourites change.
+
+    Args:
+        request (Request): Request for the count.
+        route (str): Name of the count action, including any object it is scoped to.
+        scope (str): Invalidation scope of the count, such as 'all', 'deployment:1' or 'favourite:1'.
+        count_function (Callable[[], Dict[str, Any]]): Function returning the count.
+
+    Returns:
+        Dict[str, Any]: File count.
+    """
+    params_hash = hashlib.md5(normalize_count_params(
+        request.query_params).encode()).hexdigest()
+    scopes = [scope]
+    if any(x in request.query_params for x in FAVOURITE_COUNT_PARAMS) and not scope.startswith("favourite"):
+        scopes.append("favourite")
+    generations = ":".join(f"{x}:{get_generation(x)}" for x in scopes)
+    key = f"file_count:{route}:{request.user.pk}:{generations}:{params_hash}"
+    file_count = cache.get(key)
+    if file_count is None:
+        file_count = count_function()
+        cache.set(key, file_count, timeout=settings.FILE_COUNT_CACHE_TIMEOUT)
+    return file_count
+
+
+def invalidate_file_counts(deployment_pks: Iterable[int]) -> None:
+    """
+    Invalidate cached file counts that may include files from these deployments,
+    including counts scoped to their device or projects.
+
+    Scopes are looked up straight away, but generations are only bumped once the current transaction
+    commits, so that a count made before then cannot be cached under the new generation.
+
+    Args:
+        deployment_pks (Iterable[int]): Database IDs of deployments whose files have changed.
+    """
+    from data_models.models import Deployment
+
+    deployment_pks = set(deployment_pks)
+    if len(deployment_pks) == 0:
+        return
+    scopes = {"all"} | {f"deployment:{x}" for x in deployment_pks}
+    for deployment_pk, device_pk, project_pk in Deployment.objects.filter(pk__in=deployment_pks).values_list(
+            'pk', 'device_id', 'project__pk'):
+        scopes.add(f"device:{device_pk}")
+        if project_pk is not None:
+            scopes.add(f"project:{project_pk}")
+
+    def bump_generations():
+        for scope in scopes:
+            bump_generation(scope)
+    transaction.on_commit(bump_generations)
+
+
+def invalidate_file_counts_for_files(data_files: QuerySet) -> None:
+    """
+    Invalidate cached file counts that may include these files, including counts of their users' favourites.
+
+    Args:
+        data_files (QuerySet): DataFiles which have been added, deleted or archived.
+    """
+    invalidate_file_counts(data_files.order_by().values_list(
+        'deployment_id', flat=True).distinct())
+    invalidate_favourite_counts(data_files.order_by().filter(favourite_of__isnull=False).values_list(
+        'favourite_of', flat=True).distinct())
+
+
+def invalidate_favourite_counts(user_pks: Iterable[int]) -> None:
+    """
+    Invalidate cached counts of favourited files, and of the favourites of these users,
+    once the current transaction commits.
+
+    Args:
+        user_pks (Iterable[int]): Database IDs of users whose favourites have changed.
+    """
+    scopes = {f"favourite:{x}" for x in user_pks}
+    if len(scopes) == 0:
+        return
+    scopes.add("favourite")
+
+    def bump_generations():
+        for scope in scopes:
+            bump_generation(scope)
+    transaction.on_commit(bump_generations)
@@ -0,0 +1,119 @@
+import bisect
+import logging
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .general_functions import check_dt
+
+logger = logging.getLogger(__name__)
+
+# To avoid circular imports
+if TYPE_CHECKING:
+    from data_models.models import Deployment, Device
+
+
+class DeploymentIntervals():
+    """
+    In-memory, sorted interval index of all deployments of a single device.
+
+    Deployments are loaded once and grouped by time zone. Within each time zone group,
+    deployments are sorted by start so that the deployment(s) covering a datetime can be found
+    with a binary search instead of a database query per datetime.
+
+    Matches the behaviour of `Device.deployment_from_date`:
+        - Naive datetimes are localised to each deployment's own time zone before comparison.
+        - Deployments without an end are treated as lasting 100 years.
+        - Start and end are both inclusive.
+        - A datetime covered by zero or more than one deployment resolves to None.
+    """
+
+    def __init__(self, device: "Device") -> None:
+        """
+        Load all deployments of a device into the interval index.
+
+        Args:
+            device (Device): Device whose deployments should be indexed.
+        """
+        self.device = device
+        # time zone name -> (time zone, sorted starts, sorted (start, end, deployment))
+        self.tz_groups: Dict[str, Tuple[object, List[datetime], List[Tuple[datetime, datetime, "Deployment"]]]] = {}
+        # Longest deployment in each time zone group, used to bound the backwards search
+        self.max_length: Dict[str, timedelta] = {}
+
+        for deployment in device.deployments.all():
+            time_zone = deployment.time_zone or settings.TIME_ZONE
+            tz_key = str(time_zone)
+            deployment_start = check_dt(deployment.deployment_start)
+            if deployment.deployment_end is None:
+                deployment_end = deployment_start + timedelta(days=365 * 100)
+            else:
+                deployment_end = check_dt(deployment.deployment_end)
+
+            if tz_key not in self.tz_groups:
+                self.tz_groups[tz_key] = (time_zone, [], [])
+                self.max_length[tz_key] = timedelta(0)
+            self.tz_groups[tz_key][2].append(
+                (deployment_start, deployment_end, deployment))
+            self.max_length[tz_key] = max(
+                self.max_length[tz_key], deployment_end - deployment_start)
+
+        for tz_key, (time_zone, starts, intervals) in self.tz_groups.items():
+            intervals.sort(key=lambda x: x[0])
+            starts.extend([x[0] for x in intervals])
+
+    def matching_deployments(self, dt: datetime) -> List["Deployment"]:
+        """
+        Return every deployment of this device which covers a datetime.
+
+        Args:
+            dt (datetime): Datetime to check.
+
+        Returns:
+            List[Deployment]: All deployments covering this datetime.
+        """
+        matches = []
+        for tz_key, (time_zone, starts, intervals) in self.tz_groups.items():
+            localised_dt = check_dt(dt, time_zone)
+            # Only deployments starting at or before this datetime can cover it
+            idx = bisect.bisect_right(starts, localised_dt) - 1
+            earliest_start = localised_dt - self.max_length[tz_key]
+            while idx >= 0 and starts[idx] >= earliest_start:
+                deployment_start, deployment_end, deployment = intervals[idx]
+                if deployment_end >= localised_dt:
+                    matches.append(deployment)
+                idx -= 1
+        return matches
+
+    def deployment_from_date(self, dt: Optional[datetime]) -> Optional["Deployment"]:
+        """
+        Return the deployment for this device active at the given datetime.
+
+        Args:
+            dt (datetime): Datetime to check. If None, returns None.
+
+        Returns:
+            Deployment or None: The matching deployment, or None if ambiguous or not found.
+        """
+        if dt is None:
+            return None
+        matches = self.matching_deployments(dt)
+        if len(matches) == 1:
+            return matches[0]
+        logger.info(
+            f"Error: found {len(matches)} deployments for device {self.device.device_ID} for {dt}")
+        return None
+
+    def deployments_from_dates(self, dt_list: List[Optional[datetime]]) -> List[Optional["Deployment"]]:
+        """
+        Resolve a list of datetimes to deployments in a single pass.
+
+        Args:
+            dt_list (List[datetime]): Datetimes to resolve.
+
+        Returns:
+            List[Deployment | None]: Deployment for each datetime, in input order.
+            None where no deployment or more than one deployment was found.
+        """
+        return [self.deployment_from_date(dt) for dt in dt_list]
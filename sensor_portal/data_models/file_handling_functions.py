@@ -1,30 +1,237 @@
+import hashlib
 import itertools
 import logging
 import os
+import shutil
 from datetime import datetime as dt
-from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
+from typing import (TYPE_CHECKING, Any, Callable, Dict, List, Optional,
+                    Tuple, Union)
 
+from bridgekeeper import perms
 from celery import chain
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.files import File
 from django.core.files.uploadedfile import UploadedFile
+from django.db import connection, transaction
 from django.db.models import QuerySet
 from django.utils import timezone as djtimezone
 from rest_framework import status
-from utils.general import convert_unit, get_md5
+from utils.general import ResumableMD5, convert_unit, get_md5
 
 from sensor_portal.celery import app
 
+from .count_cache_functions import invalidate_file_counts
 from .general_functions import check_dt
+from .name_index_functions import OriginalNameIndex, index_new_datafiles
+from .search_functions import update_search_documents_pks
+from .upload_handlers import StagedUploadedFile
 
 logger = logging.getLogger(__name__)
 
 # To avoid ciruclar imports
 if TYPE_CHECKING:
-    from data_models.models import DataFile, Deployment, Device
+    from data_models.models import (DataFile, DataType, Deployment, Device,
+                                    IngestBatch)
     from user_management.models import User
 
 
+class UploadLookupCache():
+    """
+    Memoizes lookups repeated for every file of an upload batch.
+
+    A batch almost always targets a handful of deployments and data types, so permission checks,
+    DataType rows and project automated tasks are looked up once per key rather than once per file.
+    Hit and miss counters are kept per lookup type so the number of queries made can be checked.
+    """
+
+    def __init__(self, request_user: Optional["User"] = None) -> None:
+        """
+        Args:
+            request_user (Optional[User], optional): User for permission checks. Defaults to None.
+        """
+        self.request_user = request_user
+        self.cached_values = {"permission": {},
+                              "data_type": {}, "project_tasks": {}}
+        self.counters = {x: {"hits": 0, "misses": 0}
+                         for x in self.cached_values.keys()}
+
+    def get_cached(self, lookup_type: str, key: Any, lookup_function: Callable[[], Any]) -> Any:
+        """
+        Return a cached value, calling lookup_function to fill the cache on a miss.
+
+        Args:
+            lookup_type (str): Type of lookup, one of the keys of cached_values.
+            key (Any): Key of the value within this lookup type.
+            lookup_function (Callable[[], Any]): Function returning the value if not cached.
+
+        Returns:
+            Any: The cached value.
+        """
+        cached_values = self.cached_values[lookup_type]
+        if key in cached_values:
+            self.counters[lookup_type]["hits"] += 1
+        else:
+            self.counters[lookup_type]["misses"] += 1
+            cached_values[key] = lookup_function()
+        return cached_values[key]
+
+    def can_attach(self, deployment: "Deployment") -> bool:
+        """
+        Check if the request user can attach files to a deployment.
+
+        Args:
+            deployment (Deployment): Deployment to check.
+
+        Returns:
+            bool: True if there is no request user, or if the user has permission.
+        """
+        if self.request_user is None:
+            return True
+        return self.get_cached("permission", deployment.pk,
+                               lambda: self.request_user.has_perm('data_models.change_deployment', deployment))
+
+    def get_data_type(self, data_type_name: str) -> "DataType":
+        """
+        Get or create a DataType by name.
+
+        Args:
+            data_type_name (str): Name of the data type.
+
+        Returns:
+            DataType: The data type object.
+        """
+        from data_models.models import DataType
+
+        return self.get_cached("data_type", data_type_name,
+                               lambda: DataType.objects.get_or_create(name=data_type_name)[0])
+
+    def get_project_tasks(self, deployment: "Deployment") -> List[int]:
+        """
+        Get the primary keys of automated tasks of all projects of a deployment.
+
+        Args:
+            deployment (Deployment): Deployment to check.
+
+        Returns:
+            List[int]: Primary keys of ProjectJob objects.
+        """
+        def lookup_function():
+            deployment_tasks = list(deployment.project.all().values_list(
+                'automated_tasks__pk', flat=True))
+            return [x for x in deployment_tasks if x is not None]
+
+        return self.get_cached("project_tasks", deployment.pk, lookup_function)
+
+
+def filter_upload_lists(
+    keep: List[bool],
+    files: List[Union[object, UploadedFile]],
+    recording_dt: Optional[List[Optional[dt]]],
+    extra_data: List[Dict[str, Union[str, int, float, bool, None]]],
+    data_types: Optional[List[str]]
+) -> Tuple[
+    List[Union[object, UploadedFile]],
+    Optional[List[Optional[dt]]],
+    List[Dict[str, Union[str, int, float, bool, None]]],
+    Optional[List[str]]
+]:
+    """
+    Remove files from an upload, along with their recording datetimes, extra data and data types.
+    Lists of a single value apply to every file and are left unchanged.
+
+    Args:
+        keep (List[bool]): For each file, True if it should be kept.
+        files (List[Union[object, UploadedFile]]): Files of the upload.
+        recording_dt (Optional[List[Optional[datetime]]]): Recording datetimes of the upload.
+        extra_data (List[Dict[str, Union[str, int, float, bool, None]]]): Extra data of the upload.
+        data_types (Optional[List[str]]): Data types of the upload.
+
+    Returns:
+        Tuple: Filtered files, recording_dt, extra_data and data_types.
+    """
+    files = [x for x, y in zip(files, keep) if y]
+    if recording_dt and len(recording_dt) > 1:
+        recording_dt = [x for x, y in zip(recording_dt, keep) if y]
+    if len(extra_data) > 1:
+        extra_data = [x for x, y in zip(extra_data, keep) if y]
+    if data_types is not None and len(data_types) > 1:
+        data_types = [x for x, y in zip(data_types, keep) if y]
+    return files, recording_dt, extra_data, data_types
+
+
+def get_upload_md5(file: Union[object, UploadedFile]) -> str:
+    """
+    Get the MD5 checksum of an uploaded file before it is saved.
+
+    Uses the checksum calculated while streaming the upload, and otherwise reads the file.
+    Client supplied checksums are never used, as they could be shared between files or wrong.
+    The checksum is kept on the file, so that it is not calculated again when the file is saved.
+
+    Args:
+        file (Union[object, UploadedFile]): The file object. Must provide a `chunks()` method.
+
+    Returns:
+        str: MD5 checksum of the file.
+    """
+    if (md5_checksum := getattr(file, "md5_checksum", None)):
+        return md5_checksum
+    hash_md5 = hashlib.md5()
+    for chunk in file.chunks():
+        hash_md5.update(chunk)
+    file.md5_checksum = hash_md5.hexdigest()
+    return file.md5_checksum
+
+
+def _multipart_md5_state_key(file_name: str) -> str:
+    return f"multipart_md5_state:{file_name}"
+
+
+def get_multipart_hasher(file_name: str, offset: int) -> Optional[ResumableMD5]:
+    """
+    Resume the MD5 checksum of a multipart upload from the state saved by its previous chunk.
+
+    Args:
+        file_name (str): Name of the multipart DataFile.
+        offset (int): Number of bytes of the file received so far.
+
+    Returns:
+        Optional[ResumableMD5]: The resumed hash, or None if there is no usable state saved for this offset,
+            in which case the file is hashed again once complete.
+    """
+    if not ResumableMD5.is_available():
+        return None
+    saved_state = cache.get(_multipart_md5_state_key(file_name))
+    if saved_state is None or saved_state.get("offset") != offset:
+        return None
+    try:
+        return ResumableMD5(bytes.fromhex(saved_state["state"]))
+    except ValueError as e:
+        logger.warning(f"Could not resume checksum of {file_name}: {repr(e)}")
+        return None
+
+
+def save_multipart_hasher(file_name: str, offset: int, hasher: Optional[ResumableMD5]) -> None:
+    """
+    Save the MD5 checksum state of a multipart upload once the current chunk is committed.
+
+    The state is kept in the cache rather than the DataFile, so it is never returned by the API.
+
+    Args:
+        file_name (str): Name of the multipart DataFile.
+        offset (int): Number of bytes of the file received so far, including the current chunk.
+        hasher (Optional[ResumableMD5]): Hash of the file so far. If None, any saved state is removed.
+    """
+    key = _multipart_md5_state_key(file_name)
+    if hasher is None:
+        transaction.on_commit(lambda: cache.delete(key))
+        return
+    saved_state = {"offset": offset, "state": hasher.get_state().hex()}
+    transaction.on_commit(lambda: cache.set(
+        key, saved_state, timeout=settings.MULTIPART_MD5_STATE_TIMEOUT))
+
+
 def create_file_objects(
     files: List[Union[object, UploadedFile]],
     check_filename: bool = False,
@@ -36,7 +243,10 @@ def create_file_objects(
     data_types: Optional[List[str]] = None,
     request_user: Optional["User"] = None,
     multipart: bool = False,
-    verbose: bool = True
+    verbose: bool = True,
+    lookup_cache: Optional[UploadLookupCache] = None,
+    multipart_start: Optional[int] = None,
+    deduplicate: bool = False
 ) -> Tuple[
     List["DataFile"],
     List[Dict[str, Dict[str, Union[str, int]]]],
@@ -57,6 +267,13 @@ def create_file_objects(
         request_user (Optional[User], optional): User object for permission checks. Defaults to None.
         multipart (bool, optional): If True, handle multipart file uploads. Defaults to False.
         verbose (bool, optional): If True, enable verbose logging. Defaults to False.
+        lookup_cache (Optional[UploadLookupCache], optional): Cache of permission and database lookups.
+            A new cache for request_user is created if not provided. Defaults to None.
+        multipart_start (Optional[int], optional): Byte offset of this chunk within a multipart upload,
+            used to reject out of order or duplicate chunks. Defaults to None, in which case the offset is not checked.
+        deduplicate (bool, optional): If True, files with the same contents as a file already attached to a deployment
+            of the device that request_user can change are returned as existing files rather than saved.
+            Ignored for multipart uploads. Defaults to False.
 
     Returns:
         Tuple[
@@ -80,7 +297,12 @@ def create_file_objects(
         - Supports automated tasks and checksum validation.
     """
 
-    from data_models.models import DataFile, DataType, ProjectJob
+    from data_models.models import (DataFile, Deployment,
+                                    DeploymentDailyFileStats,
+                                    FileNameSequence, ProjectJob)
+
+    if lookup_cache is None:
+        lookup_cache = UploadLookupCache(request_user)
 
     invalid_files = []
     existing_files = []
@@ -121,6 +343,8 @@ def create_file_objects(
             # Initialize multipart-related variables
             multipart_obj = None
             multipart_checksum = None
+            multipart_offset = 0
+            multipart_hasher = None
 
             # Query the database for existing multipart files with matching filenames
             existing_multipart_files = DataFile.objects.filter(
@@ -135,14 +359,14 @@ def create_file_objects(
                 existing_multipart_files = existing_multipart_files.filter(
                     deployment=deployment_object)
 
-            if existing_multipart_files.exists():
+            # Lock the multipart object so that chunks of the same file are handled one at a time
+            multipart_obj = existing_multipart_files.select_for_update().first()
+
+            if multipart_obj is not None:
                 if verbose:
                     logger.info(
                         "Found existing multipart object in the database.")
 
-                # Retrieve the first matching multipart object
-                multipart_obj = existing_multipart_files.first()
-
                 # Update recording datetime, deployment, and device based on the multipart object
                 recording_dt = [multipart_obj.recording_dt]
                 deployment_object = multipart_obj.deployment
@@ -151,20 +375,49 @@ def create_file_objects(
                 # Extract checksum from extra data
                 multipart_checksum = extra_data[0].get("md5_checksum")
 
+                # Resume the checksum from the state saved by the previous chunk
+                multipart_offset = multipart_obj.extra_data.get(
+                    "multipart_offset")
+                if multipart_offset is None:
+                    # Uploads started before chunk state was recorded
+                    multipart_offset = os.path.getsize(
+                        multipart_obj.full_path())
+                multipart_hasher = get_multipart_hasher(
+                    multipart_obj.file_name, multipart_offset)
+            elif ResumableMD5.is_available():
+                multipart_hasher = ResumableMD5()
+
+            # Chunks must arrive in order, each one starting where the last one ended
+            if multipart_start is not None and multipart_start != multipart_offset:
+                if verbose:
+                    logger.info(
+                        f"Multipart chunk starts at {multipart_start}, expected {multipart_offset}")
+                invalid_files += [{x: {"message": f"Multipart chunk out of order, expected offset {multipart_offset}",
+                                       "status": 400}} for x in filenames]
+                return (uploaded_files, invalid_files, existing_files, status.HTTP_400_BAD_REQUEST)
+
         else:
             if verbose:
                 logger.info(
                     "Checking for duplicate filenames in the database...")
 
-            # Query the database for filenames that already exist
-            db_filenames = list(
-                DataFile.objects.filter(original_name__in=filenames).values_list('original_name', flat=True))
+            # Query for filenames that already exist.
+            # If the device is known, only names in its index need to be checked in the database.
+            index_device = device_object or (
+                deployment_object.device if deployment_object else None)
+            if index_device is not None:
+                db_filenames = OriginalNameIndex(index_device.pk).existing_names(
+                    filenames, DataFile.objects.filter(deployment__device=index_device))
+            else:
+                db_filenames = set(
+                    DataFile.objects.filter(original_name__in=filenames).values_list('original_name', flat=True))
 
             # Identify files that are not duplicated
             not_duplicated = [x not in db_filenames for x in filenames]
-            files = [x for x, y in zip(files, not_duplicated) if y]
             existing_files += [{x: {"message": "Already in database", "status": 200}} for x,
                                y in zip(filenames, not_duplicated) if not y]
+            files, recording_dt, extra_data, data_types = filter_upload_lists(
+                not_duplicated, files, recording_dt, extra_data, data_types)
 
             # If all files are duplicates, return early with a success status
             if len(files) == 0:
@@ -172,20 +425,6 @@ def create_file_objects(
                     logger.info("All files are already in the database.")
                 return (uploaded_files, invalid_files, existing_files, status.HTTP_200_OK)
 
-        # Filter recording datetime values based on non-duplicated files
-        if recording_dt and len(recording_dt) > 1:
-            recording_dt = [x for x, y in zip(
-                recording_dt, not_duplicated) if y]
-        # Filter extra data based on non-duplicated files
-        if len(extra_data) > 1:
-            extra_data = [x for x, y in zip(
-                extra_data, not_duplicated) if y]
-        # Filter data types based on non-duplicated files
-        if data_types is not None:
-            if len(data_types) > 1:
-                data_types = [x for x, y in zip(
-                    data_types, not_duplicated) if y]
-
     # If no device_object is provided but a deployment_object exists, set the device_object from the deployment_object
     if device_object is None and deployment_object:
         if verbose:
@@ -241,17 +480,16 @@ def create_file_objects(
                     extra_data = [x for x, y in zip(
                         extra_data, valid_files_bool) if y]
 
-            # Initialize list to store updated metadata for valid files
-
-            handler_return_list = []
-
-            # Process each valid file using the data handler
+            # Gather the inputs of the data handler for each valid file
+            all_file_recording_dt = []
+            all_file_extra_data = []
             for i in range(len(files)):
                 # Retrieve extra_data for the current file
                 if len(extra_data) > 1:
                     file_extra_data = extra_data[i]
                 else:
-                    file_extra_data = extra_data[0]
+                    # Copy shared extra data so files do not alter each other's metadata
+                    file_extra_data = dict(extra_data[0])
 
                 # Retrieve recording_dt for the current file
                 if recording_dt is None:
@@ -261,21 +499,25 @@ def create_file_objects(
                 else:
                     file_recording_dt = recording_dt[0]
 
-                file = files[i]
-
-                if verbose:
-                    logger.info(
-                        f"Handling file {file.name} with data handler...")
+                all_file_recording_dt.append(file_recording_dt)
+                all_file_extra_data.append(file_extra_data)
 
-                # Use the data handler to process the file and extract updated metadata
-                new_file_recording_dt, new_file_extra_data, new_file_data_type, new_file_task = \
-                    data_handler.handle_file(
-                        file,
-                        file_recording_dt,
-                        file_extra_data,
-                        device_model_object.type.name
-                    )
+            if verbose:
+                logger.info(
+                    f"Handling {len(files)} files with data handler...")
+
+            # Use the data handler to process the files and extract updated metadata, in input order
+            all_handler_returns = data_handler.handle_files(
+                files,
+                all_file_recording_dt,
+                all_file_extra_data,
+                device_model_object.type.name
+            )
 
+            # Initialize list to store updated metadata for valid files
+            handler_return_list = []
+            for file, (new_file_recording_dt, new_file_extra_data, new_file_data_type, new_file_task) in \
+                    zip(files, all_handler_returns):
                 # Append the updated metadata to the lists
                 handler_return_list.append({"file": file,
                                             "file_name": file.name,
@@ -306,7 +548,7 @@ def create_file_objects(
             logger.info("Checking permissions for deployment_object...")
         if request_user:
             # Check if the user has permission to attach files to the deployment object
-            if not request_user.has_perm('data_models.change_deployment', deployment_object):
+            if not lookup_cache.can_attach(deployment_object):
                 if verbose:
                     logger.info(
                         f"User does not have permission to attach files to {deployment_object.deployment_device_ID}.")
@@ -332,9 +574,9 @@ def create_file_objects(
         if verbose:
             logger.info(
                 "Determining deployments from device_object and recording dates...")
-        # Use the device object to find deployments based on recording dates
-        deployment_objects = [device_object.deployment_from_date(
-            x.get("recording_dt")) for x in handler_return_list]
+        # Use the device object to find deployments based on recording dates, loading its deployments once
+        deployment_objects = device_object.deployments_from_dates(
+            [x.get("recording_dt") for x in handler_return_list])
         # Check which deployments are valid (not None)
         valid_deployment_bool = [x is not None for x in deployment_objects]
         # Filter out None values from deployment_objects
@@ -369,12 +611,132 @@ def create_file_objects(
             logger.info("No valid files remain after filtering.")
         return (uploaded_files, invalid_files, existing_files, status.HTTP_400_BAD_REQUEST)
 
+    # Check if the user has permission to attach each file to its deployment.
+    # Done before deduplicating and reserving file numbers, so rejected files use neither.
+    if request_user:
+        file_deployments = [deployment_objects[i] if len(deployment_objects) > 1 else deployment_objects[0]
+                            for i in range(len(handler_return_list))]
+        can_attach_bool = [lookup_cache.can_attach(x) for x in file_deployments]
+        for handler_return, file_deployment, can_attach in zip(handler_return_list, file_deployments,
+                                                               can_attach_bool):
+            if not can_attach:
+                if verbose:
+                    logger.info(
+                        f"User does not have permission to attach file {handler_return.get('file_name')} "
+                        f"to {file_deployment.deployment_device_ID}.")
+                invalid_files.append(
+                    {handler_return.get("file_name"): {
+                        "message": f"Not allowed to attach files to {file_deployment.deployment_device_ID}",
+                        "status": 403}})
+        handler_return_list = [x for x, y in zip(
+            handler_return_list, can_attach_bool) if y]
+        if len(deployment_objects) > 1:
+            deployment_objects = [x for x, y in zip(
+                deployment_objects, can_attach_bool) if y]
+
+        if len(handler_return_list) == 0:
+            if verbose:
+                logger.info("No files can be attached by the user.")
+            if all([[y[x].get('status') == 403 for x in y.keys()][0] for y in invalid_files]):
+                return (uploaded_files, invalid_files, existing_files, status.HTTP_403_FORBIDDEN)
+            return (uploaded_files, invalid_files, existing_files, status.HTTP_400_BAD_REQUEST)
+
+    # Check for files whose contents are already attached to deployments of this device the user can change.
+    # Only done once deployments and permissions are known, so it cannot be used to find other users' files.
+    if deduplicate and not multipart:
+        if verbose:
+            logger.info("Checking for duplicate file contents in the database...")
+
+        file_md5s = [get_upload_md5(x.get("file")) for x in handler_return_list]
+
+        db_duplicates = DataFile.objects.filter(
+            deployment__device=device_object, md5_checksum__in=set(file_md5s))
+        if request_user is not None:
+            db_duplicates = db_duplicates.filter(deployment__in=perms['data_models.change_deployment'].filter(
+                request_user, Deployment.objects.filter(device=device_object)))
+            viewable_duplicates = perms['data_models.view_datafile'].filter(
+                request_user, db_duplicates)
+        else:
+            viewable_duplicates = db_duplicates
+        db_md5s = dict.fromkeys(
+            db_duplicates.values_list('md5_checksum', flat=True))
+        # Only name existing files the user can view
+        db_md5s.update(viewable_duplicates.values_list(
+            'md5_checksum', 'file_name'))
+
+        not_duplicated = []
+        upload_md5s = {}
+        for handler_return, file_md5 in zip(handler_return_list, file_md5s):
+            filename = handler_return.get("file_name")
+            if file_md5 in db_md5s:
+                message = f"Same contents as {db_md5s[file_md5]}" if db_md5s[file_md5] is not None \
+                    else "Same contents as an existing file"
+                existing_files.append({filename: {"message": message, "status": 200}})
+                not_duplicated.append(False)
+            elif file_md5 in upload_md5s:
+                existing_files.append(
+                    {filename: {"message": f"Same contents as {upload_md5s[file_md5]}", "status": 200}})
+                not_duplicated.append(False)
+            else:
+                upload_md5s[file_md5] = filename
+                not_duplicated.append(True)
+
+        handler_return_list = [x for x, y in zip(
+            handler_return_list, not_duplicated) if y]
+        if len(deployment_objects) > 1:
+            deployment_objects = [x for x, y in zip(
+                deployment_objects, not_duplicated) if y]
+
+        # If all files are duplicates, return early with a success status
+        if len(handler_return_list) == 0:
+            if verbose:
+                logger.info("All file contents are already in the database.")
+            return (uploaded_files, invalid_files, existing_files, status.HTTP_200_OK)
+
+    # Get the data type objects for all files
+    data_type_objects = {}
+    for data_type_name in set([x.get("data_type") for x in handler_return_list]):
+        data_type_objects[data_type_name] = lookup_cache.get_data_type(
+            data_type_name)
+
+    # Reserve a block of file numbers for each storage directory in a single operation
+    next_file_ns = {}
+    if not multipart or (multipart and multipart_obj is None):
+        directory_counts = {}
+        for i in range(len(handler_return_list)):
+            if len(deployment_objects) > 1:
+                file_deployment = deployment_objects[i]
+            else:
+                file_deployment = deployment_objects[0]
+            directory_key = (file_deployment.pk,
+                             handler_return_list[i].get("data_type"))
+            if directory_key not in directory_counts:
+                directory_counts[directory_key] = {
+                    "deployment": file_deployment, "n": 0}
+            directory_counts[directory_key]["n"] += 1
+
+        for directory_key, directory_count in directory_counts.items():
+            file_data_type = data_type_objects[directory_key[1]]
+            file_deployment = directory_count["deployment"]
+            if verbose:
+                logger.info(
+                    f"Reserving {directory_count['n']} file numbers for {file_deployment} {file_data_type}...")
+            next_file_ns[directory_key] = FileNameSequence.allocate(
+                file_deployment,
+                file_data_type,
+                upload_dt.date(),
+                directory_count["n"],
+                os.path.join(settings.FILE_STORAGE_ROOT, file_data_type.name,
+                             file_deployment.deployment_device_ID, str(upload_dt.date()))
+            )
+
     # Initialize lists to store project task primary keys, new DataFile objects, and handler tasks
     project_task_pks = []
     all_new_objects = []
     all_handler_tasks = []
+    prepared_files = []
 
-    # Process each valid file
+    # Prepare each valid file
     for i in range(len(handler_return_list)):
         handler_return = handler_return_list[i]
 
@@ -391,16 +753,6 @@ def create_file_objects(
             logger.info(
                 f"Processing file: {filename} for deployment: {file_deployment.deployment_device_ID}")
 
-        # Check if the user has permission to attach the file to the deployment
-        if request_user:
-            if not request_user.has_perm('data_models.change_deployment', file_deployment):
-                if verbose:
-                    logger.info(
-                        f"User does not have permission to attach file {filename} to {file_deployment.deployment_device_ID}.")
-                invalid_files.append(
-                    {filename: {"message": f"Not allowed to attach files to {file_deployment.deployment_device_ID}", "status": 403}})
-                continue
-
         # Determine the recording datetime for the current file
         file_recording_dt = handler_return.get("recording_dt")
 
@@ -420,8 +772,7 @@ def create_file_objects(
         file_data_type_name = handler_return.get("data_type")
 
         # Determine the data type for the current file
-        file_data_type, created = DataType.objects.get_or_create(
-            name=file_data_type_name)
+        file_data_type = data_type_objects[file_data_type_name]
 
         if verbose:
             logger.info(f"Setting local path for file: {filename}...")
@@ -442,11 +793,17 @@ def create_file_objects(
             # Extract the file extension from the original filename
             file_extension = os.path.splitext(filename)[1]
 
-            # Generate a new unique name for the file based on deployment, recording datetime, and file count
+            # Take the next reserved file number for this directory
+            directory_key = (file_deployment.pk, file_data_type_name)
+            file_n = next_file_ns[directory_key]
+            next_file_ns[directory_key] += 1
+
+            # Generate a new unique name for the file based on deployment, recording datetime, and file number
             new_file_name = get_new_name(file_deployment,
                                          file_recording_dt,
                                          file_local_path,
-                                         file_path
+                                         file_path,
+                                         file_n
                                          )
 
             # Get the size of the file
@@ -478,35 +835,70 @@ def create_file_objects(
                 file_size=file_size,  # Size of the file
                 extra_data=file_extra_data  # Additional metadata
             )
-            try:
-                # Validate the new DataFile object to ensure all fields meet the model's constraints
-                new_datafile_obj.full_clean()
-            except ValidationError as e:
+
+        else:
+            # Retrieve the full path for the multipart object
+            file_fullpath = multipart_obj.full_path()
+            new_datafile_obj = None
+
+        prepared_files.append({"file": file,
+                               "file_name": filename,
+                               "deployment": file_deployment,
+                               "task": file_handler_task,
+                               "datafile_obj": new_datafile_obj,
+                               "full_path": file_fullpath})
+
+    # Validate all new DataFile objects together to ensure all fields meet the model's constraints
+    new_prepared_files = [
+        x for x in prepared_files if x.get("datafile_obj") is not None]
+    if len(new_prepared_files) > 0:
+        if verbose:
+            logger.info(
+                f"Validating {len(new_prepared_files)} new DataFile objects...")
+        validation_errors = DataFile.batch_full_clean(
+            [x.get("datafile_obj") for x in new_prepared_files])
+        for prepared_file, validation_error in zip(new_prepared_files, validation_errors):
+            prepared_file["validation_error"] = validation_error
+
+    # Save each valid file
+    for prepared_file in prepared_files:
+        file = prepared_file.get("file")
+        filename = prepared_file.get("file_name")
+        file_deployment = prepared_file.get("deployment")
+        file_handler_task = prepared_file.get("task")
+        new_datafile_obj = prepared_file.get("datafile_obj")
+        file_fullpath = prepared_file.get("full_path")
+
+        if (validation_error := prepared_file.get("validation_error")) is not None:
+            if isinstance(validation_error, ValidationError):
                 # Handle validation errors specific to the DataFile model
                 if verbose:
                     logger.info(
                         f"Error creating database objects for: {filename}...")
                 # Add the file to the invalid_files list with a detailed error message
                 invalid_files.append(
-                    {filename: {"message": f"Error creating database records {repr(e)}", "status": 400}})
-                # Skip further processing for this file
-                continue
-            except Exception as e:
+                    {filename: {"message": f"Error creating database records {repr(validation_error)}", "status": 400}})
+            else:
                 # Handle any other unexpected exceptions during validation
                 invalid_files.append(
-                    {filename: {"message": repr(e), "status": 400}})
-                # Skip further processing for this file
-                continue
-
-        else:
-            # Retrieve the full path for the multipart object
-            file_fullpath = multipart_obj.full_path()
+                    {filename: {"message": repr(validation_error), "status": 400}})
+            # Skip further processing for this file
+            continue
 
         try:
             if verbose:
                 logger.info(f"Saving file to path: {file_fullpath}...")
             # Try to save the file
-            handle_uploaded_file(file, file_fullpath, multipart, verbose)
+            if multipart:
+                file_hasher = multipart_hasher
+            elif getattr(file, "md5_checksum", None):
+                # Already hashed while streaming the upload, or while deduplicating
+                file_hasher = None
+            else:
+                file_hasher = hashlib.md5()
+            handle_uploaded_file(file, file_fullpath, multipart, verbose,
+                                 multipart_offset if multipart else None,
+                                 file_hasher)
         except Exception as e:
             if verbose:
                 logger.info(
@@ -519,6 +911,22 @@ def create_file_objects(
 
             continue
 
+        if multipart:
+            # Save the position and checksum state for the next chunk
+            chunk_extra_data = {"multipart_offset": multipart_offset + file.size}
+            if multipart_checksum is None:
+                multipart_file_name = new_datafile_obj.file_name if multipart_obj is None else multipart_obj.file_name
+                save_multipart_hasher(multipart_file_name, multipart_offset + file.size, multipart_hasher)
+            if multipart_obj is None:
+                new_datafile_obj.extra_data.update(chunk_extra_data)
+            elif multipart_checksum is None:
+                multipart_obj.extra_data.update(chunk_extra_data)
+                multipart_obj.save()
+
+        if not multipart:
+            new_datafile_obj.md5_checksum = file_hasher.hexdigest(
+            ) if file_hasher is not None else file.md5_checksum
+
         if not multipart or (multipart and multipart_obj is None):
             # Set the file URL when first registered in the database
             if verbose:
@@ -536,8 +944,12 @@ def create_file_objects(
                 if verbose:
                     logger.info(
                         f"Performing MD5 checksum validation for multipart file: {multipart_obj.original_name}...")
-                # Calculate the server-side checksum of the uploaded file
-                server_checksum = get_md5(multipart_obj.full_path())
+                # Calculate the server-side checksum of the uploaded file.
+                # Only re-read the file if the checksum could not be resumed.
+                if multipart_hasher is not None:
+                    server_checksum = multipart_hasher.hexdigest()
+                else:
+                    server_checksum = get_md5(multipart_obj.full_path())
                 if verbose:
                     logger.info(
                         f"Server checksum: {server_checksum}, Client checksum: {multipart_checksum}")
@@ -559,8 +971,13 @@ def create_file_objects(
                     # Update the extra_data field with the validated checksum
                     multipart_extra_data = multipart_obj.extra_data
                     multipart_extra_data['md5_checksum'] = server_checksum
-                    # Remove the multipart_complete flag from the metadata
+                    multipart_obj.md5_checksum = server_checksum
+                    # Remove the multipart_complete flag and chunk state from the metadata
                     multipart_extra_data.pop("multipart_complete")
+                    multipart_extra_data.pop("multipart_offset", None)
+                    # Saved by uploads from before the checksum state was kept in the cache
+                    multipart_extra_data.pop("multipart_md5_state", None)
+                    save_multipart_hasher(multipart_obj.file_name, 0, None)
                     # Save the updated metadata to the database
                     multipart_obj.extra_data = multipart_extra_data
                     multipart_obj.save()
@@ -575,10 +992,9 @@ def create_file_objects(
             if verbose:
                 logger.info(
                     f"Fetching deployment tasks for file: {filename}...")
-            file_deployment_tasks = list(file_deployment.project.all().values_list(
-                'automated_tasks__pk', flat=True))  # Retrieve primary keys of automated tasks linked to the deployment
-            file_deployment_tasks = [
-                x for x in file_deployment_tasks if x is not None]  # Filter out None values from the task list
+            # Retrieve primary keys of automated tasks linked to the deployment
+            file_deployment_tasks = lookup_cache.get_project_tasks(
+                file_deployment)
             if verbose:
                 logger.info(
                     f"Deployment tasks for file {filename}: {file_deployment_tasks}")
@@ -594,6 +1010,9 @@ def create_file_objects(
             project_task_pks.append(
                 {"original_name": filename, "tasks": file_deployment_tasks})
 
+    if verbose:
+        logger.info(f"Lookup cache counters: {lookup_cache.counters}")
+
     final_status = status.HTTP_200_OK
 
     if len(all_new_objects) > 0 or multipart:
@@ -603,6 +1022,12 @@ def create_file_objects(
                 logger.info(
                     f"Bulk creating {len(all_new_objects)} new DataFile objects...")
             uploaded_files = DataFile.objects.bulk_create(all_new_objects)
+            # bulk_create does not send post_save signals
+            index_new_datafiles(uploaded_files)
+            update_search_documents_pks([x.pk for x in uploaded_files])
+            DeploymentDailyFileStats.refresh(
+                DataFile.objects.filter(pk__in=[x.pk for x in uploaded_files]))
+            invalidate_file_counts({x.deployment_id for x in uploaded_files})
             uploaded_files_name_pks = [
                 {"original_name": x.original_name, "pk": x.pk} for x in uploaded_files]
             if verbose:
@@ -702,13 +1127,181 @@ def create_file_objects(
     return (uploaded_files, invalid_files, existing_files, final_status)
 
 
+def stage_ingest_batch(
+    files: List[Union[object, UploadedFile]],
+    check_filename: bool = False,
+    recording_dt: Optional[List[Optional[dt]]] = None,
+    extra_data: Optional[List[Dict[str,
+                                   Union[str, int, float, bool, None]]]] = None,
+    deployment_object: Optional["Deployment"] = None,
+    device_object: Optional["Device"] = None,
+    data_types: Optional[List[str]] = None,
+    request_user: Optional["User"] = None,
+    verbose: bool = False,
+    deduplicate: bool = False
+) -> "IngestBatch":
+    """
+    Write uploaded files to a staging directory and record them in an IngestBatch, to be processed later
+    by process_ingest_batch.
+
+    Args:
+        files (List[Union[object, UploadedFile]]): List of file objects to stage.
+        check_filename (bool, optional): If True, check for duplicate filenames in the database. Defaults to False.
+        recording_dt (Optional[List[Optional[datetime]]], optional): List of recording datetimes for the files. Defaults to None.
+        extra_data (Optional[List[Dict[str, Union[str, int, float, bool, None]]]], optional): List of additional metadata for the files. Defaults to None.
+        deployment_object (Optional[Deployment], optional): Deployment object associated with the files. Defaults to None.
+        device_object (Optional[Device], optional): Device object associated with the files. Defaults to None.
+        data_types (Optional[List[str]], optional): List of data types for the files. Defaults to None.
+        request_user (Optional[User], optional): User object for permission checks. Defaults to None.
+        verbose (bool, optional): If True, enable verbose logging. Defaults to False.
+        deduplicate (bool, optional): If True, skip files with the same contents as a file already attached
+            to the device. Defaults to False.
+
+    Returns:
+        IngestBatch: The new ingest batch.
+    """
+    from data_models.models import IngestBatch
+
+    ingest_batch = IngestBatch.objects.create(
+        owner=request_user,
+        parameters={
+            "check_filename": check_filename,
+            "deduplicate": deduplicate,
+            "recording_dt": [x.isoformat() if x is not None else None for x in recording_dt]
+            if recording_dt is not None else None,
+            "extra_data": extra_data,
+            "deployment": deployment_object.pk if deployment_object else None,
+            "device": device_object.pk if device_object else None,
+            "data_types": [str(x) for x in data_types] if data_types is not None else None,
+        })
+
+    ingest_batch.staging_path = os.path.join(
+        settings.FILE_STORAGE_ROOT, settings.INGEST_STAGING_PATH, str(ingest_batch.pk))
+    manifest = []
+    for idx, file in enumerate(files):
+        # Prefix with the file index so that files with the same name do not overwrite each other
+        staged_path = os.path.join(
+            ingest_batch.staging_path, f"{idx}_{os.path.basename(file.name)}")
+        handle_uploaded_file(file, staged_path, verbose=verbose)
+        manifest.append({"staged_path": staged_path,
+                        "original_name": file.name,
+                        "md5_checksum": getattr(file, "md5_checksum", None)})
+
+    ingest_batch.manifest = manifest
+    ingest_batch.save()
+    if verbose:
+        logger.info(f"Staged {len(manifest)} files in {ingest_batch}")
+    return ingest_batch
+
+
+def process_ingest_batch(ingest_batch: "IngestBatch", verbose: bool = False) -> None:
+    """
+    Create DataFiles from the staged files of an IngestBatch, in chunks of settings.INGEST_CHUNK_SIZE files.
+    Results are recorded on the IngestBatch in the same format as returned by create_file_objects.
+
+    The results of each chunk are committed together with its DataFiles, and its staged files are then removed.
+    If a chunk fails, the batch is marked as failed and the files of that chunk and later chunks are kept,
+    so that processing the batch again resumes from the failed chunk.
+
+    Args:
+        ingest_batch (IngestBatch): Batch to process.
+        verbose (bool, optional): If True, enable verbose logging. Defaults to False.
+    """
+    from data_models.models import Deployment, Device, IngestBatch
+
+    if ingest_batch.status == IngestBatch.Status.COMPLETE:
+        return
+
+    ingest_batch.status = IngestBatch.Status.RUNNING
+    ingest_batch.save()
+
+    parameters = ingest_batch.parameters
+    recording_dt = parameters.get("recording_dt")
+    if recording_dt is not None:
+        recording_dt = [dt.fromisoformat(x) if x is not None else None
+                        for x in recording_dt]
+    extra_data = parameters.get("extra_data")
+    data_types = parameters.get("data_types")
+    deployment_object = Deployment.objects.filter(
+        pk=parameters.get("deployment")).first()
+    device_object = Device.objects.filter(
+        pk=parameters.get("device")).first()
+    lookup_cache = UploadLookupCache(ingest_batch.owner)
+
+    def chunk_list(value_list, start, end):
+        # Lists of a single value apply to every file
+        if value_list is None or len(value_list) <= 1:
+            return value_list
+        return value_list[start:end]
+
+    manifest = ingest_batch.manifest
+    chunk_size = settings.INGEST_CHUNK_SIZE
+    if verbose and ingest_batch.n_processed > 0:
+        logger.info(
+            f"Resuming {ingest_batch} from file {ingest_batch.n_processed}")
+    try:
+        for start in range(ingest_batch.n_processed, len(manifest), chunk_size):
+            end = start + chunk_size
+            files = []
+            try:
+                for manifest_file in manifest[start:end]:
+                    file = File(
+                        open(manifest_file["staged_path"], "rb"), name=manifest_file["original_name"])
+                    # Checksum calculated when the upload was streamed, if any
+                    file.md5_checksum = manifest_file.get("md5_checksum")
+                    files.append(file)
+                with transaction.atomic(), connection.cursor() as cursor:
+                    # Remove db limits during this function.
+                    cursor.execute('SET LOCAL statement_timeout TO 0;')
+                    uploaded_files, invalid_files, existing_files, status_code = create_file_objects(
+                        files,
+                        parameters.get("check_filename", False),
+                        chunk_list(recording_dt, start, end),
+                        chunk_list(extra_data, start, end),
+                        deployment_object,
+                        device_object,
+                        chunk_list(data_types, start, end),
+                        ingest_batch.owner,
+                        verbose=verbose,
+                        lookup_cache=lookup_cache,
+                        deduplicate=parameters.get("deduplicate", False))
+
+                    # Record the chunk as processed in the same transaction as its DataFiles
+                    ingest_batch.uploaded_files += [x.pk for x in uploaded_files]
+                    ingest_batch.invalid_files += invalid_files
+                    ingest_batch.existing_files += existing_files
+                    ingest_batch.n_processed = min(end, len(manifest))
+                    if ingest_batch.status_code is None or status_code == status.HTTP_201_CREATED:
+                        # Created if any chunk created files, otherwise the status of the first chunk
+                        ingest_batch.status_code = status_code
+                    ingest_batch.save()
+            finally:
+                for file in files:
+                    file.close()
+
+            # Staged files of a committed chunk are no longer needed
+            for manifest_file in manifest[start:end]:
+                if os.path.exists(manifest_file["staged_path"]):
+                    os.remove(manifest_file["staged_path"])
+
+        ingest_batch.status = IngestBatch.Status.COMPLETE
+        shutil.rmtree(ingest_batch.staging_path, ignore_errors=True)
+    except Exception as e:
+        logger.error(f"{ingest_batch} failed: {repr(e)}")
+        # Reload the results of the chunks that were committed
+        ingest_batch.refresh_from_db()
+        ingest_batch.status = IngestBatch.Status.FAILED
+    finally:
+        ingest_batch.save()
+
+
 def handle_uploaded_file(
     file: Union[object, UploadedFile],
     filepath: str,
     multipart: bool = False,
-    verbose: bool = False
-
-
+    verbose: bool = False,
+    offset: Optional[int] = None,
+    hasher: Optional[Any] = None
 ) -> None:
     """
     Upload and save a file to the specified filepath.
@@ -718,6 +1311,13 @@ def handle_uploaded_file(
         filepath (str): The destination path.
         multipart (bool, optional): If True, append to an existing file. Defaults to False.
         verbose (bool, optional): If True, log debug info. Defaults to False.
+        offset (int, optional): When appending, the expected size of the existing file. Any bytes past this offset,
+            left by a chunk that was written but never recorded, are discarded first. Defaults to None.
+        hasher (ResumableMD5 | hashlib hash, optional): Hash to update with each written chunk. Defaults to None.
+
+    Notes:
+        - Files streamed to the upload staging directory by StorageStagingUploadHandler are moved
+          into place with a rename instead of being copied.
 
     Raises:
         OSError: If creating directories or writing to the file fails.
@@ -731,14 +1331,36 @@ def handle_uploaded_file(
         if verbose:
             logger.info(f"Appending to {filepath}")
         with open(filepath, 'ab+') as destination:
+            if offset is not None:
+                destination.truncate(offset)
             for chunk in file.chunks():
                 destination.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+    elif isinstance(file, StagedUploadedFile):
+        # Already streamed onto the storage filesystem, so move rather than copy
+        if verbose:
+            logger.info(f"Moving {file.temporary_file_path()} to {filepath}")
+        try:
+            os.rename(file.temporary_file_path(), filepath)
+        except OSError as e:
+            # Staging directory is on another filesystem
+            logger.warning(f"Could not move staged upload, copying instead: {repr(e)}")
+            with open(filepath, 'wb+') as destination:
+                for chunk in file.chunks():
+                    destination.write(chunk)
+        os.chmod(filepath, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+        if hasher is not None:
+            for chunk in file.chunks():
+                hasher.update(chunk)
     else:
         if verbose:
             logger.info(f"Writing to {filepath}")
         with open(filepath, 'wb+') as destination:
             for chunk in file.chunks():
                 destination.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
 
 
 def get_new_name(
@@ -1,10 +1,12 @@
 import django_filters.rest_framework
 from django.db.models import BooleanField, Case, ExpressionWrapper, F, Q, When
 from observation_editor.models import Observation
+from rest_framework.filters import SearchFilter
 from utils.filtersets import ExtraDataFilterMixIn, GenericFilterMixIn
 
 from .models import (DataFile, DataType, Deployment, Device, DeviceModel,
                      Project)
+from .search_functions import search_terms_query
 
 
 class DataTypeFilter(GenericFilterMixIn):
@@ -270,6 +272,23 @@ class DataFileFilter(GenericFilterMixIn, ExtraDataFilterMixIn):
         })
 
 
+class DataFileSearchFilter(SearchFilter):
+    """
+    Search backend for DataFiles, matching search terms against the search document of each file
+    rather than joining observations and taxa. The search document combines the file name, tag and
+    names of observed taxa. All search terms must match.
+
+    Tags are matched in the same way as file and taxon names, so a term can match part of a tag,
+    rather than only matching the whole tag as with the previous '=tag' search field.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        return queryset.filter(search_terms_query(search_terms))
+
+
 class DeviceModelFilter(GenericFilterMixIn, ExtraDataFilterMixIn):
     """
     FilterSet for DeviceModel, allowing queries on type and name fields.
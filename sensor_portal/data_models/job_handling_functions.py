@@ -2,6 +2,7 @@ import logging
 from typing import Any, Callable, Dict
 
 from django.conf import settings
+from django.db.models import QuerySet
 from rest_framework import status
 
 from sensor_portal.celery import app
@@ -15,7 +16,8 @@ def register_job(
     task_data_type: str,
     task_admin_only: bool = False,
     max_items: int = 500,
-    default_args: Dict[str, Any] = {}
+    default_args: Dict[str, Any] = {},
+    chunked: bool = False
 ) -> Callable:
     """
     Decorator to register a function as a plug-in for a generic job.
@@ -27,6 +29,8 @@ def register_job(
         task_admin_only (bool, optional): Whether the task is restricted to admin users. Defaults to False.
         max_items (int, optional): The maximum number of items the task can process. Defaults to 500.
         default_args (Dict[str, Any], optional): Default arguments for the task. Defaults to an empty dictionary.
+        chunked (bool, optional): Whether the task can be run on chunks of a selection independently.
+            Chunked tasks run over a filtered queryset are not limited by max_items. Defaults to False.
 
     Returns:
         Callable: A decorator function that registers the task.
@@ -42,6 +46,7 @@ def register_job(
             "admin_only": task_admin_only,
             "max_items": max_items,
             "default_args": default_args,
+            "chunked": chunked,
         }
         logger.info(f"Registered generic task {task_name}")
         return func
@@ -99,22 +104,86 @@ def start_job_from_name(
             - A message describing the result.
             - An HTTP status code.
     """
+    job_dict, detail, job_status = check_job(job_name, user_pk)
+    if job_dict is None:
+        return False, detail, job_status
+
+    if user_pk is not None and len(obj_pks) > job_dict["max_items"]:
+        return False, "Too many items for this job", status.HTTP_400_BAD_REQUEST
+
+    new_task = get_job_from_name(
+        job_name, obj_type, obj_pks, job_args, user_pk
+    )
+    new_task.apply_async()
+    return True, f"{job_name} started", status.HTTP_200_OK
+
+
+def start_job_from_queryset(
+    job_name: str,
+    obj_type: str,
+    queryset: QuerySet,
+    job_args: dict[str, Any],
+    user_pk: int | None = None
+) -> tuple[bool, str, int]:
+    """
+    Starts a job on all objects of a filtered queryset. The selected primary keys are stored in the database,
+    and only the ID of the selection is sent to the worker, which then runs the job over it in chunks.
+
+    Args:
+        job_name (str): The name of the job to be executed.
+        obj_type (str): The type of object associated with the job (e.g., "datafile", "deployment").
+        queryset (QuerySet): Filtered queryset of the objects to run the job on.
+        job_args (dict[str, Any]): Additional arguments required for the job execution.
+        user_pk (int | None, optional): The primary key of the user initiating the job. Defaults to None.
+
+    Returns:
+        tuple[bool, str, int]: A tuple containing:
+            - A boolean indicating success or failure.
+            - A message describing the result.
+            - An HTTP status code.
+    """
+    from data_models.models import JobSelection
+
+    job_dict, detail, job_status = check_job(job_name, user_pk)
+    if job_dict is None:
+        return False, detail, job_status
+
+    if user_pk is not None and not job_dict["chunked"] and \
+            queryset.count() > job_dict["max_items"]:
+        return False, "Too many items for this job", status.HTTP_400_BAD_REQUEST
+
+    selection = JobSelection.from_queryset(queryset, obj_type, user_pk)
+    new_task = app.signature("run_job_selection",
+                             kwargs={"job_name": job_name, "selection_pk": selection.pk,
+                                     "job_args": job_args, "user_pk": user_pk},
+                             immutable=True)
+    new_task.apply_async()
+    return True, f"{job_name} started", status.HTTP_200_OK
+
+
+def check_job(job_name: str, user_pk: int | None = None) -> tuple[dict[str, Any] | None, str, int]:
+    """
+    Check that a job is registered and that the user is permitted to run it.
+
+    Args:
+        job_name (str): The name of the job to be executed.
+        user_pk (int | None, optional): The primary key of the user initiating the job. Defaults to None.
+
+    Returns:
+        tuple[dict[str, Any] | None, str, int]: A tuple containing:
+            - The registered job, or None if it cannot be run.
+            - A message describing the result.
+            - An HTTP status code.
+    """
     from user_management.models import User
 
     job_dict = settings.GENERIC_JOBS.get(job_name)
     if job_dict is None:
-        return False, "Not a registered job", status.HTTP_404_NOT_FOUND
+        return None, "Not a registered job", status.HTTP_404_NOT_FOUND
 
     if user_pk is not None:
         user_obj = User.objects.get(pk=user_pk)
         if job_dict["admin_only"] and not user_obj.is_staff:
-            return False, "You are not permitted to run this job", status.HTTP_403_FORBIDDEN
+            return None, "You are not permitted to run this job", status.HTTP_403_FORBIDDEN
 
-        if len(obj_pks) > job_dict["max_items"]:
-            return False, "Too many items for this job", status.HTTP_400_BAD_REQUEST
-
-    new_task = get_job_from_name(
-        job_name, obj_type, obj_pks, job_args, user_pk
-    )
-    new_task.apply_async()
-    return True, f"{job_name} started", status.HTTP_200_OK
+    return job_dict, "", status.HTTP_200_OK
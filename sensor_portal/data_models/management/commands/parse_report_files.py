@@ -0,0 +1,21 @@
+from data_models.models import DataFile
+from data_models.plotting_functions import parse_report_files
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    """Django command to parse report files which have not been parsed yet into report metrics"""
+
+    help = "Parse report files which have not been parsed yet into report metrics."
+
+    def add_arguments(self, parser):
+        parser.add_argument('deployment_pks', nargs='*', type=int,
+                            help="Database IDs of deployments to parse report files of. All deployments if not given.")
+
+    def handle(self, *args, **options):
+        data_files = DataFile.objects.all()
+        if options['deployment_pks']:
+            data_files = data_files.filter(deployment__pk__in=options['deployment_pks'])
+        n_parsed = parse_report_files(data_files)
+        self.stdout.write(self.style.SUCCESS(
+            f'Parsed {n_parsed} report files'))
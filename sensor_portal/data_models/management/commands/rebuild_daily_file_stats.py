@@ -0,0 +1,24 @@
+from data_models.models import Deployment, DeploymentDailyFileStats
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    """Django command to recalculate the daily file statistics of deployments from their files"""
+
+    help = "Recalculate the daily file statistics of deployments from their files."
+
+    def add_arguments(self, parser):
+        parser.add_argument('deployment_pks', nargs='*', type=int,
+                            help="Database IDs of deployments to recalculate. All deployments if not given.")
+
+    def handle(self, *args, **options):
+        deployments = Deployment.objects.all().order_by('pk')
+        if options['deployment_pks']:
+            deployments = deployments.filter(pk__in=options['deployment_pks'])
+        n_deployments = deployments.count()
+        for i, deployment in enumerate(deployments.iterator()):
+            DeploymentDailyFileStats.rebuild(deployment)
+            self.stdout.write(
+                f'Rebuilt daily file statistics of {deployment.deployment_device_ID} ({i+1}/{n_deployments})')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt daily file statistics of {n_deployments} deployments'))
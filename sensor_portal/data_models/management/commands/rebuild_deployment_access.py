@@ -0,0 +1,22 @@
+from data_models.models import Deployment, DeploymentAccess
+from django.core.management import BaseCommand
+
+
+class Command(BaseCommand):
+    """Django command to recalculate the deployment access table from the managers, annotators and viewers of deployments"""
+
+    help = "Recalculate the deployment access table from the managers, annotators and viewers of deployments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('deployment_pks', nargs='*', type=int,
+                            help="Database IDs of deployments to recalculate. All deployments if not given.")
+
+    def handle(self, *args, **options):
+        deployments = Deployment.objects.all().order_by('pk')
+        if options['deployment_pks']:
+            deployments = deployments.filter(pk__in=options['deployment_pks'])
+        n_deployments = deployments.count()
+        for deployment in deployments.iterator():
+            DeploymentAccess.rebuild(deployment)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt access of {n_deployments} deployments'))
@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-17 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0032_deployment_annotators_deployment_managers_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FileNameSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('modified_on', models.DateTimeField(auto_now=True)),
+                ('upload_date', models.DateField(help_text='Date on which files in this sequence were uploaded.')),
+                ('last_n', models.IntegerField(default=0, help_text='Last file number handed out in this sequence.')),
+                ('deployment', models.ForeignKey(help_text='Deployment of files in this sequence.', on_delete=django.db.models.deletion.CASCADE, related_name='file_name_sequences', to='data_models.deployment')),
+                ('file_type', models.ForeignKey(help_text='Data type of files in this sequence.', on_delete=django.db.models.deletion.CASCADE, related_name='file_name_sequences', to='data_models.datatype')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='filenamesequence',
+            constraint=models.UniqueConstraint(fields=('deployment', 'file_type', 'upload_date'), name='unique_file_name_sequence'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-17 10:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('data_models', '0033_filenamesequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('modified_on', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('staged', 'Staged'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed')], default='staged', help_text='Processing status of this batch.', max_length=10)),
+                ('staging_path', models.CharField(help_text='Directory in which the files of this batch are staged.', max_length=500)),
+                ('manifest', models.JSONField(blank=True, default=list, help_text='Staged path and original name of each file in this batch.')),
+                ('parameters', models.JSONField(blank=True, default=dict, help_text='Upload parameters of this batch.')),
+                ('uploaded_files', models.JSONField(blank=True, default=list, help_text='Primary keys of DataFiles created from this batch.')),
+                ('invalid_files', models.JSONField(blank=True, default=list, help_text='Files of this batch that could not be uploaded.')),
+                ('existing_files', models.JSONField(blank=True, default=list, help_text='Files of this batch that were already in the database.')),
+                ('status_code', models.IntegerField(blank=True, help_text='HTTP status code of the completed batch.', null=True)),
+                ('owner', models.ForeignKey(blank=True, help_text='User who uploaded this batch.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingest_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0034_ingestbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datafile',
+            name='md5_checksum',
+            field=models.CharField(blank=True, db_index=True, help_text='MD5 checksum of the file contents.', max_length=32, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0035_datafile_md5_checksum'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='datafile',
+            index=models.Index(fields=['recording_dt', 'id'], name='recording_dt_id_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2 on 2026-10-17 16:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models import Max
+
+BATCH_SIZE = 10000
+
+
+def populate_search_documents(apps, schema_editor):
+    DataFile = apps.get_model('data_models', 'DataFile')
+    Observation = apps.get_model('observation_editor', 'Observation')
+    Taxon = apps.get_model('observation_editor', 'Taxon')
+    data_files_field = Observation._meta.get_field('data_files')
+    through_table = data_files_field.remote_field.through._meta.db_table
+    quote_name = schema_editor.quote_name
+
+    # File name, tag and the names of observed taxa, as built by search_functions.search_text_expression
+    # when this migration was written
+    search_text_sql = f"""
+        UPDATE {quote_name(DataFile._meta.db_table)} AS datafile
+        SET search_text = CONCAT(datafile.file_name, ' ', COALESCE(datafile.tag, ''), ' ', COALESCE((
+            SELECT STRING_AGG(DISTINCT CONCAT(taxon.species_name, ' ', taxon.species_common_name), ' ')
+            FROM {quote_name(through_table)} AS observation_datafile
+            JOIN {quote_name(Observation._meta.db_table)} AS observation
+                ON observation.id = observation_datafile.{quote_name(data_files_field.m2m_column_name())}
+            JOIN {quote_name(Taxon._meta.db_table)} AS taxon ON taxon.id = observation.taxon_id
+            WHERE observation_datafile.{quote_name(data_files_field.m2m_reverse_name())} = datafile.id
+        ), ''))
+        WHERE datafile.id >= %s AND datafile.id < %s
+    """
+    search_vector_sql = f"""
+        UPDATE {quote_name(DataFile._meta.db_table)}
+        SET search_vector = to_tsvector('simple'::regconfig, COALESCE(search_text, ''))
+        WHERE id >= %s AND id < %s
+    """
+
+    max_pk = DataFile.objects.aggregate(max_pk=Max('pk'))['max_pk'] or 0
+    for start_pk in range(0, max_pk + 1, BATCH_SIZE):
+        schema_editor.execute(search_text_sql, [start_pk, start_pk + BATCH_SIZE])
+        schema_editor.execute(search_vector_sql, [start_pk, start_pk + BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0036_datafile_recording_dt_id_idx'),
+        ('observation_editor', '0014_alter_observation_id_alter_taxon_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datafile',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False,
+                                   help_text='Search document combining file name, tag and names of observed taxa.'),
+        ),
+        migrations.AddField(
+            model_name='datafile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, help_text='Text search vector of the search document.', null=True),
+        ),
+        migrations.RunPython(populate_search_documents,
+                             migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='datafile',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(
+                django.db.models.functions.text.Upper('search_text'), name='gin_trgm_ops'), name='upper_search_text_gin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='datafile',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['search_vector'], name='search_vector_gin_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2 on 2026-10-17 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_daily_file_stats(apps, schema_editor):
+    DataFile = apps.get_model('data_models', 'DataFile')
+    DeploymentDailyFileStats = apps.get_model(
+        'data_models', 'DeploymentDailyFileStats')
+    rows = DataFile.objects.order_by().annotate(date=TruncDate('recording_dt')).values(
+        'deployment_id', 'date', 'file_type_id', 'has_human').annotate(
+            n_files=Count('id'), file_volume=Sum('file_size'))
+    DeploymentDailyFileStats.objects.bulk_create(
+        (DeploymentDailyFileStats(**x) for x in rows.iterator()), batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0037_datafile_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeploymentDailyFileStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('modified_on', models.DateTimeField(auto_now=True)),
+                ('date', models.DateField(help_text='Recording date of the counted files.', null=True)),
+                ('has_human', models.BooleanField(default=False, help_text='True if the counted files have been annotated with a human.')),
+                ('n_files', models.IntegerField(default=0, help_text='Number of files.')),
+                ('file_volume', models.BigIntegerField(default=0, help_text='Total size of files in bytes.')),
+                ('deployment', models.ForeignKey(help_text='Deployment of the counted files.', on_delete=django.db.models.deletion.CASCADE, related_name='daily_file_stats', to='data_models.deployment')),
+                ('file_type', models.ForeignKey(help_text='Data type of the counted files.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_file_stats', to='data_models.datatype')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='deploymentdailyfilestats',
+            index=models.Index(fields=['deployment', 'date'], name='daily_file_stats_idx'),
+        ),
+        migrations.RunPython(populate_daily_file_stats,
+                             migrations.RunPython.noop),
+    ]
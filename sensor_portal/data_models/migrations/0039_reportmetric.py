@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-17 17:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0038_deploymentdailyfilestats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text="Name of the report column, in the format 'metric__unit'.", max_length=100)),
+                ('dt', models.DateTimeField(help_text='Datetime of this value.')),
+                ('value', models.FloatField(help_text='Value of the metric.')),
+                ('data_file', models.ForeignKey(help_text='Report file from which this value was parsed.', on_delete=django.db.models.deletion.CASCADE, related_name='report_metrics', to='data_models.datafile')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reportmetric',
+            index=models.Index(fields=['data_file', 'name', 'dt'], name='report_metric_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-17 17:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_deployment_access(apps, schema_editor):
+    Deployment = apps.get_model('data_models', 'Deployment')
+    DeploymentAccess = apps.get_model('data_models', 'DeploymentAccess')
+    for field_name, role in [('managers', 'manager'), ('annotators', 'annotator'), ('viewers', 'viewer')]:
+        through = getattr(Deployment, field_name).through
+        DeploymentAccess.objects.bulk_create(
+            (DeploymentAccess(deployment_id=deployment_pk, user_id=user_pk, role=role)
+             for deployment_pk, user_pk in through.objects.values_list('deployment_id', 'user_id').iterator()),
+            batch_size=5000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('data_models', '0039_reportmetric'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeploymentAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('role', models.CharField(choices=[('manager', 'Manager'), ('annotator', 'Annotator'), ('viewer', 'Viewer')], help_text='Role of the user in the deployment.', max_length=10)),
+                ('deployment', models.ForeignKey(help_text='Deployment the user has access to.', on_delete=django.db.models.deletion.CASCADE, related_name='access', to='data_models.deployment')),
+                ('user', models.ForeignKey(help_text='User with access to the deployment.', on_delete=django.db.models.deletion.CASCADE, related_name='deployment_access', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='deploymentaccess',
+            constraint=models.UniqueConstraint(fields=('user', 'role', 'deployment'), name='unique_deployment_access'),
+        ),
+        migrations.RunPython(populate_deployment_access,
+                             migrations.RunPython.noop),
+    ]
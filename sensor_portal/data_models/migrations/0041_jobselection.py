@@ -0,0 +1,42 @@
+# Generated by Django 4.2 on 2026-10-17 18:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('data_models', '0040_deploymentaccess'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobSelection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('modified_on', models.DateTimeField(auto_now=True)),
+                ('data_type', models.CharField(help_text="Type of the selected objects, such as 'datafile'.", max_length=20)),
+                ('n_items', models.IntegerField(default=0, help_text='Number of selected objects.')),
+                ('owner', models.ForeignKey(blank=True, help_text='User who started the job.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='job_selections', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='JobSelectionItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_pk', models.BigIntegerField(help_text='Primary key of the selected object.')),
+                ('selection', models.ForeignKey(help_text='Selection this object belongs to.', on_delete=django.db.models.deletion.CASCADE, related_name='items', to='data_models.jobselection')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='jobselectionitem',
+            constraint=models.UniqueConstraint(fields=('selection', 'object_pk'), name='unique_job_selection_item'),
+        ),
+    ]
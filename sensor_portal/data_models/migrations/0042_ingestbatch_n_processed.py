@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0041_jobselection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestbatch',
+            name='n_processed',
+            field=models.IntegerField(default=0, help_text='Number of files in the manifest that have been processed.'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+def mark_parsed_reports(apps, schema_editor):
+    DataFile = apps.get_model('data_models', 'DataFile')
+    ReportMetric = apps.get_model('data_models', 'ReportMetric')
+    DataFile.objects.filter(
+        pk__in=ReportMetric.objects.values('data_file_id')).update(report_parsed=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_models', '0042_ingestbatch_n_processed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='datafile',
+            name='report_parsed',
+            field=models.BooleanField(default=False, editable=False, help_text='Has this report file been parsed into report metrics? Reports may yield no metrics.'),
+        ),
+        migrations.RunPython(mark_parsed_reports, migrations.RunPython.noop),
+    ]
@@ -1,22 +1,26 @@
 import logging
 import os
+import threading
 from datetime import datetime, timedelta
-from typing import TYPE_CHECKING, List, Optional
+from typing import TYPE_CHECKING, Iterable, List, Optional, Set, Tuple
 
 from archiving.models import Archive, TarFile
+from bridgekeeper import perms
 from colorfield.fields import ColorField
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.gis.db import models as gis_models
 from django.contrib.gis.geos import Point
 from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import (MultipleObjectsReturned,
                                     ObjectDoesNotExist, ValidationError)
-from django.db import models
+from django.db import (DEFAULT_DB_ALIAS, connection, connections, models,
+                       transaction)
 from django.db.models import (BooleanField, Case, Count, DateTimeField,
-                              ExpressionWrapper, F, Max, Min, Q, Sum, Value,
-                              When)
-from django.db.models.functions import Cast, Concat, Upper
+                              Exists, ExpressionWrapper, F, Max, Min, OuterRef,
+                              Q, QuerySet, Sum, Value, When)
+from django.db.models.functions import Cast, Concat, TruncDate, Upper
 from django.urls import reverse
 from django.utils import timezone as djtimezone
 from django_icon_picker.field import IconField
@@ -29,6 +33,9 @@ from utils.models import BaseModel
 from utils.querysets import ApproximateCountQuerySet
 
 from . import validators
+from .count_cache_functions import invalidate_file_counts
+from .deployment_functions import DeploymentIntervals
+from .file_handling_functions import get_n_files
 from .general_functions import check_dt
 from .job_handling_functions import get_job_from_name
 
@@ -268,6 +275,24 @@ class Device(BaseModel):
                 f"Error: found {all_true_deployments.count()} deployments")
             return None
 
+    def deployments_from_dates(self, dt_list: List[Optional[datetime]]) -> List[Optional["Deployment"]]:
+        """
+        Return the deployments for this device active at each of the given datetimes.
+
+        Loads all deployments of this device once, rather than querying per datetime as
+        `deployment_from_date` does.
+
+        Args:
+            dt_list (List[Optional[datetime]]): Datetimes to check.
+
+        Returns:
+            List[Deployment | None]: The matching deployment for each datetime, in input order.
+            None where ambiguous or not found.
+        """
+        logger.info(
+            f"Attempt to find deployments for device {self.device_ID} for {len(dt_list)} datetimes")
+        return DeploymentIntervals(self).deployments_from_dates(dt_list)
+
     def check_overlap(self, new_start: datetime, new_end: Optional[datetime], deployment_pk: Optional[int]) -> List[str]:
         """
         Check for overlapping deployments in the given date range, excluding a given deployment.
@@ -510,6 +535,11 @@ class DataFileQuerySet(ApproximateCountQuerySet):
     def device_type(self):
         return self.annotate(device_type=F('deployment__device__type__name'))
 
+    def annotate_favourite(self, user):
+        favourites = self.model.favourite_of.through.objects.filter(
+            datafile=OuterRef('pk'), user__pk=user.pk)
+        return self.annotate(is_favourite=Exists(favourites))
+
 
 class DataFile(BaseModel):
     """
@@ -555,6 +585,16 @@ class DataFile(BaseModel):
                            blank=True, db_index=True, help_text="Additional identifying tag of this file.")
     has_human = models.BooleanField(
         default=False, db_index=True, help_text="True if this image has been annotated with a human.")
+    md5_checksum = models.CharField(
+        max_length=32, null=True, blank=True, db_index=True, help_text="MD5 checksum of the file contents.")
+    search_text = models.TextField(
+        blank=True, default="", editable=False,
+        help_text="Search document combining file name, tag and names of observed taxa.")
+    search_vector = SearchVectorField(
+        null=True, editable=False, help_text="Text search vector of the search document.")
+    report_parsed = models.BooleanField(
+        default=False, editable=False,
+        help_text="Has this report file been parsed into report metrics? Reports may yield no metrics.")
 
     objects = DataFileQuerySet.as_manager()
 
@@ -567,7 +607,14 @@ class DataFile(BaseModel):
             GinIndex(
                 OpClass(Upper('file_name'), name='gin_trgm_ops'),
                 name='upper_file_name_gin_idx',
-            )
+            ),
+            models.Index(fields=['recording_dt', 'id'],
+                         name='recording_dt_id_idx'),
+            GinIndex(
+                OpClass(Upper('search_text'), name='gin_trgm_ops'),
+                name='upper_search_text_gin_idx',
+            ),
+            GinIndex(fields=['search_vector'], name='search_vector_gin_idx'),
         ]
 
     def __str__(self):
@@ -581,14 +628,14 @@ class DataFile(BaseModel):
         Add a user to this file's favourites.
         """
         self.favourite_of.add(user)
-        self.save()
+        self.save(update_fields=['modified_on'])
 
     def remove_favourite(self, user: "User") -> None:
         """
         Remove a user from this file's favourites.
         """
         self.favourite_of.remove(user)
-        self.save()
+        self.save(update_fields=['modified_on'])
 
     def full_path(self):
         """
@@ -705,6 +752,7 @@ class DataFile(BaseModel):
             self.linked_files = {}
             self.set_thumb_url(False)
             self.save()
+            invalidate_file_counts([self.deployment_id])
         return True
 
     def save(self, *args, **kwargs):
@@ -727,6 +775,585 @@ class DataFile(BaseModel):
             raise ValidationError(message)
         super(DataFile, self).clean()
 
+    @classmethod
+    def batch_full_clean(cls, data_files: List["DataFile"]) -> List[Optional[Exception]]:
+        """
+        Validate a list of new DataFile objects, as full_clean would, with a constant number of queries.
+
+        Foreign keys are not re-checked against the database, the date-in-deployment check is made in memory
+        and file name uniqueness is checked with a single query for the whole list.
+
+        Args:
+            data_files (List[DataFile]): DataFile objects to validate.
+
+        Returns:
+            List[Optional[Exception]]: For each object, None if valid, otherwise the ValidationError
+            full_clean would have raised, or any other exception raised while validating.
+        """
+        all_errors = [{} for x in data_files]
+        other_exceptions = [None for x in data_files]
+
+        # Field validation, skipping related object lookups
+        for idx, data_file in enumerate(data_files):
+            try:
+                data_file.clean_fields(
+                    exclude=["deployment", "file_type", "tar_file"])
+            except ValidationError as e:
+                all_errors[idx] = e.update_error_dict(all_errors[idx])
+            except Exception as e:
+                other_exceptions[idx] = e
+
+        # Date in deployment validation
+        date_results = validators.data_files_in_deployments(
+            [x.recording_dt for x in data_files], [x.deployment for x in data_files])
+        for idx, (result, message) in enumerate(date_results):
+            if not result:
+                all_errors[idx] = ValidationError(
+                    message).update_error_dict(all_errors[idx])
+
+        # Unique file name validation
+        check_names = [x.file_name for idx, x in enumerate(data_files)
+                       if 'file_name' not in all_errors[idx]]
+        existing_names = cls.objects.filter(file_name__in=check_names)
+        existing_pks = [x.pk for x in data_files if x.pk is not None]
+        if len(existing_pks) > 0:
+            existing_names = existing_names.exclude(pk__in=existing_pks)
+        existing_names = set(
+            existing_names.values_list('file_name', flat=True))
+        for idx, data_file in enumerate(data_files):
+            if 'file_name' not in all_errors[idx] and data_file.file_name in existing_names:
+                all_errors[idx] = ValidationError({'file_name': data_file.unique_error_message(
+                    cls, ('file_name',))}).update_error_dict(all_errors[idx])
+
+        return [other_exception if other_exception is not None
+                else (ValidationError(errors) if errors else None)
+                for errors, other_exception in zip(all_errors, other_exceptions)]
+
+
+# Per-thread connections used by FileNameSequence.allocate
+_allocate_connections = threading.local()
+
+
+class FileNameSequence(BaseModel):
+    """
+    Per-directory counter used to give uploaded files a unique numeric suffix.
+
+    One row exists for each (deployment, upload date, data type), matching the
+    `data_type/deployment/upload_date` directory files are stored in.
+    """
+    deployment = models.ForeignKey(
+        Deployment, on_delete=models.CASCADE, related_name="file_name_sequences",
+        help_text="Deployment of files in this sequence.")
+    file_type = models.ForeignKey(
+        DataType, on_delete=models.CASCADE, related_name="file_name_sequences",
+        help_text="Data type of files in this sequence.")
+    upload_date = models.DateField(
+        help_text="Date on which files in this sequence were uploaded.")
+    last_n = models.IntegerField(
+        default=0, help_text="Last file number handed out in this sequence.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["deployment", "file_type", "upload_date"],
+                name="unique_file_name_sequence")
+        ]
+
+    def __str__(self):
+        return f"{self.deployment}_{self.file_type}_{self.upload_date}"
+
+    @classmethod
+    def allocate(cls, deployment: "Deployment", file_type: "DataType", upload_date, n_files: int,
+                 dir_path: Optional[str] = None) -> int:
+        """
+        Atomically reserve a contiguous block of file numbers.
+
+        When called inside a transaction, such as an upload, the block is reserved on a separate connection
+        that commits straight away, so the sequence row is only locked for a single statement rather than
+        until the upload commits. Numbers reserved by an upload which is rolled back are not reused.
+
+        Args:
+            deployment (Deployment): Deployment of the files.
+            file_type (DataType): Data type of the files.
+            upload_date (date): Upload date of the files.
+            n_files (int): Number of file numbers to reserve.
+            dir_path (Optional[str]): Directory the files will be written to. Only listed the first
+                time a sequence is created, so that numbering continues from files already on disk.
+
+        Returns:
+            int: The first file number of the reserved block.
+        """
+        if not connection.in_atomic_block:
+            return cls._allocate(connection, deployment, file_type, upload_date, n_files, dir_path)
+
+        allocate_connection = cls._get_allocate_connection()
+        first_n = cls._increment(allocate_connection, deployment, file_type, upload_date, n_files)
+        if first_n is not None:
+            return first_n
+
+        # Only a new sequence references the deployment and data type, so only check they are visible
+        # outside this transaction when creating one.
+        with allocate_connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT EXISTS(SELECT 1 FROM {Deployment._meta.db_table} WHERE id = %s), "
+                f"EXISTS(SELECT 1 FROM {DataType._meta.db_table} WHERE id = %s)",
+                [deployment.pk, file_type.pk])
+            committed = all(cursor.fetchone())
+        if committed:
+            return cls._allocate(allocate_connection, deployment, file_type, upload_date, n_files, dir_path)
+
+        # The deployment or data type were created in this transaction, so no other upload can use this sequence
+        # until it commits, and the sequence can be locked in this transaction instead.
+        return cls._allocate(connection, deployment, file_type, upload_date, n_files, dir_path)
+
+    @staticmethod
+    def _get_allocate_connection():
+        """
+        Get this thread's connection for reserving file numbers outside of the current transaction.
+
+        The connection is kept between uploads and closed following the same rules as the default
+        connection, such as CONN_MAX_AGE.
+
+        Returns:
+            BaseDatabaseWrapper: Database connection in autocommit mode.
+        """
+        allocate_connection = getattr(_allocate_connections, "connection", None)
+        if allocate_connection is None:
+            allocate_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+            _allocate_connections.connection = allocate_connection
+        allocate_connection.close_if_unusable_or_obsolete()
+        return allocate_connection
+
+    @classmethod
+    def _increment(cls, db_connection, deployment: "Deployment", file_type: "DataType", upload_date,
+                   n_files: int) -> Optional[int]:
+        """
+        Reserve a block of file numbers from an existing sequence.
+
+        Args:
+            db_connection: Database connection to use.
+            deployment (Deployment): Deployment of the files.
+            file_type (DataType): Data type of the files.
+            upload_date (date): Upload date of the files.
+            n_files (int): Number of file numbers to reserve.
+
+        Returns:
+            Optional[int]: The first file number of the reserved block, or None if the sequence does not exist.
+        """
+        with db_connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {cls._meta.db_table} SET last_n = last_n + %s, modified_on = now() "
+                "WHERE deployment_id = %s AND file_type_id = %s AND upload_date = %s RETURNING last_n",
+                [n_files, deployment.pk, file_type.pk, upload_date])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        return row[0] - n_files + 1
+
+    @classmethod
+    def _allocate(cls, db_connection, deployment: "Deployment", file_type: "DataType", upload_date, n_files: int,
+                  dir_path: Optional[str] = None) -> int:
+        """
+        Reserve a block of file numbers with single statements on a connection.
+
+        Args:
+            db_connection: Database connection to use.
+            deployment (Deployment): Deployment of the files.
+            file_type (DataType): Data type of the files.
+            upload_date (date): Upload date of the files.
+            n_files (int): Number of file numbers to reserve.
+            dir_path (Optional[str]): Directory the files will be written to.
+
+        Returns:
+            int: The first file number of the reserved block.
+        """
+        first_n = cls._increment(db_connection, deployment, file_type, upload_date, n_files)
+        if first_n is not None:
+            return first_n
+
+        table = cls._meta.db_table
+        existing_n = get_n_files(dir_path) if dir_path else 0
+        with db_connection.cursor() as cursor:
+            # Concurrent creation is resolved by the unique constraint
+            cursor.execute(
+                f"INSERT INTO {table} (created_on, modified_on, deployment_id, file_type_id, upload_date, last_n) "
+                "VALUES (now(), now(), %s, %s, %s, %s) "
+                "ON CONFLICT (deployment_id, file_type_id, upload_date) "
+                f"DO UPDATE SET last_n = {table}.last_n + %s, modified_on = now() RETURNING last_n",
+                [deployment.pk, file_type.pk, upload_date, existing_n + n_files, n_files])
+            row = cursor.fetchone()
+        return row[0] - n_files + 1
+
+
+class DeploymentAccess(models.Model):
+    """
+    Flat copy of the managers, annotators and viewers of every deployment, with one row per (user, deployment, role).
+
+    Lets permission rules filter DataFiles with a single indexed semi-join, rather than joining the
+    deployment's many to many tables. Kept in sync by signals on those many to many fields, `rebuild`
+    recalculates the rows of a deployment.
+    """
+    class Role(models.TextChoices):
+        MANAGER = "manager", "Manager"
+        ANNOTATOR = "annotator", "Annotator"
+        VIEWER = "viewer", "Viewer"
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="deployment_access",
+                             help_text="User with access to the deployment.")
+    deployment = models.ForeignKey(Deployment, on_delete=models.CASCADE, related_name="access",
+                                   help_text="Deployment the user has access to.")
+    role = models.CharField(max_length=10, choices=Role.choices,
+                            help_text="Role of the user in the deployment.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "role", "deployment"],
+                name="unique_deployment_access")
+        ]
+
+    def __str__(self):
+        return f"{self.user}_{self.deployment}_{self.role}"
+
+    # Role for each many to many field of Deployment
+    field_roles = {"managers": Role.MANAGER,
+                   "annotators": Role.ANNOTATOR,
+                   "viewers": Role.VIEWER}
+
+    @classmethod
+    def deployments_for(cls, user: "User", role: str) -> QuerySet:
+        """
+        Database IDs of deployments in which a user has a role, for use in `deployment__in` queries.
+
+        Args:
+            user (User): User to check.
+            role (str): Role of the user.
+
+        Returns:
+            QuerySet: Deployment database IDs.
+        """
+        return cls.objects.filter(user=user, role=role).values('deployment_id')
+
+    @classmethod
+    def add(cls, role: str, deployment_pks: List[int], user_pks: List[int]) -> None:
+        """
+        Give users a role in deployments.
+
+        Args:
+            role (str): Role to give.
+            deployment_pks (List[int]): Database IDs of deployments.
+            user_pks (List[int]): Database IDs of users.
+        """
+        cls.objects.bulk_create([cls(user_id=user_pk, deployment_id=deployment_pk, role=role)
+                                 for deployment_pk in deployment_pks for user_pk in user_pks],
+                                ignore_conflicts=True)
+
+    @classmethod
+    def remove(cls, role: str, deployment_pks: List[int], user_pks: Optional[List[int]] = None) -> None:
+        """
+        Remove a role of users in deployments.
+
+        Args:
+            role (str): Role to remove.
+            deployment_pks (List[int]): Database IDs of deployments.
+            user_pks (Optional[List[int]]): Database IDs of users. If None, the role is removed from all users.
+        """
+        rows = cls.objects.filter(role=role, deployment_id__in=deployment_pks)
+        if user_pks is not None:
+            rows = rows.filter(user_id__in=user_pks)
+        rows.delete()
+
+    @classmethod
+    def rebuild(cls, deployment: "Deployment") -> None:
+        """
+        Recalculate all rows of a deployment from its many to many fields.
+
+        Args:
+            deployment (Deployment): Deployment to recalculate.
+        """
+        with transaction.atomic():
+            cls.objects.filter(deployment=deployment).delete()
+            for field_name, role in cls.field_roles.items():
+                cls.add(role, [deployment.pk], list(getattr(deployment, field_name).all().values_list('pk', flat=True)))
+
+
+class DeploymentDailyFileStats(BaseModel):
+    """
+    Rollup of the number and volume of DataFiles recorded per day, for each deployment and data type.
+
+    Files with humans are counted separately, as they are only visible to managers.
+    Rows are refreshed from the DataFiles of a (deployment, date) whenever files are added,
+    and decremented when files are deleted. `rebuild` recalculates all rows of a deployment.
+    """
+    deployment = models.ForeignKey(
+        Deployment, on_delete=models.CASCADE, related_name="daily_file_stats",
+        help_text="Deployment of the counted files.")
+    date = models.DateField(
+        null=True, help_text="Recording date of the counted files.")
+    file_type = models.ForeignKey(
+        DataType, on_delete=models.CASCADE, null=True, related_name="daily_file_stats",
+        help_text="Data type of the counted files.")
+    has_human = models.BooleanField(
+        default=False, help_text="True if the counted files have been annotated with a human.")
+    n_files = models.IntegerField(
+        default=0, help_text="Number of files.")
+    file_volume = models.BigIntegerField(
+        default=0, help_text="Total size of files in bytes.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deployment', 'date'],
+                         name='daily_file_stats_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.deployment}_{self.date}_{self.file_type}"
+
+    @classmethod
+    def _aggregate_files(cls, data_files: QuerySet) -> QuerySet:
+        return data_files.order_by().annotate(date=TruncDate('recording_dt')).values(
+            'deployment_id', 'date', 'file_type_id', 'has_human').annotate(
+                n_files=Count('id'), file_volume=Sum('file_size'))
+
+    @classmethod
+    def _replace_rows(cls, deployment_pk: int, date_q: Q, data_files: QuerySet) -> None:
+        cls.objects.filter(Q(deployment_id=deployment_pk) & date_q).delete()
+        cls.objects.bulk_create([cls(**x) for x in cls._aggregate_files(data_files)])
+
+    @classmethod
+    def file_keys(cls, data_files: QuerySet) -> Set[Tuple[int, Optional["date"]]]:
+        """
+        Get the (deployment, date) rows that files are counted in.
+
+        Args:
+            data_files (QuerySet): DataFiles to look up.
+
+        Returns:
+            Set[Tuple[int, Optional[date]]]: Deployment primary key and recording date of each row.
+        """
+        return set(data_files.order_by().annotate(date=TruncDate('recording_dt')).values_list(
+            'deployment_id', 'date').distinct())
+
+    @classmethod
+    def refresh(cls, data_files: QuerySet,
+                previous_keys: Optional[Iterable[Tuple[int, Optional["date"]]]] = None) -> None:
+        """
+        Recalculate the rows of every (deployment, date) that the given files were recorded in.
+
+        Args:
+            data_files (QuerySet): DataFiles which have been added or changed.
+            previous_keys (Iterable[Tuple[int, Optional[date]]], optional): Rows the files were counted in
+                before they were changed, from file_keys. Must be given if their recording datetime or
+                deployment may have changed, so that they are no longer counted in their old rows. Defaults to None.
+        """
+        keys = cls.file_keys(data_files)
+        if previous_keys is not None:
+            keys |= set(previous_keys)
+        dates_by_deployment = {}
+        for deployment_pk, file_date in keys:
+            dates_by_deployment.setdefault(deployment_pk, set()).add(file_date)
+
+        for deployment_pk, dates in dates_by_deployment.items():
+            file_q = Q(recording_dt__date__in=[x for x in dates if x is not None])
+            date_q = Q(date__in=[x for x in dates if x is not None])
+            if None in dates:
+                file_q |= Q(recording_dt__isnull=True)
+                date_q |= Q(date__isnull=True)
+            with transaction.atomic():
+                # Lock the deployment so that concurrent refreshes do not duplicate rows
+                list(Deployment.objects.select_for_update().filter(pk=deployment_pk).values_list('pk'))
+                cls._replace_rows(deployment_pk, date_q,
+                                  DataFile.objects.filter(Q(deployment_id=deployment_pk) & file_q))
+
+    @classmethod
+    def remove_file(cls, data_file: "DataFile") -> None:
+        """
+        Remove a deleted file from its row.
+
+        Args:
+            data_file (DataFile): DataFile which has been deleted.
+        """
+        file_date = djtimezone.localtime(data_file.recording_dt).date() \
+            if data_file.recording_dt is not None else None
+        rows = cls.objects.filter(deployment_id=data_file.deployment_id, date=file_date,
+                                  file_type_id=data_file.file_type_id, has_human=data_file.has_human)
+        rows.update(n_files=F('n_files') - 1,
+                    file_volume=F('file_volume') - (data_file.file_size or 0),
+                    modified_on=djtimezone.now())
+        rows.filter(n_files__lte=0).delete()
+
+    @classmethod
+    def visible_to(cls, user: "User", deployments: QuerySet) -> QuerySet:
+        """
+        Rows of the given deployments counting files that a user can view,
+        matching the permissions for viewing DataFiles.
+
+        Args:
+            user (User): User viewing the statistics.
+            deployments (QuerySet): Deployments to get statistics for.
+
+        Returns:
+            QuerySet: Visible rows.
+        """
+        managed_deployments = perms['data_models.change_deployment'].filter(
+            user, deployments)
+        viewed_deployments = perms['data_models.view_deployment'].filter(
+            user, deployments)
+        return cls.objects.filter(Q(deployment__in=managed_deployments)
+                                  | Q(deployment__in=viewed_deployments, has_human=False))
+
+    @classmethod
+    def rebuild(cls, deployment: "Deployment") -> None:
+        """
+        Recalculate all rows of a deployment.
+
+        Args:
+            deployment (Deployment): Deployment to recalculate.
+        """
+        with transaction.atomic():
+            list(Deployment.objects.select_for_update().filter(pk=deployment.pk).values_list('pk'))
+            cls._replace_rows(deployment.pk, Q(), deployment.files.all())
+
+
+class ReportMetric(models.Model):
+    """
+    Single value parsed from a device report file, such as battery level or temperature at a point in time.
+
+    Report files are parsed once, when they are converted or first plotted, so that metrics can be read
+    by name and time range without opening the files again. Parsed files are marked by DataFile.report_parsed.
+    """
+    data_file = models.ForeignKey(
+        DataFile, on_delete=models.CASCADE, related_name="report_metrics",
+        help_text="Report file from which this value was parsed.")
+    name = models.CharField(
+        max_length=100, help_text="Name of the report column, in the format 'metric__unit'.")
+    dt = models.DateTimeField(help_text="Datetime of this value.")
+    value = models.FloatField(help_text="Value of the metric.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_file', 'name', 'dt'],
+                         name='report_metric_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.data_file}_{self.name}_{self.dt}"
+
+
+class IngestBatch(BaseModel):
+    """
+    A batch of uploaded files staged on disk, to be turned into DataFiles by a celery worker.
+    """
+    class Status(models.TextChoices):
+        STAGED = "staged", "Staged"
+        RUNNING = "running", "Running"
+        COMPLETE = "complete", "Complete"
+        FAILED = "failed", "Failed"
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, blank=True, related_name="ingest_batches",
+                              on_delete=models.SET_NULL, null=True, help_text="User who uploaded this batch.")
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.STAGED,
+                              help_text="Processing status of this batch.")
+    staging_path = models.CharField(
+        max_length=500, help_text="Directory in which the files of this batch are staged.")
+    manifest = models.JSONField(
+        default=list, blank=True, help_text="Staged path and original name of each file in this batch.")
+    parameters = models.JSONField(
+        default=dict, blank=True, help_text="Upload parameters of this batch.")
+    uploaded_files = models.JSONField(
+        default=list, blank=True, help_text="Primary keys of DataFiles created from this batch.")
+    invalid_files = models.JSONField(
+        default=list, blank=True, help_text="Files of this batch that could not be uploaded.")
+    existing_files = models.JSONField(
+        default=list, blank=True, help_text="Files of this batch that were already in the database.")
+    status_code = models.IntegerField(
+        null=True, blank=True, help_text="HTTP status code of the completed batch.")
+    n_processed = models.IntegerField(
+        default=0, help_text="Number of files in the manifest that have been processed.")
+
+    def __str__(self):
+        return f"Ingest batch {self.pk}"
+
+
+class JobSelection(BaseModel):
+    """
+    Objects selected to run a generic job on. The primary keys are copied into JobSelectionItems inside
+    the database when a job is started, so that only the ID of the selection has to be sent to the worker.
+    """
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, blank=True, related_name="job_selections",
+                              on_delete=models.SET_NULL, null=True, help_text="User who started the job.")
+    data_type = models.CharField(
+        max_length=20, help_text="Type of the selected objects, such as 'datafile'.")
+    n_items = models.IntegerField(
+        default=0, help_text="Number of selected objects.")
+
+    def __str__(self):
+        return f"Job selection {self.pk}"
+
+    @classmethod
+    def from_queryset(cls, queryset: QuerySet, data_type: str,
+                      owner_pk: Optional[int] = None) -> "JobSelection":
+        """
+        Create a selection of all objects in a queryset, using a single INSERT ... SELECT.
+
+        Args:
+            queryset (QuerySet): Filtered queryset of the objects to select.
+            data_type (str): Type of the selected objects.
+            owner_pk (int, optional): Primary key of the user who started the job. Defaults to None.
+
+        Returns:
+            JobSelection: New selection.
+        """
+        select_sql, select_params = queryset.order_by().annotate(
+            selected_pk=F('pk')).values('selected_pk').query.sql_with_params()
+        with transaction.atomic():
+            selection = cls.objects.create(
+                owner_id=owner_pk, data_type=data_type)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO "{JobSelectionItem._meta.db_table}" (selection_id, object_pk) '
+                    f'SELECT DISTINCT %s, selected."selected_pk" FROM ({select_sql}) AS selected',
+                    [selection.pk, *select_params])
+                selection.n_items = cursor.rowcount
+            selection.save()
+        return selection
+
+    def iterate_pks(self, chunk_size: int = 1000):
+        """
+        Iterate over the selected primary keys in ascending chunks.
+
+        Args:
+            chunk_size (int, optional): Maximum number of primary keys in each chunk. Defaults to 1000.
+
+        Yields:
+            List[int]: Chunk of selected primary keys.
+        """
+        last_pk = None
+        while True:
+            items = self.items.order_by('object_pk')
+            if last_pk is not None:
+                items = items.filter(object_pk__gt=last_pk)
+            chunk = list(items.values_list('object_pk', flat=True)[:chunk_size])
+            if len(chunk) == 0:
+                return
+            yield chunk
+            last_pk = chunk[-1]
+
+
+class JobSelectionItem(models.Model):
+    """
+    Primary key of an object in a JobSelection.
+    """
+    selection = models.ForeignKey(JobSelection, on_delete=models.CASCADE, related_name="items",
+                                  help_text="Selection this object belongs to.")
+    object_pk = models.BigIntegerField(help_text="Primary key of the selected object.")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['selection', 'object_pk'],
+                                    name='unique_job_selection_item'),
+        ]
+
 
 class ProjectJob(BaseModel):
     """
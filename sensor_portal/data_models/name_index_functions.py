@@ -0,0 +1,243 @@
+import logging
+import uuid
+from typing import TYPE_CHECKING, Iterable, List, Set
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+
+logger = logging.getLogger(__name__)
+
+# To avoid circular imports
+if TYPE_CHECKING:
+    from data_models.models import DataFile
+
+_redis_client = None
+
+
+def get_name_index_client() -> redis.Redis:
+    """
+    Get the redis client used for original name indexes, sharing the cache's redis instance.
+
+    Returns:
+        redis.Redis: Redis client.
+    """
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            settings.CACHES['default']['LOCATION'])
+    return _redis_client
+
+
+# Seconds before the lock held while building an index expires, if the process building it dies
+BUILD_LOCK_TIMEOUT = 10 * 60
+
+# Seconds to wait for another process to finish building an index before checking names against the database
+BUILD_WAIT_TIMEOUT = 30
+
+# Maximum number of names sent to redis in a single command
+NAME_BATCH_SIZE = 5000
+
+# Add names to the index, and to the index being built if there is one.
+# KEYS: index, key naming the index being built. ARGV: names
+ADD_NAMES_SCRIPT = """
+redis.call('SADD', KEYS[1], unpack(ARGV))
+local building_key = redis.call('GET', KEYS[2])
+if building_key then
+    redis.call('SADD', building_key, unpack(ARGV))
+end
+return 1
+"""
+
+# Replace the index with the one that was built, if this build has not been taken over.
+# KEYS: index, key naming the index being built, built flag, index that was built. ARGV: built flag expiry
+FINISH_BUILD_SCRIPT = """
+if redis.call('GET', KEYS[2]) ~= KEYS[4] then
+    redis.call('DEL', KEYS[4])
+    return 0
+end
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('RENAME', KEYS[4], KEYS[1])
+else
+    redis.call('DEL', KEYS[1])
+end
+redis.call('DEL', KEYS[2])
+redis.call('SET', KEYS[3], 1, 'EX', ARGV[1])
+return 1
+"""
+
+
+class OriginalNameIndex():
+    """
+    Redis set of the original names of all DataFiles of a single device.
+
+    Used to find out which of a list of names are new with a set lookup instead of an `original_name__in`
+    query. The index may contain names that are no longer in the database, but never misses names that are,
+    so any name found in the index is confirmed against the database.
+
+    The index is built from the database the first time it is used and rebuilt after
+    ORIGINAL_NAME_INDEX_TIMEOUT seconds. It is kept up to date as DataFiles are created and deleted.
+    """
+
+    def __init__(self, device_pk: int) -> None:
+        """
+        Args:
+            device_pk (int): Database ID of the device whose file names are indexed.
+        """
+        self.device_pk = device_pk
+        self.key = f"original_name_index:{device_pk}"
+        self.built_key = f"{self.key}:built"
+        self.building_key = f"{self.key}:building"
+        self.lock_key = f"{self.key}:lock"
+
+    def build(self, client: redis.Redis) -> bool:
+        """
+        (Re)build the index from the database, unless another process has just built it.
+
+        The index is built into a new set which then replaces the old one in a single step, so it is never
+        seen partly built. Names committed while it is being built are added to both sets.
+
+        Args:
+            client (redis.Redis): Redis client.
+
+        Returns:
+            bool: True if the index is built, False if it could not be built in time.
+        """
+        from data_models.models import DataFile
+
+        lock = client.lock(self.lock_key, timeout=BUILD_LOCK_TIMEOUT,
+                           blocking_timeout=BUILD_WAIT_TIMEOUT)
+        if not lock.acquire():
+            logger.warning(
+                f"Timed out waiting to build original name index for device {self.device_pk}")
+            return False
+        try:
+            if client.exists(self.built_key):
+                # Built by another process while waiting for the lock
+                return True
+
+            new_key = f"{self.key}:{uuid.uuid4().hex}"
+            # Names committed from now on are also added to the new set,
+            # so the database must be read afterwards
+            client.set(self.building_key, new_key, ex=BUILD_LOCK_TIMEOUT)
+            names = DataFile.objects.filter(deployment__device__pk=self.device_pk).values_list(
+                'original_name', flat=True)
+            batch = []
+            for name in names.iterator():
+                batch.append(name)
+                if len(batch) >= NAME_BATCH_SIZE:
+                    client.sadd(new_key, *batch)
+                    batch = []
+            if batch:
+                client.sadd(new_key, *batch)
+
+            return bool(client.register_script(FINISH_BUILD_SCRIPT)(
+                keys=[self.key, self.building_key, self.built_key, new_key],
+                args=[settings.ORIGINAL_NAME_INDEX_TIMEOUT]))
+        finally:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                # Lock expired while building
+                pass
+
+    def existing_names(self, names: Iterable[str], queryset: QuerySet["DataFile"]) -> Set[str]:
+        """
+        Find which names belong to DataFiles in a queryset. The queryset should only contain files of this device.
+
+        Args:
+            names (Iterable[str]): Original names to check.
+            queryset (QuerySet[DataFile]): Files to check against.
+
+        Returns:
+            Set[str]: Names which are in the queryset.
+        """
+        names = list(set(names))
+        try:
+            client = get_name_index_client()
+            if client.exists(self.built_key) or self.build(client):
+                pipe = client.pipeline(transaction=False)
+                for name in names:
+                    pipe.sismember(self.key, name)
+                candidate_names = [name for name, in_index in zip(
+                    names, pipe.execute()) if in_index]
+            else:
+                candidate_names = names
+        except redis.RedisError as e:
+            logger.warning(
+                f"Original name index unavailable for device {self.device_pk}: {repr(e)}")
+            candidate_names = names
+
+        if len(candidate_names) == 0:
+            return set()
+        return set(queryset.filter(original_name__in=candidate_names).values_list('original_name', flat=True))
+
+    def add_names(self, names: List[str]) -> None:
+        """
+        Add names to the index once they have been committed, so that an index being built from the database
+        at the same time cannot miss them.
+
+        Args:
+            names (List[str]): Original names of new DataFiles.
+        """
+        if len(names) == 0:
+            return
+
+        def add():
+            try:
+                add_names_script = get_name_index_client().register_script(ADD_NAMES_SCRIPT)
+                for i in range(0, len(names), NAME_BATCH_SIZE):
+                    add_names_script(keys=[self.key, self.building_key],
+                                     args=names[i:i + NAME_BATCH_SIZE])
+            except redis.RedisError as e:
+                # The index can no longer be trusted
+                logger.warning(
+                    f"Unable to update original name index for device {self.device_pk}: {repr(e)}")
+                self.invalidate()
+
+        transaction.on_commit(add)
+
+    def remove_name(self, name: str) -> None:
+        """
+        Remove a name from the index once it has been committed, if no other file of this device uses it.
+
+        Args:
+            name (str): Original name of a deleted DataFile.
+        """
+        def remove():
+            from data_models.models import DataFile
+            if DataFile.objects.filter(deployment__device__pk=self.device_pk, original_name=name).exists():
+                return
+            try:
+                get_name_index_client().srem(self.key, name)
+            except redis.RedisError as e:
+                logger.warning(
+                    f"Unable to update original name index for device {self.device_pk}: {repr(e)}")
+
+        transaction.on_commit(remove)
+
+    def invalidate(self) -> None:
+        """
+        Mark the index to be rebuilt the next time it is used.
+        """
+        try:
+            get_name_index_client().delete(self.built_key)
+        except redis.RedisError as e:
+            logger.error(
+                f"Unable to invalidate original name index for device {self.device_pk}: {repr(e)}")
+
+
+def index_new_datafiles(data_files: Iterable["DataFile"]) -> None:
+    """
+    Add newly created DataFiles to the original name indexes of their devices, once they have been committed.
+
+    Args:
+        data_files (Iterable[DataFile]): New DataFiles.
+    """
+    names_by_device = {}
+    for data_file in data_files:
+        names_by_device.setdefault(
+            data_file.deployment.device_id, []).append(data_file.original_name)
+    for device_pk, names in names_by_device.items():
+        OriginalNameIndex(device_pk).add_names(names)
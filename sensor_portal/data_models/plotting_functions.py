@@ -1,14 +1,29 @@
-import os
+import logging
 from datetime import date, datetime
-from typing import Any, Dict, List, Optional, Union
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
 
 import numpy as np
 import pandas as pd
+from django.db import transaction
 from django.db.models import Count, Sum
 from django.db.models.query import QuerySet
+from django.utils import timezone as djtimezone
 
+from .general_functions import check_dt
 
-def get_all_file_metric_dicts(data_files: QuerySet, get_report_metrics: bool = True) -> Dict[str, Dict[str, Any]]:
+logger = logging.getLogger(__name__)
+
+# To avoid circular imports
+if TYPE_CHECKING:
+    from data_models.models import DataFile
+
+
+def get_all_file_metric_dicts(data_files: QuerySet,
+                              get_report_metrics: bool = True,
+                              file_stats: Optional[QuerySet] = None,
+                              start_dt: Optional[datetime] = None,
+                              end_dt: Optional[datetime] = None,
+                              metric_names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
     """
     Generate a dictionary containing metrics for all files.
 
@@ -17,6 +32,11 @@ def get_all_file_metric_dicts(data_files: QuerySet, get_report_metrics: bool = T
     Args:
         data_files (QuerySet): A Django QuerySet containing file data.
         get_report_metrics (bool): Whether to include metrics from report files. Defaults to True.
+        file_stats (QuerySet, optional): DeploymentDailyFileStats of these files. If given, daily metrics
+            are read from these rather than aggregated from the files. Defaults to None.
+        start_dt (datetime, optional): Only return values from this datetime. Defaults to None.
+        end_dt (datetime, optional): Only return values up to this datetime. Defaults to None.
+        metric_names (List[str], optional): Only return these report columns. Defaults to None.
 
     Returns:
         Dict[str, Dict[str, Any]]: A dictionary containing metrics for all files. Each key represents a metric name,
@@ -25,7 +45,19 @@ def get_all_file_metric_dicts(data_files: QuerySet, get_report_metrics: bool = T
     all_file_metric_dict = {}
 
     # Database metrics
-    db_file_dict = get_database_file_metrics(data_files)
+    if file_stats is not None:
+        if start_dt is not None:
+            file_stats = file_stats.filter(date__gte=start_dt.date())
+        if end_dt is not None:
+            file_stats = file_stats.filter(date__lte=end_dt.date())
+        db_file_dict = get_daily_file_stats_metrics(file_stats)
+    else:
+        recorded_files = data_files
+        if start_dt is not None:
+            recorded_files = recorded_files.filter(recording_dt__gte=start_dt)
+        if end_dt is not None:
+            recorded_files = recorded_files.filter(recording_dt__lte=end_dt)
+        db_file_dict = get_database_file_metrics(recorded_files)
     if db_file_dict is not None:
         db_file_metric_dict = create_metric_dicts(
             db_file_dict, 'recording_dt__date', 'Date', ["bar", "scatter"]
@@ -33,8 +65,9 @@ def get_all_file_metric_dicts(data_files: QuerySet, get_report_metrics: bool = T
         all_file_metric_dict.update(db_file_metric_dict)
 
     if get_report_metrics:
-        # Report file metrics
-        report_file_metric_dict = report_file_metrics(data_files)
+        # Report file metrics, which are filtered by the datetimes of their values rather than of the files
+        report_file_metric_dict = report_file_metrics(
+            data_files, start_dt, end_dt, metric_names)
         all_file_metric_dict.update(report_file_metric_dict)
 
     return all_file_metric_dict
@@ -73,6 +106,34 @@ def get_database_file_metrics(data_files: QuerySet) -> Optional[Dict[str, List[U
     return file_dict
 
 
+def get_daily_file_stats_metrics(file_stats: QuerySet) -> Optional[Dict[str, List[Union[date, int]]]]:
+    """
+    Aggregates metrics from daily file statistics rather than from the files themselves, grouping by date.
+    Args:
+        file_stats (QuerySet): A Django QuerySet of DeploymentDailyFileStats.
+    Returns:
+        Optional[Dict[str, List[Union[date, int]]]]: A dictionary in the same format as `get_database_file_metrics`,
+        or `None` if no data is available.
+    """
+    file_dict = file_stats.values('date').order_by('date').annotate(
+        files_per_day__number_of_files=Sum('n_files'),
+        file_volume_per_day__bytes=Sum('file_volume')).values(
+            'date',
+            'files_per_day__number_of_files',
+            'file_volume_per_day__bytes')
+
+    file_dict = list(file_dict)
+
+    if len(file_dict) == 0:
+        return None
+
+    file_dict = {k: [current_dict[k]
+                     for current_dict in file_dict] for k in file_dict[0]}
+    file_dict['recording_dt__date'] = file_dict.pop('date')
+
+    return file_dict
+
+
 def create_metric_dicts(file_dict: Dict[str, List[Any]],
                         x_key: str,
                         x_label: str,
@@ -125,76 +186,167 @@ def create_metric_dicts(file_dict: Dict[str, List[Any]],
     return all_metrics_dict
 
 
-def report_file_metrics(data_files: QuerySet) -> Dict[str, Dict[str, Any]]:
+def parse_report_dataframe(report_df: pd.DataFrame) -> Optional[pd.DataFrame]:
     """
-    Extract metrics from report files and prepare them for plotting.
-
-    This function filters report files from the provided QuerySet, reads their contents,
-    processes the data, and generates a dictionary of metrics suitable for plotting.
+    Find the datetime and numeric metric columns of a report, and reshape it into one row per value.
 
     Args:
-        data_files (QuerySet): A Django QuerySet containing file data. Each record is expected
-            to have fields `file_type__name`, `local_storage`, `file_format`, `local_path`, `path`,
-            `file_name`, and `file_format`.
+        report_df (pd.DataFrame): Contents of a report file.
 
     Returns:
-        Dict[str, Dict[str, Any]]: A dictionary where each key is a metric name, and the value is another dictionary
-        containing details about the metric (e.g., x_label, y_label, x_values, y_values, plot_type).
-        Returns an empty dictionary if no valid report files are found or if no datetime columns exist in the data.
+        Optional[pd.DataFrame]: DataFrame with the columns `dt`, `name` and `value`, or None if the report
+        has no datetime column.
     """
-    data_files = data_files.filter(
-        file_type__name="report", local_storage=True, file_format=".csv"
-    )
-
-    if not data_files.exists():
-        return {}
-
-    file_path_dicts = list(data_files.values(
-        "local_path", "path", "file_name", "file_format"
-    ))
-
-    # Read the CSV files into DataFrames
-    all_df_list: List[pd.DataFrame] = []
-    for file_path_dict in file_path_dicts:
-        file_path = os.path.join(
-            file_path_dict["local_path"],
-            file_path_dict["path"],
-            file_path_dict["file_name"] + file_path_dict["file_format"]
-        )
-        df = pd.read_csv(file_path)
-        df.columns = df.columns.str.lower()
-        all_df_list.append(df)
-
-    full_df = pd.concat(all_df_list)
+    report_df = report_df.copy()
+    report_df.columns = report_df.columns.str.lower()
 
     # Attempt to convert columns to datetime if applicable
-    full_df = full_df.apply(
+    report_df = report_df.apply(
         lambda col: pd.to_datetime(col, errors='ignore')
         if col.dtypes == object and 'date' in col.name else col,
         axis=0
     )
 
-    full_df = full_df.convert_dtypes()
+    report_df = report_df.convert_dtypes()
 
-    date_time_cols = full_df.select_dtypes(include=[np.datetime64])
+    date_time_cols = report_df.select_dtypes(include=[np.datetime64])
 
     # Assume the first datetime column is the correct one
     date_time_keys = list(date_time_cols.columns.values)
 
     if len(date_time_keys) == 0:
-        return {}
+        return None
 
     date_time_key = date_time_keys[0]
-    if len(date_time_keys) > 1:
-        full_df.drop(columns=date_time_keys[1:], inplace=True)
 
-    full_df = full_df.sort_values(by=date_time_key)
+    # Columns named 'metric__' are not plotted
+    metric_keys = [x for x in report_df.select_dtypes(include=[np.number]).columns.values
+                   if not x.endswith("__")]
+
+    long_df = report_df[[date_time_key] + metric_keys].melt(
+        id_vars=date_time_key, var_name="name", value_name="value")
+    long_df = long_df.rename(columns={date_time_key: "dt"})
+    long_df = long_df.dropna(subset=["dt", "value"])
+
+    return long_df[["dt", "name", "value"]]
+
+
+def store_report_metrics(data_file: "DataFile", report_df: Optional[pd.DataFrame]) -> int:
+    """
+    Parse the contents of a report file and store its values as ReportMetrics, replacing any stored before.
+    The file is marked as parsed, even if it contains no values, so that it is not read again.
+
+    Args:
+        data_file (DataFile): Report file.
+        report_df (pd.DataFrame, optional): Contents of the report file, or None if they could not be read.
 
-    full_df_numeric = full_df.select_dtypes(include=[np.datetime64, np.number])
+    Returns:
+        int: Number of values stored.
+    """
+    from data_models.models import DataFile, ReportMetric
+
+    long_df = parse_report_dataframe(report_df) if report_df is not None else None
+    time_zone = data_file.deployment.time_zone
+    new_metrics = []
+    if long_df is not None:
+        new_metrics = [ReportMetric(data_file=data_file,
+                                    name=name,
+                                    dt=check_dt(dt.to_pydatetime(), time_zone),
+                                    value=float(value))
+                       for dt, name, value in long_df.itertuples(index=False)]
+
+    with transaction.atomic():
+        # Lock the file so that concurrent parses of it do not both add their values
+        list(DataFile.objects.select_for_update().filter(pk=data_file.pk).values_list('pk'))
+        ReportMetric.objects.filter(data_file=data_file).delete()
+        ReportMetric.objects.bulk_create(new_metrics, batch_size=5000)
+        DataFile.objects.filter(pk=data_file.pk).update(report_parsed=True)
+    data_file.report_parsed = True
+
+    return len(new_metrics)
+
+
+def parse_report_files(data_files: QuerySet) -> int:
+    """
+    Parse local report files which have not been parsed yet, and store their values as ReportMetrics.
+    Files which cannot be parsed are marked as parsed with no values, while files which cannot be opened
+    are tried again next time.
 
-    file_dict = full_df_numeric.to_dict(orient="list")
+    Args:
+        data_files (QuerySet): DataFiles to parse the report files of.
 
-    metric_dict = create_metric_dicts(
-        file_dict, date_time_key, "Date", ["scatter"]
+    Returns:
+        int: Number of report files parsed.
+    """
+    unparsed_files = data_files.filter(
+        file_type__name="report", file_format=".csv", local_storage=True, report_parsed=False)
+    n_parsed = 0
+    for data_file in unparsed_files.select_related('deployment').order_by('pk').iterator():
+        try:
+            report_df = pd.read_csv(data_file.full_path())
+        except OSError as e:
+            logger.error(f"Unable to read report {data_file.file_name}: {repr(e)}")
+            continue
+        except ValueError as e:
+            logger.error(f"Unable to parse report {data_file.file_name}: {repr(e)}")
+            report_df = None
+        store_report_metrics(data_file, report_df)
+        n_parsed += 1
+    return n_parsed
+
+
+def report_file_metrics(data_files: QuerySet,
+                        start_dt: Optional[datetime] = None,
+                        end_dt: Optional[datetime] = None,
+                        metric_names: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Get metrics from report files and prepare them for plotting.
+
+    Values are only read from the ReportMetrics parsed from each report file by `parse_report_files`,
+    so that requests for metrics do not read report files or write to the database.
+
+    Args:
+        data_files (QuerySet): A Django QuerySet containing file data.
+        start_dt (datetime, optional): Only return values from this datetime. Defaults to None.
+        end_dt (datetime, optional): Only return values up to this datetime. Defaults to None.
+        metric_names (List[str], optional): Only return these report columns. Defaults to None.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: A dictionary where each key is a metric name, and the value is another dictionary
+        containing details about the metric (e.g., x_label, y_label, x_values, y_values, plot_type).
+        Returns an empty dictionary if no report values are found.
+    """
+    from data_models.models import ReportMetric
+
+    data_files = data_files.filter(
+        file_type__name="report", file_format=".csv"
     )
+
+    if not data_files.exists():
+        return {}
+
+    report_metrics = ReportMetric.objects.filter(data_file__in=data_files)
+    if start_dt is not None:
+        report_metrics = report_metrics.filter(dt__gte=start_dt)
+    if end_dt is not None:
+        report_metrics = report_metrics.filter(dt__lte=end_dt)
+    if metric_names is not None:
+        report_metrics = report_metrics.filter(name__in=metric_names)
+
+    file_dicts: Dict[str, Dict[str, List[Any]]] = {}
+    default_time_zone = djtimezone.get_default_timezone()
+    for name, dt, value, time_zone in report_metrics.order_by('name', 'dt').values_list(
+            'name', 'dt', 'value', 'data_file__deployment__time_zone').iterator(chunk_size=5000):
+        if name not in file_dicts:
+            file_dicts[name] = {"date": [], name: []}
+        # Plot in the local time of the deployment
+        file_dicts[name]["date"].append(
+            dt.astimezone(time_zone or default_time_zone).replace(tzinfo=None))
+        file_dicts[name][name].append(value)
+
+    metric_dict = {}
+    for file_dict in file_dicts.values():
+        metric_dict.update(create_metric_dicts(
+            file_dict, "date", "Date", ["scatter"]
+        ))
     return metric_dict
@@ -3,6 +3,8 @@ from django.conf import settings
 from django.db.models import Q
 from utils.rules import check_super, final_query, query_super
 
+from .models import DeploymentAccess
+
 
 class IsManager(R):
     """
@@ -440,7 +442,8 @@ class CanManageDataFileDeployment(R):
         -------
         Q
         """
-        accumulated_q = Q(deployment__managers=user)
+        accumulated_q = Q(deployment__in=DeploymentAccess.deployments_for(
+            user, DeploymentAccess.Role.MANAGER))
         return final_query(accumulated_q)
 
 
@@ -476,7 +479,8 @@ class CanAnnotateDataFileDeployment(R):
         -------
         Q
         """
-        accumulated_q = Q(deployment__annotators=user)
+        accumulated_q = Q(deployment__in=DeploymentAccess.deployments_for(
+            user, DeploymentAccess.Role.ANNOTATOR))
         return final_query(accumulated_q)
 
 
@@ -512,7 +516,8 @@ class CanViewDataFileDeployment(R):
         -------
         Q
         """
-        accumulated_q = Q(deployment__viewers=user)
+        accumulated_q = Q(deployment__in=DeploymentAccess.deployments_for(
+            user, DeploymentAccess.Role.VIEWER))
         return final_query(accumulated_q)
 
 
@@ -0,0 +1,112 @@
+import logging
+from typing import Iterable, List
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchVector
+from django.db.models import (F, OuterRef, Q, QuerySet, Subquery, TextField,
+                              Value)
+from django.db.models.functions import Coalesce, Concat
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration of the search vector. 'simple' does not stem or drop stop words,
+# so that file names, tags and species names are matched as they are.
+SEARCH_CONFIG = "simple"
+
+
+def search_text_expression(model) -> Concat:
+    """
+    Build the expression for the search document of a DataFile,
+    combining its file name, tag and the names of the taxa observed in it.
+
+    Args:
+        model: DataFile model. Passed in so that the expression can also be built from migration models.
+
+    Returns:
+        Concat: Expression evaluating to the search document.
+    """
+    taxon_names = model.objects.filter(pk=OuterRef('pk')).order_by().annotate(
+        taxon_names=StringAgg(
+            Concat(F('observations__taxon__species_name'), Value(' '),
+                   F('observations__taxon__species_common_name'), output_field=TextField()),
+            delimiter=' ', distinct=True)
+    ).values('taxon_names')
+
+    return Concat(F('file_name'), Value(' '), Coalesce(F('tag'), Value('')), Value(' '),
+                  Coalesce(Subquery(taxon_names, output_field=TextField()), Value('')),
+                  output_field=TextField())
+
+
+def update_search_documents(queryset: QuerySet) -> int:
+    """
+    Recalculate the search document of DataFiles. Runs as two UPDATE statements,
+    without loading the files or sending signals.
+
+    Args:
+        queryset (QuerySet): DataFile queryset to update.
+
+    Returns:
+        int: Number of updated files.
+    """
+    queryset = queryset.order_by()
+    n_updated = queryset.update(
+        search_text=search_text_expression(queryset.model))
+    queryset.update(search_vector=SearchVector(
+        'search_text', config=SEARCH_CONFIG))
+    logger.debug(f"Updated search documents of {n_updated} files")
+    return n_updated
+
+
+def update_search_documents_pks(pks: Iterable[int]) -> int:
+    """
+    Recalculate the search document of DataFiles from their database IDs.
+
+    Args:
+        pks (Iterable[int]): Database IDs of DataFiles.
+
+    Returns:
+        int: Number of updated files.
+    """
+    from data_models.models import DataFile
+
+    pks = list(pks)
+    if len(pks) == 0:
+        return 0
+    return update_search_documents(DataFile.objects.filter(pk__in=pks))
+
+
+def search_term_query(term: str) -> Q:
+    """
+    Build the filter for a single search term against the search document.
+
+    Terms of 3 or more characters are matched as substrings, using the trigram index of the search text.
+    Trigram indexes cannot be used for shorter terms, so these are matched as word prefixes using the
+    search vector instead.
+
+    Args:
+        term (str): Search term.
+
+    Returns:
+        Q: Filter for DataFiles matching this term.
+    """
+    if len(term) >= 3:
+        return Q(search_text__icontains=term)
+    # Escape the term so that it is not parsed as tsquery syntax
+    lexeme = term.replace("\\", "\\\\").replace("'", "\\'")
+    return Q(search_vector=SearchQuery(f"'{lexeme}':*", config=SEARCH_CONFIG, search_type="raw"))
+
+
+def search_terms_query(terms: List[str]) -> Q:
+    """
+    Build the filter for a list of search terms, all of which must match.
+
+    Args:
+        terms (List[str]): Search terms.
+
+    Returns:
+        Q: Filter for DataFiles matching all terms.
+    """
+    query = Q()
+    for term in terms:
+        query &= search_term_query(term)
+    return query
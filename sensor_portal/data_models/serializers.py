@@ -4,6 +4,7 @@ from bridgekeeper import perms
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Q
+from django.db.models.manager import BaseManager
 from django.utils import timezone as djtimezone
 from PIL import ExifTags, Image
 from rest_framework import serializers
@@ -329,6 +330,46 @@ class DataFileCheckSerializer(serializers.Serializer):
     )
 
 
+class MetricParamsSerializer(serializers.Serializer):
+    """
+    Serializer for the query parameters of metrics actions.
+    """
+
+    start_dt = serializers.DateTimeField(required=False)
+    end_dt = serializers.DateTimeField(required=False)
+    metric_names = serializers.ListField(
+        child=serializers.CharField(), required=False
+    )
+
+
+class DataFileListSerializer(serializers.ListSerializer):
+    """
+    List serializer for DataFiles, which works out the user-specific flags for all files at once
+    rather than for each file.
+    """
+
+    def to_representation(self, data):
+        data_files = list(data.all() if isinstance(
+            data, BaseManager) else data)
+        if self.context.get('request') and len(data_files) > 0:
+            request_user = self.context['request'].user
+            data_file_pks = [x.pk for x in data_files]
+
+            # Only needed if the queryset was not annotated with annotate_favourite
+            if any(getattr(x, 'is_favourite', None) is None for x in data_files):
+                favourite_pks = set(DataFile.favourite_of.through.objects.filter(
+                    user__pk=request_user.pk, datafile__pk__in=data_file_pks).values_list('datafile__pk', flat=True))
+                for data_file in data_files:
+                    data_file.is_favourite = data_file.pk in favourite_pks
+
+            annotate_pks = set(perms['data_models.annotate_datafile'].filter(
+                request_user, DataFile.objects.filter(pk__in=data_file_pks)).values_list('pk', flat=True))
+            for data_file in data_files:
+                data_file.can_annotate = data_file.pk in annotate_pks
+
+        return super().to_representation(data_files)
+
+
 class DataFileSerializer(CreatedModifiedMixIn, serializers.ModelSerializer):
     """
     Serializer for DataFile model, including deployment, file type, and user-specific flags.
@@ -344,23 +385,29 @@ class DataFileSerializer(CreatedModifiedMixIn, serializers.ModelSerializer):
     def to_representation(self, instance):
         """
         Add 'favourite' and 'can_annotate' to serialized DataFile based on request user.
+        Uses the flags set by annotate_favourite or DataFileListSerializer if present.
         """
         initial_rep = super(DataFileSerializer,
                             self).to_representation(instance)
         if self.context.get('request'):
             request_user = self.context['request'].user
-            initial_rep["favourite"] = instance.favourite_of.all().filter(
-                pk=request_user.pk).exists()
+            if (favourite := getattr(instance, 'is_favourite', None)) is None:
+                favourite = instance.favourite_of.all().filter(
+                    pk=request_user.pk).exists()
+            initial_rep["favourite"] = favourite
             initial_rep.pop('path')
-            initial_rep["can_annotate"] = perms['data_models.annotate_datafile'].check(
-                request_user, instance)
+            if (can_annotate := getattr(instance, 'can_annotate', None)) is None:
+                can_annotate = perms['data_models.annotate_datafile'].check(
+                    request_user, instance)
+            initial_rep["can_annotate"] = can_annotate
 
         return initial_rep
 
     class Meta:
         model = DataFile
         exclude = ["do_not_remove", "local_path", "favourite_of",
-                   "tar_file"]
+                   "tar_file", "search_text", "search_vector", "report_parsed"]
+        list_serializer_class = DataFileListSerializer
 
     def validate(self, data):
         """
@@ -396,6 +443,10 @@ class DataFileUploadSerializer(serializers.Serializer):
     autoupdate = serializers.BooleanField(default=False)
     rename = serializers.BooleanField(default=True)
     check_filename = serializers.BooleanField(default=True)
+    deduplicate = serializers.BooleanField(
+        default=False, help_text="If True, do not save files with the same contents as a file already attached to the device.")
+    asynchronous = serializers.BooleanField(
+        default=False, help_text="If True, stage the files and create DataFiles in the background.")
     data_types = serializers.ListField(child=serializers.SlugRelatedField(slug_field='name',
                                                                           queryset=DataType.objects.all()),
                                        required=False)
@@ -489,6 +540,7 @@ class GenericJobSerializer(serializers.Serializer):
         admin_only (bool): If superuser is required.
         max_items (int): Max items for the job.
         default_args (dict): Default arguments as JSON.
+        chunked (bool): If the job can run over any number of filtered items in chunks.
     """
     id = serializers.IntegerField()
     name = serializers.CharField()
@@ -497,3 +549,4 @@ class GenericJobSerializer(serializers.Serializer):
     admin_only = serializers.BooleanField()
     max_items = serializers.IntegerField()
     default_args = serializers.JSONField()
+    chunked = serializers.BooleanField()
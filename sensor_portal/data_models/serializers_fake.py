@@ -11,10 +11,29 @@ ctdp_parameter = OpenApiParameter("ctdp",
                                   OpenApiTypes.BOOL,
                                   OpenApiParameter.QUERY,
                                   description='Set True to return in camtrap DP format')
+export_format_parameter = OpenApiParameter("export_format",
+                                          OpenApiTypes.STR,
+                                          OpenApiParameter.QUERY,
+                                          enum=["csv", "ndjson"],
+                                          default="csv",
+                                          description='Format of the export, csv or ndjson')
 geoJSON_parameter = OpenApiParameter("geojson",
                                      OpenApiTypes.BOOL,
                                      OpenApiParameter.QUERY,
                                      description='Set True to return in geoJSON format')
+metric_parameters = [OpenApiParameter("start_dt",
+                                     OpenApiTypes.DATETIME,
+                                     OpenApiParameter.QUERY,
+                                     description='Only return values from this datetime'),
+                     OpenApiParameter("end_dt",
+                                     OpenApiTypes.DATETIME,
+                                     OpenApiParameter.QUERY,
+                                     description='Only return values up to this datetime'),
+                     OpenApiParameter("metric_names",
+                                     OpenApiTypes.STR,
+                                     OpenApiParameter.QUERY,
+                                     many=True,
+                                     description='Only return these report metrics')]
 
 inline_id_serializer = inline_serializer("IDserializer",
                                          {"ids":
@@ -1,13 +1,20 @@
 import logging
 
 from django.conf import settings
+from django.db.models.functions import TruncDate
 from django.db.models.signals import (m2m_changed, post_delete, post_save,
-                                      pre_delete)
+                                      pre_delete, pre_save)
 from django.dispatch import receiver
+from django.utils import timezone as djtimezone
 from user_management.models import User
 from utils.perm_functions import cascade_permissions
 
-from .models import DataFile, DataType, Deployment, Device, Project
+from .count_cache_functions import (invalidate_favourite_counts,
+                                    invalidate_file_counts)
+from .models import (DataFile, DataType, Deployment, DeploymentAccess,
+                     DeploymentDailyFileStats, Device, Project)
+from .name_index_functions import OriginalNameIndex, index_new_datafiles
+from .search_functions import update_search_documents
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +61,70 @@ def update_combo_project(sender, instance, action, reverse, *args, **kwargs):
         instance.save()
 
 
+@receiver(m2m_changed, sender=Deployment.project.through)
+@receiver(m2m_changed, sender=Deployment.managers.through)
+@receiver(m2m_changed, sender=Deployment.annotators.through)
+@receiver(m2m_changed, sender=Deployment.viewers.through)
+@receiver(m2m_changed, sender=Project.managers.through)
+@receiver(m2m_changed, sender=Project.annotators.through)
+@receiver(m2m_changed, sender=Project.viewers.through)
+@receiver(m2m_changed, sender=Device.managers.through)
+@receiver(m2m_changed, sender=Device.annotators.through)
+@receiver(m2m_changed, sender=Device.viewers.through)
+def update_m2m_modified(sender, instance, action, reverse, model, pk_set, *args, **kwargs):
+    """
+    Signal to update modified_on of objects whose projects, managers, annotators or viewers change.
+    These are serialized with the objects, so conditional GET validators must change with them.
+    Objects are updated directly, so that their save signals are not sent again.
+
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if action != 'pre_clear' and not pk_set:
+        return
+    if not reverse:
+        objects = type(instance).objects.filter(pk=instance.pk)
+    elif action == 'pre_clear':
+        # instance is the related object, so find the objects it is about to be removed from
+        m2m_field = next(x for x in model._meta.many_to_many
+                         if x.remote_field.through is sender)
+        objects = model.objects.filter(**{m2m_field.name: instance})
+    else:
+        objects = model.objects.filter(pk__in=pk_set)
+    objects.update(modified_on=djtimezone.now())
+
+
+deployment_access_roles = {Deployment.managers.through: DeploymentAccess.Role.MANAGER,
+                           Deployment.annotators.through: DeploymentAccess.Role.ANNOTATOR,
+                           Deployment.viewers.through: DeploymentAccess.Role.VIEWER}
+
+
+@receiver(m2m_changed, sender=Deployment.managers.through)
+@receiver(m2m_changed, sender=Deployment.annotators.through)
+@receiver(m2m_changed, sender=Deployment.viewers.through)
+def update_deployment_access(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    """
+    Signal to keep the deployment access table in line with the deployment's managers, annotators and viewers.
+    Covers changes from `cascade_permissions` and `Deployment.get_permissions`, as well as direct changes.
+
+    """
+    role = deployment_access_roles[sender]
+    if reverse:
+        # instance is a user, pk_set are deployments
+        if action == 'post_add':
+            DeploymentAccess.add(role, list(pk_set), [instance.pk])
+        elif action == 'post_remove':
+            DeploymentAccess.remove(role, list(pk_set), [instance.pk])
+        elif action == 'post_clear':
+            DeploymentAccess.objects.filter(role=role, user=instance).delete()
+    else:
+        if action == 'post_add':
+            DeploymentAccess.add(role, [instance.pk], list(pk_set))
+        elif action == 'post_remove':
+            DeploymentAccess.remove(role, [instance.pk], list(pk_set))
+        elif action == 'post_clear':
+            DeploymentAccess.remove(role, [instance.pk])
+
 # @receiver(m2m_changed, sender=Project.managers.through)
 # @receiver(m2m_changed, sender=Project.annotators.through)
 # @receiver(m2m_changed, sender=Project.viewers.through)
@@ -68,20 +139,95 @@ def update_combo_project(sender, instance, action, reverse, *args, **kwargs):
 # DataFile signals
 
 
+# Fields of DataFile counted in its daily file statistics
+stats_fields = ['recording_dt', 'deployment', 'file_size', 'has_human', 'file_type']
+# Fields of DataFile in its search document
+search_fields = ['file_name', 'tag']
+
+
+def changed_fields(instance: DataFile, fields: list[str]) -> set[str]:
+    """
+    Get which of the given fields of a saved DataFile differ from the values recorded before it was saved.
+
+    Args:
+        instance (DataFile): Saved DataFile.
+        fields (list[str]): Names of fields to compare.
+
+    Returns:
+        set[str]: Names of fields that changed.
+    """
+    previous_values = getattr(instance, '_previous_values', None)
+    if previous_values is None:
+        return set()
+    changed = set()
+    for field_name in fields:
+        attname = DataFile._meta.get_field(field_name).attname
+        if previous_values[attname] != getattr(instance, attname):
+            changed.add(field_name)
+    return changed
+
+
+@receiver(pre_save, sender=DataFile)
+def pre_save_file(sender, instance: DataFile, update_fields=None, **kwargs):
+    """
+    Pre save signal for DataFile model to record the values of fields counted in the daily file statistics
+    and used in the search document, so that these are only updated if the fields change,
+    and so that the row the file was counted in can be refreshed if its recording datetime or deployment change.
+    """
+    instance._previous_values = None
+    if instance._state.adding or instance.pk is None:
+        return
+    if update_fields is None or not set(stats_fields + search_fields).isdisjoint(update_fields):
+        instance._previous_values = DataFile.objects.filter(pk=instance.pk).annotate(
+            date=TruncDate('recording_dt')).values(
+                'date', *[DataFile._meta.get_field(x).attname for x in stats_fields + search_fields]).first()
+
+
 @receiver(post_save, sender=DataFile)
-def post_save_file(sender, instance: DataFile, created, **kwargs):
+def post_save_file(sender, instance: DataFile, created, update_fields=None, **kwargs):
     """
-    Post save signal for DataFile model to update the deployment's thumbnail URL.
+    Post save signal for DataFile model to update the deployment's thumbnail URL,
+    to add new files to their device's original name index, to update the file's search document,
+    to update the deployment's daily file statistics and to invalidate cached file counts.
     """
+    if created:
+        index_new_datafiles([instance])
+        invalidate_file_counts([instance.deployment_id])
+    if created or changed_fields(instance, search_fields):
+        update_search_documents(DataFile.objects.filter(pk=instance.pk))
+    if created or changed_fields(instance, stats_fields):
+        previous_values = getattr(instance, '_previous_values', None)
+        previous_keys = [(previous_values['deployment_id'], previous_values['date'])] \
+            if previous_values is not None else None
+        DeploymentDailyFileStats.refresh(DataFile.objects.filter(pk=instance.pk), previous_keys)
     if instance.deployment.thumb_url is not None and instance.deployment.thumb_url != "":
         instance.deployment.set_thumb_url()
         instance.deployment.save()
 
 
+@receiver(m2m_changed, sender=DataFile.favourite_of.through)
+def update_favourite_counts(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    """
+    Signal to invalidate cached counts of favourited files when a file's favourites change.
+
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # instance is a user
+        if action == 'pre_clear' or pk_set:
+            invalidate_favourite_counts([instance.pk])
+    elif action == 'pre_clear':
+        invalidate_favourite_counts(instance.favourite_of.values_list('pk', flat=True))
+    else:
+        invalidate_favourite_counts(pk_set)
+
+
 @receiver(pre_delete, sender=DataFile)
 def pre_remove_file(sender, instance: DataFile, **kwargs):
     """
-    Pre delete signal for DataFile model to clean up the attached file before deletion.
+    Pre delete signal for DataFile model to clean up the attached file before deletion,
+    and to invalidate cached counts of its users' favourites.
 
     """
     # deletes the attached file from data storage
@@ -89,13 +235,20 @@ def pre_remove_file(sender, instance: DataFile, **kwargs):
     if not success:
         raise (
             Exception(f'Unable to delete datafile object {instance.file_name}'))
+    invalidate_favourite_counts(instance.favourite_of.values_list('pk', flat=True))
 
 
 @receiver(post_delete, sender=DataFile)
 def post_remove_file(sender, instance: DataFile, **kwargs):
     """
-    Post delete signal for DataFile model to update the deployment's thumbnail URL after a file is deleted.
+    Post delete signal for DataFile model to update the deployment's thumbnail URL after a file is deleted,
+    to remove the file from its device's original name index and daily file statistics,
+    and to invalidate cached file counts.
     """
+    OriginalNameIndex(instance.deployment.device_id).remove_name(
+        instance.original_name)
+    DeploymentDailyFileStats.remove_file(instance)
+    invalidate_file_counts([instance.deployment_id])
     if instance.deployment.thumb_url is not None and instance.deployment.thumb_url != "":
         instance.deployment.set_thumb_url()
         instance.deployment.save()
@@ -1,10 +1,11 @@
 import logging
 from datetime import datetime, timedelta
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from bridgekeeper import perms
 from celery import shared_task
 from data_models.job_handling_functions import register_job
+from django.conf import settings
 from django.contrib.sites.models import Site
 from django.db.models import (BooleanField, DurationField, ExpressionWrapper,
                               F, IntegerField, Max, Q)
@@ -15,13 +16,17 @@ from utils.email import send_email_to_user
 
 from sensor_portal.celery import app
 
-from .models import DataFile, Deployment, Device, Project
+from .file_handling_functions import process_ingest_batch
+from .models import (DataFile, Deployment, DeploymentDailyFileStats, Device,
+                     IngestBatch, JobSelection, Project)
+from .plotting_functions import parse_report_files
+from .search_functions import update_search_documents
 
 logger = logging.getLogger(__name__)
 
 
 @app.task(name="end_deployments")
-@register_job("End deployments", "end_deployments", "deployment", True, default_args={})
+@register_job("End deployments", "end_deployments", "deployment", True, default_args={}, chunked=True)
 def end_deployments(deployment_pks: List[int], no_delete: bool = False, **kwargs):
     """
     Mark the specified deployments as ended.
@@ -40,7 +45,7 @@ def end_deployments(deployment_pks: List[int], no_delete: bool = False, **kwargs
 
 
 @app.task(name="set_tag")
-@register_job("Set tag", "set_tag", "datafile", True, default_args={"new_tag": ""})
+@register_job("Set tag", "set_tag", "datafile", True, default_args={"new_tag": ""}, chunked=True)
 def set_tag_task(datafile_pks: List[int], new_tag: str = "", **kwargs):
     """
     Set a tag on specified DataFile objects.
@@ -55,10 +60,12 @@ def set_tag_task(datafile_pks: List[int], new_tag: str = "", **kwargs):
     file_objs = DataFile.objects.filter(pk__in=datafile_pks)
     logger.info(file_objs.count())
     file_objs.update(tag=new_tag)
+    update_search_documents(file_objs)
 
 
 @app.task(name="flag_no_delete")
-@register_job("Change no delete flag", "flag_no_delete", "datafile", True, default_args={"no_delete": True})
+@register_job("Change no delete flag", "flag_no_delete", "datafile", True, default_args={"no_delete": True},
+              chunked=True)
 def flag_no_delete(datafile_pks: List[int], no_delete: bool = False, **kwargs):
     """
     Set or unset the 'do_not_remove' flag for specified DataFile objects.
@@ -76,7 +83,8 @@ def flag_no_delete(datafile_pks: List[int], no_delete: bool = False, **kwargs):
 
 
 @app.task(name="flag_humans")
-@register_job("Change human flag", "flag_humans", "datafile", True, default_args={"has_human": False})
+@register_job("Change human flag", "flag_humans", "datafile", True, default_args={"has_human": False},
+              chunked=True)
 def flag_humans(datafile_pks: List[int], has_human: bool = False, **kwargs):
     """
     Set or unset the 'has_human' flag for specified DataFile objects.
@@ -91,6 +99,53 @@ def flag_humans(datafile_pks: List[int], has_human: bool = False, **kwargs):
     file_objs = DataFile.objects.filter(pk__in=datafile_pks)
     logger.info(file_objs.count())
     file_objs.update(has_human=has_human)
+    DeploymentDailyFileStats.refresh(file_objs)
+
+
+@app.task(name="run_job_selection")
+def run_job_selection_task(job_name: str, selection_pk: int, job_args: Dict[str, Any], user_pk: Optional[int] = None):
+    """
+    Run a generic job over a stored JobSelection, then delete the selection.
+
+    Chunked jobs are called on chunks of JOB_SELECTION_CHUNK_SIZE primary keys in turn,
+    other jobs are called once on all selected primary keys.
+
+    Args:
+        job_name (str): Name of the registered job.
+        selection_pk (int): Primary key of the JobSelection to run the job over.
+        job_args (Dict[str, Any]): Additional arguments of the job.
+        user_pk (int, optional): Primary key of the user who started the job. Defaults to None.
+    """
+    job_dict = settings.GENERIC_JOBS[job_name]
+    selection = JobSelection.objects.get(pk=selection_pk)
+    all_args = {**job_args}
+    if user_pk is not None:
+        all_args["user_pk"] = user_pk
+    pks_arg = f"{selection.data_type}_pks"
+    logger.info(f"Running {job_name} over {selection.n_items} objects")
+    try:
+        if job_dict["chunked"]:
+            for pks in selection.iterate_pks(settings.JOB_SELECTION_CHUNK_SIZE):
+                job_dict["task"](**{pks_arg: pks}, **all_args)
+        else:
+            pks = [pk for chunk in selection.iterate_pks() for pk in chunk]
+            job_dict["task"](**{pks_arg: pks}, **all_args)
+    finally:
+        selection.delete()
+
+
+@app.task(name="ingest_batch")
+def ingest_batch_task(ingest_batch_pk: int):
+    """
+    Create DataFiles from the staged files of an asynchronous upload.
+    Running this again for a failed batch resumes from the chunk that failed.
+
+    Args:
+        ingest_batch_pk (int): Primary key of the IngestBatch to process.
+    """
+    ingest_batch = IngestBatch.objects.get(pk=ingest_batch_pk)
+    logger.info(f"Processing {ingest_batch}")
+    process_ingest_batch(ingest_batch)
 
 
 @app.task()
@@ -130,6 +185,16 @@ def clean_all_files():
                     f"Error cleaning file {file.file_name} (ID: {file.pk}): {e}")
 
 
+@app.task()
+def parse_report_files_task():
+    """
+    Parse report files which have not been parsed yet, so that their metrics can be plotted
+    without requests for metrics reading the files.
+    """
+    n_parsed = parse_report_files(DataFile.objects.all())
+    logger.info(f"Parsed {n_parsed} report files.")
+
+
 @app.task()
 def check_deployment_active():
     """
@@ -4,16 +4,22 @@ import math
 import os
 from copy import copy
 from datetime import datetime as dt
+from datetime import timedelta
 from io import BytesIO
 
 import pytest
-from data_models.factories import (DeploymentFactory, DeviceFactory,
+from data_models.factories import (DataFileFactory, DataTypeFactory,
+                                   DeploymentFactory, DeviceFactory,
                                    ProjectFactory)
+from data_models.file_handling_functions import get_multipart_hasher
 from data_models.general_functions import create_image
-from data_models.models import DataFile
+from data_models.models import DataFile, DeploymentDailyFileStats
+from data_models.plotting_functions import parse_report_files
 from data_models.serializers import (DeploymentSerializer, DeviceSerializer,
                                      ProjectSerializer)
-from utils.general import read_in_chunks
+from observation_editor.factories import ObservationFactory, TaxonFactory
+from user_management.factories import UserFactory
+from utils.general import ResumableMD5, read_in_chunks
 from utils.test_functions import (api_check_delete, api_check_post,
                                   api_check_update)
 
@@ -394,3 +400,605 @@ def test_multipart_datafile(api_client_with_credentials):
     assert response_delete.status_code == 204
 
     assert not os.path.exists(file_path)
+
+
+@pytest.mark.django_db
+def test_multipart_datafile_out_of_order(api_client_with_credentials, django_capture_on_commit_callbacks):
+    """
+    Test: Multipart chunks that do not start where the previous chunk ended are rejected,
+    and is the checksum state of accepted chunks kept out of the file's extra data?
+    """
+
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(
+        owner=user, deployment_start=dt(1066, 1, 1, 0, 0, 0))
+
+    content = b"0123456789" * 10
+    api_url = '/api/datafile/'
+
+    def post_chunk(start, end):
+        chunk_file = BytesIO(content[start:end])
+        chunk_file.name = "test_file_order.dat"
+        payload = {
+            "deployment": new_item.deployment_device_ID,
+            "files": [chunk_file],
+            "recording_dt": [dt(1066, 1, 2, 0, 0, 0)],
+            "extra_data": [json.dumps({})]
+        }
+        headers = {'Content-Range': f'bytes {start}-{end - 1}/{len(content)}'}
+        return api_client_with_credentials.post(
+            api_url, data=payload,  format='multipart', headers=headers)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        # First chunk must start at 0
+        assert post_chunk(10, 20).status_code == 400
+        assert post_chunk(0, 50).status_code == 201
+        # Duplicate chunk
+        assert post_chunk(0, 50).status_code == 400
+        # Skipped bytes
+        assert post_chunk(60, 100).status_code == 400
+        assert post_chunk(50, 100).status_code == 100
+
+    file_object = DataFile.objects.get(original_name="test_file_order.dat")
+    assert file_object.extra_data["multipart_offset"] == len(content)
+    assert "multipart_md5_state" not in file_object.extra_data
+    if ResumableMD5.is_available():
+        multipart_hasher = get_multipart_hasher(file_object.file_name, len(content))
+        assert multipart_hasher.hexdigest() == hashlib.md5(content).hexdigest()
+        assert get_multipart_hasher(file_object.file_name, 50) is None
+    with open(file_object.full_path(), "rb") as f:
+        assert f.read() == content
+    file_object.delete()
+
+
+@pytest.mark.django_db
+def test_check_existing(api_client_with_credentials):
+    """
+    Test: check_existing returns only the names not already attached to a device.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    other_item = DeploymentFactory(owner=user)
+    DataFileFactory(deployment=new_item, original_name="existing.jpg")
+    DataFileFactory(deployment=other_item, original_name="other_device.jpg")
+
+    api_url = '/api/datafile/check_existing/'
+    payload = {"original_names": ["existing.jpg", "other_device.jpg", "new.jpg"],
+               "deployment__device": new_item.device.pk}
+    response = api_client_with_credentials.post(
+        api_url, data=payload, format='json')
+    assert response.status_code == 200
+    assert response.data == ["other_device.jpg", "new.jpg"]
+
+    # Deleted files are no longer existing
+    DataFile.objects.filter(original_name="existing.jpg").delete()
+    response = api_client_with_credentials.post(
+        api_url, data=payload, format='json')
+    assert response.data == ["existing.jpg", "other_device.jpg", "new.jpg"]
+
+
+@pytest.mark.django_db
+def test_deduplicate_datafile(api_client_with_credentials):
+    """
+    Test: Files with the same contents as an existing file are not saved when deduplicating.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    temp = BytesIO()
+    test_image = create_image()
+    test_image.save(temp, format="JPEG")
+    content = temp.getvalue()
+
+    new_item = DeploymentFactory(
+        owner=user, deployment_start=dt(1066, 1, 1, 0, 0, 0))
+
+    api_url = '/api/datafile/'
+
+    def upload(name):
+        upload_file = BytesIO(content)
+        upload_file.name = name
+        payload = {
+            "deployment": new_item.deployment_device_ID,
+            "files": [upload_file],
+            "recording_dt": [dt(1066, 1, 2, 0, 0, 0)],
+            "deduplicate": True
+        }
+        return api_client_with_credentials.post(
+            api_url, data=payload,  format='multipart')
+
+    response_create = upload("test_file_dedup.jpeg")
+    assert response_create.status_code == 201
+    file_object = DataFile.objects.get(
+        file_name=response_create.data["uploaded_files"][0]["file_name"])
+    assert file_object.md5_checksum == hashlib.md5(content).hexdigest()
+
+    response_duplicate = upload("test_file_dedup_retry.jpeg")
+    assert response_duplicate.status_code == 200
+    assert len(response_duplicate.data["uploaded_files"]) == 0
+    assert "test_file_dedup_retry.jpeg" in response_duplicate.data["existing_files"][0]
+
+    file_object.delete()
+
+
+@pytest.mark.django_db
+def test_deduplicate_datafile_shared_extra_data(api_client_with_credentials):
+    """
+    Test: Are files in one upload sharing extra data, including a client checksum, deduplicated by their own contents?
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    contents = []
+    for i in range(2):
+        temp = BytesIO()
+        create_image().save(temp, format="JPEG")
+        contents.append(temp.getvalue())
+
+    new_item = DeploymentFactory(
+        owner=user, deployment_start=dt(1066, 1, 1, 0, 0, 0))
+
+    upload_files = []
+    for name, content in [("test_file_shared_1.jpeg", contents[0]),
+                          ("test_file_shared_2.jpeg", contents[1]),
+                          ("test_file_shared_3.jpeg", contents[0])]:
+        upload_file = BytesIO(content)
+        upload_file.name = name
+        upload_files.append(upload_file)
+
+    payload = {
+        "deployment": new_item.deployment_device_ID,
+        "files": upload_files,
+        "recording_dt": [dt(1066, 1, 2, 0, 0, 0)],
+        # Shared by all files, and only correct for the second one
+        "extra_data": [json.dumps({"md5_checksum": hashlib.md5(contents[1]).hexdigest()})],
+        "deduplicate": True
+    }
+    response_create = api_client_with_credentials.post(
+        '/api/datafile/', data=payload,  format='multipart')
+    assert response_create.status_code == 201
+
+    uploaded_files = DataFile.objects.filter(
+        file_name__in=[x["file_name"] for x in response_create.data["uploaded_files"]])
+    assert {x.original_name: x.md5_checksum for x in uploaded_files} == {
+        "test_file_shared_1.jpeg": hashlib.md5(contents[0]).hexdigest(),
+        "test_file_shared_2.jpeg": hashlib.md5(contents[1]).hexdigest()}
+    assert len(response_create.data["existing_files"]) == 1
+    assert "test_file_shared_3.jpeg" in response_create.data["existing_files"][0]
+
+    for data_file in uploaded_files:
+        data_file.delete()
+
+
+@pytest.mark.django_db
+def test_deduplicate_datafile_other_user(api_client_with_credentials):
+    """
+    Test: Files are not deduplicated against deployments of the same device that the user cannot change.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    temp = BytesIO()
+    test_image = create_image()
+    test_image.save(temp, format="JPEG")
+    content = temp.getvalue()
+
+    new_device = DeviceFactory()
+    other_deployment = DeploymentFactory(device=new_device, deployment_start=dt(1066, 1, 1, 0, 0, 0),
+                                         deployment_end=dt(1066, 12, 31, 0, 0, 0))
+    other_file = DataFileFactory(deployment=other_deployment,
+                                 recording_dt=dt(1066, 1, 2, 0, 0, 0),
+                                 md5_checksum=hashlib.md5(content).hexdigest())
+    new_item = DeploymentFactory(owner=user, device=new_device,
+                                 deployment_start=dt(1067, 1, 1, 0, 0, 0))
+
+    upload_file = BytesIO(content)
+    upload_file.name = "test_file_dedup_other_user.jpeg"
+    payload = {
+        "deployment": new_item.deployment_device_ID,
+        "files": [upload_file],
+        "recording_dt": [dt(1067, 1, 2, 0, 0, 0)],
+        "deduplicate": True
+    }
+    response_create = api_client_with_credentials.post(
+        '/api/datafile/', data=payload,  format='multipart')
+    assert response_create.status_code == 201
+    assert len(response_create.data["existing_files"]) == 0
+    assert other_file.file_name not in str(response_create.data)
+
+    DataFile.objects.get(
+        file_name=response_create.data["uploaded_files"][0]["file_name"]).delete()
+    other_file.delete()
+
+
+@pytest.mark.django_db
+def test_datafile_list_user_flags(api_client_with_credentials):
+    """
+    Test: favourite and can_annotate flags are set when listing datafiles.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    favourite_file = DataFileFactory(deployment=new_item)
+    other_file = DataFileFactory(deployment=new_item)
+    favourite_file.add_favourite(user)
+
+    response = api_client_with_credentials.get(
+        f'/api/datafile/deployment/{new_item.pk}/', format='json')
+    assert response.status_code == 200
+    flags = {x["id"]: (x["favourite"], x["can_annotate"])
+             for x in response.data}
+    assert flags[favourite_file.pk][0]
+    assert not flags[other_file.pk][0]
+    assert all(x[1] for x in flags.values())
+
+    for data_file in [favourite_file, other_file]:
+        data_file.delete()
+
+
+@pytest.mark.django_db
+def test_datafile_keyset_pagination(api_client_with_credentials):
+    """
+    Test: Following cursor pagination links returns every datafile exactly once.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    data_files = [DataFileFactory(deployment=new_item) for i in range(5)]
+    # Files with the same recording datetime must not be skipped
+    DataFile.objects.filter(pk__in=[x.pk for x in data_files[:3]]).update(
+        recording_dt=data_files[0].recording_dt)
+
+    next_url = f'/api/datafile/deployment/{new_item.pk}/?pagination=cursor&page_size=2'
+    seen_pks = []
+    pages = []
+    while next_url is not None:
+        response = api_client_with_credentials.get(next_url, format='json')
+        assert response.status_code == 200
+        pages.append(response.data)
+        seen_pks += [x["id"] for x in response.data["results"]]
+        next_url = response.data["next"]
+
+    assert len(pages) == 3
+    assert sorted(seen_pks) == sorted([x.pk for x in data_files])
+
+    # Previous link of the last page returns the second page
+    response = api_client_with_credentials.get(
+        pages[-1]["previous"], format='json')
+    assert [x["id"] for x in response.data["results"]] == \
+        [x["id"] for x in pages[1]["results"]]
+
+    for data_file in data_files:
+        data_file.delete()
+
+
+@pytest.mark.django_db
+def test_datafile_keyset_pagination_microseconds(api_client_with_credentials):
+    """
+    Test: Cursor pagination keeps the microseconds of recording datetimes, so ties and close values are not skipped.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    data_files = [DataFileFactory(deployment=new_item) for i in range(6)]
+    tie_dt = data_files[0].recording_dt.replace(microsecond=123456)
+    recording_dts = [tie_dt, tie_dt, tie_dt,
+                     tie_dt + timedelta(microseconds=1),
+                     tie_dt + timedelta(microseconds=500),
+                     tie_dt - timedelta(microseconds=1)]
+    for data_file, recording_dt in zip(data_files, recording_dts):
+        DataFile.objects.filter(pk=data_file.pk).update(
+            recording_dt=recording_dt)
+
+    for ordering in ["", "&ordering=recording_dt"]:
+        next_url = f'/api/datafile/deployment/{new_item.pk}/?pagination=cursor&page_size=2{ordering}'
+        seen_pks = []
+        while next_url is not None:
+            response = api_client_with_credentials.get(
+                next_url, format='json')
+            assert response.status_code == 200
+            seen_pks += [x["id"] for x in response.data["results"]]
+            next_url = response.data["next"]
+        assert len(seen_pks) == len(data_files)
+        assert sorted(seen_pks) == sorted([x.pk for x in data_files])
+
+    for data_file in data_files:
+        data_file.delete()
+
+
+@pytest.mark.django_db
+def test_datafile_export(api_client_with_credentials):
+    """
+    Test: Filtered datafiles can be exported as NDJSON and CSV.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    other_item = DeploymentFactory()
+    data_files = [DataFileFactory(deployment=new_item) for i in range(3)]
+    other_file = DataFileFactory(deployment=other_item)
+
+    response = api_client_with_credentials.get(
+        f'/api/datafile/export/?deployment__id={new_item.pk}&export_format=ndjson')
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    rows = [json.loads(x) for x in b"".join(
+        response.streaming_content).decode().splitlines()]
+    assert sorted([x["id"] for x in rows]) == sorted(
+        [x.pk for x in data_files])
+
+    response = api_client_with_credentials.get(
+        '/api/datafile/export/?export_format=csv')
+    assert response.status_code == 200
+    lines = b"".join(response.streaming_content).decode().splitlines()
+    # Header and only the files this user can view
+    assert lines[0].startswith("id,file_name")
+    assert len(lines) == len(data_files) + 1
+
+    response = api_client_with_credentials.get(
+        '/api/datafile/export/?export_format=xml')
+    assert response.status_code == 400
+
+    for data_file in data_files + [other_file]:
+        data_file.delete()
+
+
+@pytest.mark.django_db
+def test_datafile_search(api_client_with_credentials):
+    """
+    Test: Datafiles can be searched by file name, tag and observed taxon, and the search document
+    is updated when observations, the file name or the tag change.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    data_file = DataFileFactory(
+        deployment=new_item, file_name="searchablefile", tag="searchtag")
+    other_file = DataFileFactory(deployment=new_item)
+
+    def search_pks(term):
+        response = api_client_with_credentials.get(
+            f'/api/datafile/?search={term}&deployment__id={new_item.pk}', format='json')
+        assert response.status_code == 200
+        return [x["id"] for x in response.data]
+
+    assert search_pks("archable") == [data_file.pk]
+    assert search_pks("searchtag") == [data_file.pk]
+
+    taxon = TaxonFactory(species_name="Puffinus puffinus")
+    observation = ObservationFactory(taxon=taxon, data_files=[data_file])
+    assert search_pks("puffinus") == [data_file.pk]
+
+    observation.data_files.remove(data_file)
+    observation.data_files.add(other_file)
+    assert search_pks("puffinus") == [other_file.pk]
+
+    observation.delete()
+    assert search_pks("puffinus") == []
+
+    # Only updated when the file name or tag change
+    DataFile.objects.filter(pk=data_file.pk).update(search_text="")
+    data_file.save()
+    assert search_pks("searchtag") == []
+    data_file.tag = "newsearchtag"
+    data_file.save()
+    assert search_pks("newsearchtag") == [data_file.pk]
+
+    data_file.delete()
+    other_file.delete()
+
+
+@pytest.mark.django_db
+def test_deployment_metrics(api_client_with_credentials):
+    """
+    Test: Deployment metrics are read from daily file statistics, which follow added and deleted files.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    data_files = [DataFileFactory(deployment=new_item) for i in range(3)]
+    DataFile.objects.filter(pk__in=[x.pk for x in data_files]).update(
+        recording_dt=data_files[0].recording_dt)
+    DeploymentDailyFileStats.rebuild(new_item)
+
+    response = api_client_with_credentials.get(
+        f'/api/deployment/{new_item.pk}/metrics/', format='json')
+    assert response.status_code == 200
+    assert response.data["files_per_day"]["y_values"] == [3]
+    assert response.data["file_volume_per_day"]["y_values"] == [
+        sum([x.file_size for x in data_files])]
+
+    data_files[0].delete()
+    response = api_client_with_credentials.get(
+        f'/api/deployment/{new_item.pk}/metrics/', format='json')
+    assert response.data["files_per_day"]["y_values"] == [2]
+
+    for data_file in data_files[1:]:
+        data_file.delete()
+    response = api_client_with_credentials.get(
+        f'/api/deployment/{new_item.pk}/metrics/', format='json')
+    assert response.data == {}
+
+
+@pytest.mark.django_db
+def test_deployment_report_metrics(api_client_with_credentials):
+    """
+    Test: Are deployment report metrics filtered by the datetime and metric name query parameters?
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    report_type = DataTypeFactory(name="report")
+    data_file = DataFileFactory(deployment=new_item, file_type=report_type, file_format=".csv")
+    with open(data_file.full_path(), "w") as f:
+        f.write("date,temp__temperature_degrees_celsius,battery__battery_%\n"
+                "2025-01-27 12:00:00,5,90\n"
+                "2025-01-28 12:00:00,7,80\n")
+    parse_report_files(DataFile.objects.filter(pk=data_file.pk))
+
+    metrics_url = f'/api/deployment/{new_item.pk}/metrics/'
+    response = api_client_with_credentials.get(metrics_url, format='json')
+    assert response.status_code == 200
+    assert response.data["temp"]["y_values"] == [5, 7]
+    assert response.data["battery"]["y_values"] == [90, 80]
+
+    response = api_client_with_credentials.get(
+        metrics_url + '?start_dt=2025-01-28T00:00:00&metric_names=temp__temperature_degrees_celsius',
+        format='json')
+    assert response.status_code == 200
+    assert response.data["temp"]["y_values"] == [7]
+    assert "battery" not in response.data
+
+    response = api_client_with_credentials.get(
+        metrics_url + '?start_dt=yesterday', format='json')
+    assert response.status_code == 400
+
+    data_file.delete()
+
+
+@pytest.mark.django_db
+def test_datafile_queryset_count_cache(api_client_with_credentials, django_capture_on_commit_callbacks):
+    """
+    Test: Cached datafile counts are shared between equivalent filters, and invalidated once new files are committed.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    data_files = [DataFileFactory(deployment=new_item) for i in range(2)]
+
+    count_url = f'/api/datafile/deployment/{new_item.pk}/queryset_count/'
+    response = api_client_with_credentials.get(
+        count_url + '?local_storage=true&file_format=.JPG', format='json')
+    assert response.status_code == 200
+    assert response.data["object_n"] == 2
+
+    # Direct changes are not seen until the deployment's counts are invalidated
+    DataFile.objects.filter(pk=data_files[0].pk).update(file_format=".PNG")
+    response = api_client_with_credentials.get(
+        count_url + '?file_format=.JPG&local_storage=true', format='json')
+    assert response.data["object_n"] == 2
+
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        data_files.append(DataFileFactory(
+            deployment=new_item, file_format=".PNG"))
+        # Counts are not invalidated until the transaction commits
+        response = api_client_with_credentials.get(
+            count_url + '?file_format=.JPG&local_storage=true', format='json')
+        assert response.data["object_n"] == 2
+    assert len(callbacks) > 0
+    response = api_client_with_credentials.get(
+        count_url + '?file_format=.JPG&local_storage=true', format='json')
+    assert response.data["object_n"] == 1
+
+    for data_file in data_files:
+        data_file.delete()
+
+
+@pytest.mark.django_db
+def test_datafile_favourite_count_cache(api_client_with_credentials, django_capture_on_commit_callbacks):
+    """
+    Test: Are cached counts of favourites invalidated when favourites change, and are counts filtered to a deployment
+    kept when files of other deployments change?
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    other_item = DeploymentFactory(owner=user)
+    data_files = [DataFileFactory(deployment=new_item) for i in range(2)]
+
+    def get_count(url):
+        response = api_client_with_credentials.get(url, format='json')
+        assert response.status_code == 200
+        return response.data["object_n"]
+
+    favourite_url = '/api/datafile/user_favourite/queryset_count/'
+    favourited_url = '/api/datafile/favourited/queryset_count/'
+    with django_capture_on_commit_callbacks(execute=True):
+        data_files[0].add_favourite(user)
+    assert get_count(favourite_url) == 1
+    assert get_count(favourited_url) == 1
+
+    with django_capture_on_commit_callbacks(execute=True):
+        data_files[1].add_favourite(user)
+    assert get_count(favourite_url) == 2
+    assert get_count(favourited_url) == 2
+
+    with django_capture_on_commit_callbacks(execute=True):
+        user.favourites.clear()
+    assert get_count(favourite_url) == 0
+
+    deployment_count_url = f'/api/datafile/queryset_count/?deployment__id={new_item.pk}'
+    assert get_count(deployment_count_url) == 2
+    # Direct changes are not seen until the deployment's counts are invalidated
+    DataFile.objects.filter(pk__in=[x.pk for x in data_files]).update(deployment=other_item)
+    with django_capture_on_commit_callbacks(execute=True):
+        data_files.append(DataFileFactory(deployment=other_item))
+    assert get_count(deployment_count_url) == 2
+    with django_capture_on_commit_callbacks(execute=True):
+        data_files.append(DataFileFactory(deployment=new_item))
+    assert get_count(deployment_count_url) == 1
+
+    for data_file in data_files:
+        data_file.refresh_from_db()
+        data_file.delete()
+
+
+@pytest.mark.django_db
+def test_deployment_conditional_get(api_client_with_credentials):
+    """
+    Test: Unchanged deployment lists and deployments are answered with 304 Not Modified.
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+
+    for api_url in ['/api/deployment/', f'/api/deployment/{new_item.pk}/']:
+        response = api_client_with_credentials.get(api_url, format='json')
+        assert response.status_code == 200
+        etag = response.headers['ETag']
+
+        response = api_client_with_credentials.get(
+            api_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response.headers['ETag'] == etag
+
+        new_item.save()
+        response = api_client_with_credentials.get(
+            api_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+
+@pytest.mark.django_db
+def test_deployment_conditional_get_related(api_client_with_credentials):
+    """
+    Test: Do changes to deployment users, projects and related objects change the deployment's ETag?
+    """
+    user = api_client_with_credentials.handler._force_user
+
+    new_item = DeploymentFactory(owner=user)
+    other_user = UserFactory()
+    project = ProjectFactory()
+    api_url = f'/api/deployment/{new_item.pk}/'
+
+    def assert_changed(change):
+        etag = api_client_with_credentials.get(
+            api_url, format='json').headers['ETag']
+        change()
+        response = api_client_with_credentials.get(
+            api_url, format='json', HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def change_colour():
+        new_item.device.model.colour = "#123456"
+        new_item.device.model.save()
+
+    def rename_site():
+        new_item.site.name = "renamed_site"
+        new_item.site.save()
+
+    assert_changed(lambda: new_item.viewers.add(other_user))
+    assert_changed(lambda: other_user.viewable_deployments.remove(new_item))
+    assert_changed(lambda: project.deployments.add(new_item))
+    assert_changed(change_colour)
+    assert_changed(rename_site)
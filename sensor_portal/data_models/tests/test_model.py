@@ -1,15 +1,38 @@
 import datetime
+import hashlib
+import os
+import random
+import threading
+import time
 from datetime import timedelta
+from io import BytesIO
 
+import data_models.file_handling_functions as file_handling_functions
 import pytest
+from data_handlers.base_data_handler_class import DataTypeHandler
+from data_handlers.post_upload_task_handler import post_upload_task_handler
 from data_models.factories import (DataFileFactory, DataTypeFactory,
                                    DeploymentFactory, DeviceFactory,
                                    DeviceModelFactory, ProjectFactory,
                                    SiteFactory)
+from data_models.file_handling_functions import (UploadLookupCache,
+                                                 handle_uploaded_file,
+                                                 process_ingest_batch,
+                                                 stage_ingest_batch)
+from data_models.general_functions import check_dt, create_image
+from data_models.models import (DataFile, DeploymentDailyFileStats,
+                                FileNameSequence, IngestBatch, JobSelection)
+from data_models.plotting_functions import (parse_report_files,
+                                            report_file_metrics)
+from data_models.upload_handlers import (StagedUploadedFile,
+                                         StorageStagingUploadHandler)
 from django.conf import settings
 from django.contrib.gis.geos import Point
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
 from django.utils import timezone as djtimezone
+from user_management.factories import UserFactory
 
 
 @pytest.mark.django_db
@@ -87,6 +110,31 @@ def test_deployment_from_date():
     assert new_device.deployment_from_date("1067-06-06") == deployment_2
     assert new_device.deployment_from_date("1068-06-06") == deployment_3
 
+
+@pytest.mark.django_db
+def test_deployments_from_dates():
+    """
+    Test: Does the batch `deployments_from_dates` function match `deployment_from_date`?
+    """
+
+    new_device = DeviceFactory(type=None)
+    deployment_1 = DeploymentFactory(device_type=None,
+                                     device=new_device,
+                                     deployment_start=datetime.datetime(
+                                         1066, 1, 1),
+                                     deployment_end=datetime.datetime(1066, 12, 31))
+    deployment_2 = DeploymentFactory(device_type=None,
+                                     device=new_device,
+                                     deployment_start=datetime.datetime(
+                                         1068, 1, 1),
+                                     deployment_end=None)
+
+    test_dates = ["1066-06-06", "1067-06-06", "1068-06-06", None]
+    assert new_device.deployments_from_dates(test_dates) == [
+        deployment_1, None, deployment_2, None]
+    assert new_device.deployments_from_dates(test_dates) == [
+        new_device.deployment_from_date(x) for x in test_dates]
+
 # DO A VERSION OF THIS TEST WITH TIME ZONES
 
 
@@ -254,3 +302,377 @@ def test_file_in_deployment():
         DataFileFactory(recording_dt=datetime.datetime(
             1068, 1, 1),
             deployment=new_deployment)
+
+
+@pytest.mark.django_db
+def test_report_file_metrics():
+    """
+    Test: Are report files parsed once into report metrics, and read back by name and time range
+    without reading the report files?
+    """
+    report_type = DataTypeFactory(name="report")
+    data_file = DataFileFactory(file_type=report_type, file_format=".csv")
+    with open(data_file.full_path(), "w") as f:
+        f.write("date,temp__temperature_degrees_celsius,imei__\n"
+                "2025-01-27 12:00:00,5,123\n"
+                "2025-01-28 12:00:00,7,123\n")
+
+    data_files = DataFile.objects.filter(pk=data_file.pk)
+    # Report files are not read when getting metrics
+    assert report_file_metrics(data_files) == {}
+    assert parse_report_files(data_files) == 1
+    metric_dict = report_file_metrics(data_files)
+    assert list(metric_dict.keys()) == ["temp"]
+    assert metric_dict["temp"]["x_values"] == [
+        "2025-01-27 12:00:00", "2025-01-28 12:00:00"]
+    assert metric_dict["temp"]["y_values"] == [5, 7]
+
+    # Values are read from the database once parsed
+    with open(data_file.full_path(), "w") as f:
+        f.write("date,temp__temperature_degrees_celsius\n"
+                "2025-01-28 12:00:00,100\n")
+    assert parse_report_files(data_files) == 0
+    start_dt = check_dt(datetime.datetime(2025, 1, 28),
+                        data_file.deployment.time_zone)
+    metric_dict = report_file_metrics(data_files, start_dt=start_dt)
+    assert metric_dict["temp"]["y_values"] == [7]
+
+    data_file.delete()
+
+
+@pytest.mark.django_db
+def test_report_file_metrics_no_values():
+    """
+    Test: Are report files without datetimes marked as parsed, so that they are not read again?
+    """
+    report_type = DataTypeFactory(name="report")
+    data_file = DataFileFactory(file_type=report_type, file_format=".csv")
+    with open(data_file.full_path(), "w") as f:
+        f.write("imei__,csq__\n"
+                "123,10\n")
+
+    data_files = DataFile.objects.filter(pk=data_file.pk)
+    assert parse_report_files(data_files) == 1
+    assert report_file_metrics(data_files) == {}
+    data_file.refresh_from_db()
+    assert data_file.report_parsed
+    assert not data_file.report_metrics.exists()
+
+    # Parsed files are not read again
+    with open(data_file.full_path(), "w") as f:
+        f.write("date,temp__temperature_degrees_celsius\n"
+                "2025-01-28 12:00:00,100\n")
+    assert parse_report_files(data_files) == 0
+    assert report_file_metrics(data_files) == {}
+
+    data_file.delete()
+
+
+@pytest.mark.django_db
+def test_job_selection():
+    """
+    Test: Are all files of a queryset stored in a job selection, and iterated in chunks?
+    """
+    deployment = DeploymentFactory()
+    data_files = [DataFileFactory(deployment=deployment) for i in range(5)]
+    file_pks = sorted([x.pk for x in data_files])
+
+    selection = JobSelection.from_queryset(
+        DataFile.objects.filter(deployment=deployment), "datafile")
+    assert selection.n_items == 5
+    chunks = list(selection.iterate_pks(chunk_size=2))
+    assert [len(x) for x in chunks] == [2, 2, 1]
+    assert [pk for chunk in chunks for pk in chunk] == file_pks
+
+    selection.delete()
+    for data_file in data_files:
+        data_file.delete()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_file_name_sequence_allocate():
+    """
+    Test: Are file numbers allocated in contiguous blocks, without waiting for other uploads to commit?
+    """
+    deployment = DeploymentFactory()
+    data_type = DataTypeFactory()
+    upload_date = datetime.date(2025, 1, 1)
+    thread_allocations = []
+
+    def allocate_in_thread():
+        try:
+            with transaction.atomic():
+                thread_allocations.append(FileNameSequence.allocate(
+                    deployment, data_type, upload_date, 2))
+        finally:
+            connection.close()
+
+    with transaction.atomic():
+        assert FileNameSequence.allocate(
+            deployment, data_type, upload_date, 3) == 1
+        # Would wait for this transaction if the sequence row was still locked
+        allocate_thread = threading.Thread(target=allocate_in_thread)
+        allocate_thread.start()
+        allocate_thread.join(timeout=30)
+        assert not allocate_thread.is_alive()
+        assert thread_allocations == [4]
+
+    assert FileNameSequence.allocate(
+        deployment, data_type, upload_date, 1) == 6
+    assert FileNameSequence.objects.get(
+        deployment=deployment, file_type=data_type, upload_date=upload_date).last_n == 6
+
+
+@pytest.mark.django_db
+def test_upload_lookup_cache(django_assert_num_queries):
+    """
+    Test: Are permission and lookup queries made once per key, however many files are uploaded?
+    """
+    user = UserFactory()
+    deployments = [DeploymentFactory(owner=user) for i in range(2)]
+    other_deployment = DeploymentFactory()
+    data_type = DataTypeFactory()
+
+    lookup_cache = UploadLookupCache(user)
+    for deployment in deployments + [other_deployment]:
+        lookup_cache.can_attach(deployment)
+        lookup_cache.get_project_tasks(deployment)
+    lookup_cache.get_data_type(data_type.name)
+
+    # Every later lookup of the same keys is served from the cache
+    with django_assert_num_queries(0):
+        for i in range(50):
+            for deployment in deployments:
+                assert lookup_cache.can_attach(deployment)
+                lookup_cache.get_project_tasks(deployment)
+            assert not lookup_cache.can_attach(other_deployment)
+            assert lookup_cache.get_data_type(data_type.name) == data_type
+
+    assert lookup_cache.counters["permission"] == {"hits": 150, "misses": 3}
+    assert lookup_cache.counters["project_tasks"] == {"hits": 100, "misses": 3}
+    assert lookup_cache.counters["data_type"] == {"hits": 50, "misses": 1}
+
+
+@pytest.mark.django_db
+def test_batch_full_clean():
+    """
+    Test: Does batch validation of new files give the same errors as validating each file with full_clean?
+    """
+    deployment = DeploymentFactory(deployment_start=datetime.datetime(2020, 1, 1, tzinfo=djtimezone.utc),
+                                   deployment_end=datetime.datetime(2020, 12, 31, tzinfo=djtimezone.utc))
+    in_deployment_dt = datetime.datetime(2020, 6, 1, tzinfo=djtimezone.utc)
+    out_deployment_dt = datetime.datetime(2019, 6, 1, tzinfo=djtimezone.utc)
+    existing_file = DataFileFactory(
+        deployment=deployment, recording_dt=in_deployment_dt)
+
+    new_files = [
+        DataFileFactory.build(deployment=deployment, file_name="batch_clean_valid",
+                              recording_dt=in_deployment_dt),
+        DataFileFactory.build(deployment=deployment, file_name="batch_clean_out_of_deployment",
+                              recording_dt=out_deployment_dt),
+        DataFileFactory.build(deployment=deployment, file_name=existing_file.file_name,
+                              recording_dt=in_deployment_dt),
+        DataFileFactory.build(deployment=deployment, file_name="batch_clean_bad_format",
+                              file_format="." + "x" * 20, recording_dt=out_deployment_dt),
+    ]
+
+    def full_clean_errors(data_file):
+        try:
+            data_file.full_clean()
+        except ValidationError as e:
+            return e.message_dict
+        return None
+
+    batch_errors = [x.message_dict if x is not None else None
+                    for x in DataFile.batch_full_clean(new_files)]
+    assert batch_errors == [full_clean_errors(x) for x in new_files]
+    assert batch_errors[0] is None
+    assert list(batch_errors[1].keys()) == ["recording_dt"]
+    assert list(batch_errors[2].keys()) == ["file_name"]
+    assert sorted(batch_errors[3].keys()) == ["file_format", "recording_dt"]
+
+    existing_file.delete()
+
+
+def test_handle_files_concurrent():
+    """
+    Test: Does handling files in a thread pool give the same results, in the same order, as handling them one by one?
+    """
+    class SlowHandler(DataTypeHandler):
+        max_handling_workers = 4
+
+        def handle_file(self, file, recording_dt=None, extra_data=None, data_type=None):
+            # Finish in a different order to the input
+            time.sleep(random.uniform(0, 0.05))
+            recording_dt, extra_data, data_type, task = super().handle_file(
+                file, recording_dt, extra_data, data_type)
+            extra_data["name_length"] = len(file.name)
+            return recording_dt, extra_data, data_type, task
+
+    class NamedFile():
+        def __init__(self, name):
+            self.name = name
+
+    files = [NamedFile(f"file_{'x' * i}.jpg") for i in range(12)]
+    recording_dts = [datetime.datetime(2025, 1, 1) + timedelta(hours=i)
+                     for i in range(12)]
+
+    handler = SlowHandler()
+    concurrent_returns = handler.handle_files(
+        files, recording_dts, [{} for x in files], "wildlifecamera")
+    handler.concurrent_handling = False
+    serial_returns = handler.handle_files(
+        files, recording_dts, [{} for x in files], "wildlifecamera")
+
+    assert concurrent_returns == serial_returns
+    assert [x[0] for x in concurrent_returns] == recording_dts
+    assert [x[1]["name_length"] for x in concurrent_returns] == [
+        len(x.name) for x in files]
+
+
+@pytest.mark.django_db
+def test_process_ingest_batch_failure(settings, monkeypatch):
+    """
+    Test: If a chunk of an ingest batch fails, are its staged files kept, and does processing again resume from it?
+    """
+    settings.INGEST_CHUNK_SIZE = 1
+    user = UserFactory()
+    deployment = DeploymentFactory(
+        owner=user, deployment_start=datetime.datetime(1066, 1, 1, 0, 0, 0))
+
+    files = []
+    for i in range(2):
+        temp = BytesIO()
+        create_image().save(temp, format="JPEG")
+        files.append(SimpleUploadedFile(
+            f"ingest_file_{i}.jpeg", temp.getvalue()))
+    ingest_batch = stage_ingest_batch(files, recording_dt=[datetime.datetime(1066, 1, 2, 0, 0, 0)],
+                                      deployment_object=deployment, request_user=user)
+    staged_paths = [x["staged_path"] for x in ingest_batch.manifest]
+
+    # Fail on the second chunk
+    create_file_objects = file_handling_functions.create_file_objects
+    n_calls = []
+
+    def failing_create_file_objects(*args, **kwargs):
+        n_calls.append(1)
+        if len(n_calls) == 2:
+            raise OSError("Storage unavailable")
+        return create_file_objects(*args, **kwargs)
+
+    monkeypatch.setattr(file_handling_functions,
+                        "create_file_objects", failing_create_file_objects)
+    process_ingest_batch(ingest_batch)
+    ingest_batch.refresh_from_db()
+    assert ingest_batch.status == IngestBatch.Status.FAILED
+    assert ingest_batch.n_processed == 1
+    assert len(ingest_batch.uploaded_files) == 1
+    assert not os.path.exists(staged_paths[0])
+    assert os.path.exists(staged_paths[1])
+
+    monkeypatch.setattr(file_handling_functions,
+                        "create_file_objects", create_file_objects)
+    process_ingest_batch(ingest_batch)
+    ingest_batch.refresh_from_db()
+    assert ingest_batch.status == IngestBatch.Status.COMPLETE
+    assert ingest_batch.status_code == 201
+    assert ingest_batch.n_processed == 2
+    assert len(ingest_batch.uploaded_files) == 2
+    assert not os.path.exists(ingest_batch.staging_path)
+
+    for data_file in DataFile.objects.filter(pk__in=ingest_batch.uploaded_files):
+        data_file.delete()
+
+
+def test_storage_staging_upload_handler():
+    """
+    Test: Are uploads streamed onto the storage filesystem and then moved into place, rather than copied?
+    """
+    chunks = [os.urandom(1024), os.urandom(512)]
+    upload_handler = StorageStagingUploadHandler()
+    upload_handler.new_file("files", "staged_file.jpg", "image/jpeg", None)
+    start = 0
+    for chunk in chunks:
+        upload_handler.receive_data_chunk(chunk, start)
+        start += len(chunk)
+    staged_file = upload_handler.file_complete(start)
+
+    assert isinstance(staged_file, StagedUploadedFile)
+    assert staged_file.size == 1536
+    assert staged_file.md5_checksum == hashlib.md5(b"".join(chunks)).hexdigest()
+    staged_path = staged_file.temporary_file_path()
+    assert os.path.dirname(staged_path) == os.path.join(
+        settings.FILE_STORAGE_ROOT, settings.UPLOAD_STAGING_PATH)
+    staged_inode = os.stat(staged_path).st_ino
+
+    file_path = os.path.join(
+        settings.FILE_STORAGE_ROOT, "test_staging", "staged_file.jpg")
+    handle_uploaded_file(staged_file, file_path)
+    staged_file.close()
+
+    # Renamed, so the file keeps its inode and the staged file is gone
+    assert not os.path.exists(staged_path)
+    assert os.stat(file_path).st_ino == staged_inode
+    with open(file_path, "rb") as f:
+        assert f.read() == b"".join(chunks)
+
+    os.remove(file_path)
+
+
+@pytest.mark.django_db
+def test_daily_file_stats_moved_file():
+    """
+    Test: When a file's recording date changes, is it counted in its new daily file statistics row only?
+    """
+    deployment = DeploymentFactory(deployment_start=datetime.datetime(2020, 1, 1, tzinfo=djtimezone.utc),
+                                   deployment_end=datetime.datetime(2020, 12, 31, tzinfo=djtimezone.utc))
+    data_file = DataFileFactory(deployment=deployment,
+                                recording_dt=datetime.datetime(2020, 6, 1, 12, tzinfo=djtimezone.utc))
+
+    def counted_dates():
+        return {str(x.date): x.n_files for x in DeploymentDailyFileStats.objects.filter(deployment=deployment)}
+
+    assert counted_dates() == {"2020-06-01": 1}
+
+    # Saving the file
+    data_file.recording_dt = datetime.datetime(
+        2020, 6, 2, 12, tzinfo=djtimezone.utc)
+    data_file.save()
+    assert counted_dates() == {"2020-06-02": 1}
+
+    # Correcting the recording datetime in a post upload task
+    def correct_recording_dt(file_obj):
+        file_obj.recording_dt = datetime.datetime(
+            2020, 6, 3, 12, tzinfo=djtimezone.utc)
+        return file_obj, ["recording_dt"]
+
+    post_upload_task_handler([data_file.pk], correct_recording_dt)
+    assert counted_dates() == {"2020-06-03": 1}
+
+    data_file.refresh_from_db()
+    data_file.delete()
+    assert counted_dates() == {}
+
+
+@pytest.mark.django_db
+def test_daily_file_stats_unchanged_file():
+    """
+    Test: Are daily file statistics only refreshed when a saved file changes a counted field?
+    """
+    deployment = DeploymentFactory(deployment_start=datetime.datetime(2020, 1, 1, tzinfo=djtimezone.utc),
+                                   deployment_end=datetime.datetime(2020, 12, 31, tzinfo=djtimezone.utc))
+    data_file = DataFileFactory(deployment=deployment, file_size=100,
+                                recording_dt=datetime.datetime(2020, 6, 1, 12, tzinfo=djtimezone.utc))
+    stats_row = DeploymentDailyFileStats.objects.get(deployment=deployment)
+
+    # Refreshing replaces the row, so an unchanged row was not refreshed
+    data_file.add_favourite(UserFactory())
+    data_file.tag = "new_tag"
+    data_file.save()
+    assert DeploymentDailyFileStats.objects.get(deployment=deployment).pk == stats_row.pk
+
+    data_file.file_size = 150
+    data_file.save()
+    assert DeploymentDailyFileStats.objects.get(deployment=deployment).file_volume == 150
+
+    data_file.delete()
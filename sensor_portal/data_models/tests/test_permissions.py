@@ -8,7 +8,7 @@ import pytest
 from data_models.factories import (DataFileFactory, DeploymentFactory,
                                    DeviceFactory, ProjectFactory, SiteFactory)
 from data_models.general_functions import create_image
-from data_models.models import DataFile, Deployment
+from data_models.models import DataFile, Deployment, DeploymentAccess
 from data_models.serializers import DeploymentSerializer
 from user_management.factories import UserFactory
 from utils.perm_functions import remove_user_permissions
@@ -434,3 +434,41 @@ def test_device_manager_upload_files(api_client_with_credentials):
         object_url, format="json")
     print(f"Response: {response_delete_success}")
     assert response_delete_success.status_code == 204
+
+
+@pytest.mark.django_db
+def test_deployment_access_follows_permissions(api_client_with_credentials):
+    """
+    Test: The deployment access table follows changes to a deployment's viewers, and from project permissions.
+    """
+    user = api_client_with_credentials.handler._force_user
+    data_file_object = DataFileFactory()
+    deployment = data_file_object.deployment
+
+    object_url = f'/api/datafile/{data_file_object.pk}/'
+
+    deployment.viewers.add(user)
+    assert DeploymentAccess.objects.filter(
+        user=user, deployment=deployment, role=DeploymentAccess.Role.VIEWER).exists()
+
+    # Removed from the other side of the relationship
+    user.viewable_deployments.remove(deployment)
+    assert not DeploymentAccess.objects.filter(
+        user=user, deployment=deployment).exists()
+    response = api_client_with_credentials.get(object_url, format="json")
+    assert response.status_code == 404
+
+    # Permissions cascaded from a project
+    project = ProjectFactory()
+    project.viewers.add(user)
+    deployment.project.add(project)
+    assert DeploymentAccess.objects.filter(
+        user=user, deployment=deployment, role=DeploymentAccess.Role.VIEWER).exists()
+    response = api_client_with_credentials.get(object_url, format="json")
+    assert response.status_code == 200
+
+    deployment.viewers.clear()
+    assert not DeploymentAccess.objects.filter(
+        deployment=deployment, role=DeploymentAccess.Role.VIEWER).exists()
+
+    data_file_object.delete()
@@ -0,0 +1,70 @@
+import hashlib
+import logging
+import os
+import tempfile
+from typing import Optional
+
+from django.conf import settings
+from django.core.files.uploadedfile import (TemporaryUploadedFile,
+                                            UploadedFile)
+from django.core.files.uploadhandler import FileUploadHandler
+
+logger = logging.getLogger(__name__)
+
+
+def get_upload_staging_dir() -> str:
+    """
+    Get the directory into which uploads are streamed, creating it if necessary.
+
+    Returns:
+        str: Path of the upload staging directory.
+    """
+    staging_dir = os.path.join(
+        settings.FILE_STORAGE_ROOT, settings.UPLOAD_STAGING_PATH)
+    os.makedirs(staging_dir, exist_ok=True)
+    return staging_dir
+
+
+class StagedUploadedFile(TemporaryUploadedFile):
+    """
+    Uploaded file streamed to a temporary file on the same filesystem as FILE_STORAGE_ROOT,
+    so that it can be moved into place with a rename rather than copied.
+    """
+
+    def __init__(self, name: str, content_type: str, size: int, charset: Optional[str],
+                 content_type_extra: Optional[dict] = None) -> None:
+        _, ext = os.path.splitext(name)
+        file = tempfile.NamedTemporaryFile(
+            suffix=".upload" + ext, dir=get_upload_staging_dir())
+        # Skip TemporaryUploadedFile.__init__, which would create the file in FILE_UPLOAD_TEMP_DIR
+        UploadedFile.__init__(self, file, name, content_type,
+                              size, charset, content_type_extra)
+        self.md5_checksum = None
+
+
+class StorageStagingUploadHandler(FileUploadHandler):
+    """
+    Upload handler which writes files straight into the upload staging directory,
+    recording their size and MD5 checksum as the data arrives.
+    """
+
+    def new_file(self, *args, **kwargs) -> None:
+        super().new_file(*args, **kwargs)
+        self.file = StagedUploadedFile(
+            self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hash_md5 = hashlib.md5()
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> None:
+        self.file.write(raw_data)
+        self.hash_md5.update(raw_data)
+
+    def file_complete(self, file_size: int) -> StagedUploadedFile:
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.md5_checksum = self.hash_md5.hexdigest()
+        return self.file
+
+    def upload_interrupted(self) -> None:
+        if hasattr(self, "file"):
+            # Closing the temporary file also deletes it
+            self.file.close()
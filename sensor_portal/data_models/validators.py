@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 if TYPE_CHECKING:
     from .models import DataType, Deployment, Device, DeviceModel
@@ -28,6 +28,34 @@ def data_file_in_deployment(recording_dt: datetime, deployment: "Deployment") ->
     return False, error_message
 
 
+def data_files_in_deployments(recording_dts: List[datetime], deployments: List["Deployment"]) -> List[Tuple[bool, dict]]:
+    """
+    Check if dates fall within their deployments' date ranges, checking each deployment once.
+
+    Args:
+        recording_dts (List[datetime]): Recording date times to check
+        deployments (List[Deployment]): Deployment object to check for each recording date time
+
+    Returns:
+        List of success (boolean), error message (dict where the key is the associated field name),
+        in the same format as data_file_in_deployment.
+    """
+    results = [(True, "")] * len(recording_dts)
+    deployment_idxs = {}
+    for idx, deployment in enumerate(deployments):
+        deployment_idxs.setdefault(id(deployment), []).append(idx)
+
+    for idxs in deployment_idxs.values():
+        deployment = deployments[idxs[0]]
+        valid_recording_dt_list = deployment.check_dates(
+            [recording_dts[idx] for idx in idxs])
+        for idx, valid in zip(idxs, valid_recording_dt_list):
+            if not valid:
+                results[idx] = data_file_in_deployment(
+                    recording_dts[idx], deployment)
+    return results
+
+
 def deployment_start_time_after_end_time(start_dt: datetime, end_dt: Optional[datetime] = None) -> tuple[bool, dict]:
     """
     Check if end time is after start time
@@ -1,11 +1,13 @@
 
 import logging
+import re
 
 from camtrap_dp_export.querysets import (get_ctdp_deployment_qs,
                                          get_ctdp_media_qs)
 from camtrap_dp_export.serializers import (DataFileSerializerCTDP,
                                            DeploymentSerializerCTDP)
 from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler
 from django.db import connection, transaction
 from django.utils.decorators import method_decorator
 from django.views.decorators.cache import cache_page
@@ -18,37 +20,48 @@ from observation_editor.serializers import ObservationSerializer
 from rest_framework import parsers, serializers, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.filters import SearchFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_gis import filters as filters_gis
 from utils.viewsets import (AddOwnerViewSetMixIn, CheckAttachmentViewSetMixIn,
-                            CheckFormViewSetMixIn,
+                            CheckFormViewSetMixIn, ConditionalGetViewSetMixIn,
+                            ExportViewSetMixIn,
+                            KeysetPaginationViewSetMixIn,
                             OptionalPaginationViewSetMixIn)
 
-from .file_handling_functions import create_file_objects
-from .filtersets import (DataFileFilter, DataTypeFilter, DeploymentFilter,
-                         DeviceFilter, DeviceModelFilter, ProjectFilter)
-from .job_handling_functions import start_job_from_name
-from .models import (DataFile, DataType, Deployment, Device, DeviceModel,
-                     Project, Site)
+from .count_cache_functions import cached_file_count, get_count_scope
+from .file_handling_functions import create_file_objects, stage_ingest_batch
+from .filtersets import (DataFileFilter, DataFileSearchFilter, DataTypeFilter,
+                         DeploymentFilter, DeviceFilter, DeviceModelFilter,
+                         ProjectFilter)
+from .job_handling_functions import (start_job_from_name,
+                                     start_job_from_queryset)
+from .name_index_functions import OriginalNameIndex
+from .models import (DataFile, DataType, Deployment, DeploymentDailyFileStats,
+                     Device, DeviceModel, IngestBatch, Project, Site)
 from .permissions import perms
 from .plotting_functions import get_all_file_metric_dicts
 from .serializers import (DataFileCheckSerializer, DataFileSerializer,
                           DataFileUploadSerializer, DataTypeSerializer,
                           DeploymentSerializer, DeploymentSerializer_GeoJSON,
                           DeviceModelSerializer, DeviceSerializer,
-                          GenericJobSerializer, ProjectSerializer,
-                          SiteSerializer)
+                          GenericJobSerializer, MetricParamsSerializer,
+                          ProjectSerializer, SiteSerializer)
 from .serializers_fake import (DummyDataFileSerializer,
                                DummyDataFileUploadSerializer,
                                DummyDeploymentSerializer,
                                DummyDeviceSerializer, ctdp_parameter,
-                               geoJSON_parameter, inline_count_serializer,
+                               export_format_parameter, geoJSON_parameter,
+                               inline_count_serializer,
                                inline_id_serializer,
                                inline_id_serializer_optional,
                                inline_job_start_serializer,
                                inline_metric_serialiser,
-                               inline_upload_response_serializer)
+                               inline_upload_response_serializer,
+                               metric_parameters)
+from .tasks import ingest_batch_task
+from .upload_handlers import StorageStagingUploadHandler
 
 logger = logging.getLogger(__name__)
 
@@ -115,6 +128,7 @@ logger = logging.getLogger(__name__)
                                                      description="Database ID of device from which to get deployments.")]),
     metrics=extend_schema(summary="Metrics",
                           description="Get metrics of specific object.",
+                          parameters=metric_parameters,
                           responses=inline_metric_serialiser
                           ),
     ids_count=extend_schema(summary="Count selected IDs",
@@ -127,6 +141,12 @@ logger = logging.getLogger(__name__)
                             filters=True,
                             request=inline_id_serializer_optional,
                             responses=inline_job_start_serializer),
+    export=extend_schema(summary="Export filtered deployments",
+                         description="Stream filtered deployments as CSV or NDJSON.",
+                         filters=True,
+                         parameters=[export_format_parameter],
+                         responses={(200, "text/csv"): OpenApiTypes.STR,
+                                    (200, "application/x-ndjson"): OpenApiTypes.STR}),
     project_queryset_count=extend_schema(summary="Count filtered deployments",
                                          filters=True,
                                          responses=inline_count_serializer,
@@ -163,7 +183,8 @@ logger = logging.getLogger(__name__)
                                        description="Database ID of device from which to get deployments.")])
 
 )
-class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, CheckFormViewSetMixIn, OptionalPaginationViewSetMixIn):
+class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, CheckFormViewSetMixIn, ExportViewSetMixIn,
+                        ConditionalGetViewSetMixIn, OptionalPaginationViewSetMixIn):
     """
     API endpoint for managing Deployment objects.
 
@@ -176,12 +197,14 @@ class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Check
         - Count deployments and start jobs on filtered sets.
         - Retrieve metrics for a deployment.
         - Enforces permission checks for project and device attachment.
+        - Answer conditional list, retrieve and metrics requests with 304 Not Modified.
 
     Custom Actions:
         - ids_count: Count deployments by list of IDs.
         - queryset_count: Count deployments in filtered queryset.
         - start_job: Start a job for deployments.
         - metrics: Get deployment metrics.
+        - export: Stream filtered deployments as CSV or NDJSON.
         - project/device-specific list, count, and job actions.
     """
 
@@ -193,6 +216,12 @@ class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Check
     filterset_class = DeploymentFilter
     filter_backends = viewsets.ModelViewSet.filter_backends + \
         [filters_gis.InBBoxFilter]
+    export_fields = ['id', 'deployment_device_ID', 'deployment_ID', 'device_type__name',
+                     'device__device_ID', 'site__name', 'deployment_start', 'deployment_end',
+                     'latitude', 'longitude', 'is_active', 'time_zone']
+    # Related objects serialized with deployments
+    validator_related_fields = ['device__modified_on', 'device__model__modified_on',
+                                'device_type__modified_on', 'site__modified_on', 'project__modified_on']
 
     def get_queryset(self):
         qs = Deployment.objects.all().distinct()
@@ -239,14 +268,17 @@ class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Check
 
         user_pk = request.user.pk
 
-        if not (obj_pks := request.data.get("ids")):
-            obj_pks = list(queryset.values_list('pk', flat=True))
-        else:
+        obj_pks = request.data.get("ids")
+        if "ids" in request.data:
             request.data.pop("ids")
 
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "deployment", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "deployment", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "deployment", queryset, job_args, user_pk)
 
         return Response({"detail": detail}, status=job_status)
 
@@ -254,12 +286,22 @@ class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Check
     def metrics(self, request, pk=None):
         deployment = self.get_object()
         user = request.user
-        data_files = perms['data_models.view_datafile'].filter(
-            user, deployment.files.all())
-        if not data_files.exists():
-            return Response({}, status=status.HTTP_200_OK)
-        file_metric_dicts = get_all_file_metric_dicts(data_files)
-        return Response(file_metric_dicts, status=status.HTTP_200_OK)
+        param_serializer = MetricParamsSerializer(data=request.query_params)
+        if not param_serializer.is_valid():
+            return Response({"detail": param_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        file_stats = DeploymentDailyFileStats.visible_to(
+            user, Deployment.objects.filter(pk=deployment.pk))
+
+        def get_response():
+            if not file_stats.exists():
+                return Response({}, status=status.HTTP_200_OK)
+            data_files = perms['data_models.view_datafile'].filter(
+                user, deployment.files.all())
+            file_metric_dicts = get_all_file_metric_dicts(
+                data_files, file_stats=file_stats, **param_serializer.validated_data)
+            return Response(file_metric_dicts, status=status.HTTP_200_OK)
+        # Files and reports of the deployment are counted in its daily file stats, so only these need checking
+        return self.validate_queryset(file_stats, get_response)
 
     @action(detail=False, methods=['get'], url_path=r'project/(?P<project_id>\w+)', url_name="project_deployments")
     def project_deployments(self, request, project_id=None):
@@ -302,14 +344,17 @@ class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Check
 
         user_pk = request.user.pk
 
-        if not (obj_pks := request.data.get("ids")):
-            obj_pks = list(queryset.values_list('pk', flat=True))
-        else:
+        obj_pks = request.data.get("ids")
+        if "ids" in request.data:
             request.data.pop("ids")
 
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "deployment", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "deployment", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "deployment", queryset, job_args, user_pk)
 
         return Response({"detail": detail}, status=job_status)
 
@@ -356,14 +401,17 @@ class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Check
 
         user_pk = request.user.pk
 
-        if not (obj_pks := request.data.get("ids")):
-            obj_pks = list(queryset.values_list('pk', flat=True))
-        else:
+        obj_pks = request.data.get("ids")
+        if "ids" in request.data:
             request.data.pop("ids")
 
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "deployment", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "deployment", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "deployment", queryset, job_args, user_pk)
 
         return Response({"detail": detail}, status=job_status)
 
@@ -407,6 +455,7 @@ class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Check
                                       description="Database ID of project to delete.")]),
     metrics=extend_schema(summary="Metrics",
                           description="Get metrics of specific object.",
+                          parameters=metric_parameters,
                           responses=inline_metric_serialiser
                           ),
     ids_count=extend_schema(summary="Count selected IDs",
@@ -425,7 +474,7 @@ class DeploymentViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Check
                             request=inline_id_serializer_optional,
                             responses=inline_job_start_serializer),
 )
-class ProjectViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
+class ProjectViewSet(AddOwnerViewSetMixIn, ConditionalGetViewSetMixIn, OptionalPaginationViewSetMixIn):
     """
     API endpoint for managing Project objects.
 
@@ -438,6 +487,7 @@ class ProjectViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
         - Start jobs for selected projects.
         - List unique species found in a project's data files.
         - Retrieve file metrics for a project.
+        - Answer conditional list, retrieve and metrics requests with 304 Not Modified.
 
     Custom Actions:
         - ids_count, queryset_count, start_job: For bulk operations.
@@ -468,14 +518,17 @@ class ProjectViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
 
         user_pk = request.user.pk
 
-        if not (obj_pks := request.data.get("ids")):
-            obj_pks = list(queryset.values_list('pk', flat=True))
-        else:
+        obj_pks = request.data.get("ids")
+        if "ids" in request.data:
             request.data.pop("ids")
 
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "project", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "project", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "project", queryset, job_args, user_pk)
 
         return Response({"detail": detail}, status=job_status)
 
@@ -496,12 +549,21 @@ class ProjectViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
     def metrics(self, request, pk=None):
         project = self.get_object()
         user = request.user
-        data_files = perms['data_models.view_datafile'].filter(
-            user, DataFile.objects.filter(deployment__project=project))
-        if not data_files.exists():
-            return Response({}, status=status.HTTP_200_OK)
-        file_metric_dicts = get_all_file_metric_dicts(data_files, False)
-        return Response(file_metric_dicts, status=status.HTTP_200_OK)
+        param_serializer = MetricParamsSerializer(data=request.query_params)
+        if not param_serializer.is_valid():
+            return Response({"detail": param_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        file_stats = DeploymentDailyFileStats.visible_to(
+            user, Deployment.objects.filter(project=project))
+
+        def get_response():
+            if not file_stats.exists():
+                return Response({}, status=status.HTTP_200_OK)
+            data_files = perms['data_models.view_datafile'].filter(
+                user, DataFile.objects.filter(deployment__project=project))
+            file_metric_dicts = get_all_file_metric_dicts(
+                data_files, False, file_stats=file_stats, **param_serializer.validated_data)
+            return Response(file_metric_dicts, status=status.HTTP_200_OK)
+        return self.validate_queryset(file_stats, get_response)
 
 
 @extend_schema(summary="Devices",
@@ -545,6 +607,7 @@ class ProjectViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
                                       description="Database ID of device to delete.")]),
     metrics=extend_schema(summary="Metrics",
                           description="Get metrics of specific object.",
+                          parameters=metric_parameters,
                           responses=inline_metric_serialiser
                           ),
     ids_count=extend_schema(summary="Count selected IDs",
@@ -559,7 +622,7 @@ class ProjectViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
                             responses=inline_job_start_serializer)
 
 )
-class DeviceViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
+class DeviceViewSet(AddOwnerViewSetMixIn, ConditionalGetViewSetMixIn, OptionalPaginationViewSetMixIn):
     """
     API endpoint for managing Device objects.
 
@@ -570,6 +633,7 @@ class DeviceViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
         - List, retrieve, and manage devices.
         - Bulk count and job execution for device sets.
         - Retrieve metrics for individual devices.
+        - Answer conditional list, retrieve and metrics requests with 304 Not Modified.
 
     Custom Actions:
         - ids_count, queryset_count, start_job: Bulk operations.
@@ -580,6 +644,8 @@ class DeviceViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
     queryset = Device.objects.all().distinct()
     filterset_class = DeviceFilter
     search_fields = ['device_ID', 'name', 'model__name']
+    # Related objects serialized with devices
+    validator_related_fields = ['model__modified_on', 'type__modified_on']
 
     @action(detail=False, methods=['post'])
     def ids_count(self, request, *args, **kwargs):
@@ -598,14 +664,17 @@ class DeviceViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
 
         user_pk = request.user.pk
 
-        if not (obj_pks := request.data.get("ids")):
-            obj_pks = list(queryset.values_list('pk', flat=True))
-        else:
+        obj_pks = request.data.get("ids")
+        if "ids" in request.data:
             request.data.pop("ids")
 
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "device", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "device", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "device", queryset, job_args, user_pk)
 
         return Response({"detail": detail}, status=job_status)
 
@@ -613,12 +682,21 @@ class DeviceViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
     def metrics(self, request, pk=None):
         device = self.get_object()
         user = request.user
-        data_files = perms['data_models.view_datafile'].filter(
-            user, DataFile.objects.filter(deployment__device=device))
-        if not data_files.exists():
-            return Response({}, status=status.HTTP_200_OK)
-        file_metric_dicts = get_all_file_metric_dicts(data_files)
-        return Response(file_metric_dicts, status=status.HTTP_200_OK)
+        param_serializer = MetricParamsSerializer(data=request.query_params)
+        if not param_serializer.is_valid():
+            return Response({"detail": param_serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        file_stats = DeploymentDailyFileStats.visible_to(
+            user, Deployment.objects.filter(device=device))
+
+        def get_response():
+            if not file_stats.exists():
+                return Response({}, status=status.HTTP_200_OK)
+            data_files = perms['data_models.view_datafile'].filter(
+                user, DataFile.objects.filter(deployment__device=device))
+            file_metric_dicts = get_all_file_metric_dicts(
+                data_files, file_stats=file_stats, **param_serializer.validated_data)
+            return Response(file_metric_dicts, status=status.HTTP_200_OK)
+        return self.validate_queryset(file_stats, get_response)
 
 
 @extend_schema(summary="Data files",
@@ -670,6 +748,12 @@ class DeviceViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
                             filters=True,
                             request=inline_id_serializer_optional,
                             responses=inline_job_start_serializer),
+    export=extend_schema(summary="Export filtered datafiles",
+                         description="Stream filtered datafiles as CSV or NDJSON.",
+                         filters=True,
+                         parameters=[export_format_parameter],
+                         responses={(200, "text/csv"): OpenApiTypes.STR,
+                                    (200, "application/x-ndjson"): OpenApiTypes.STR}),
     check_existing=extend_schema(summary="Check a list of filenames for files already in the database",
                                  filters=True,
                                  request=DataFileCheckSerializer,
@@ -718,6 +802,15 @@ class DeviceViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
                                        parameters=[
                                            ctdp_parameter,
                                        ]),
+    ingest_status=extend_schema(summary="Status of an asynchronous upload",
+                                description="Get the status and results of an asynchronous upload.",
+                                filters=False,
+                                parameters=[
+                                    OpenApiParameter(
+                                        "ingest_batch_pk",
+                                        OpenApiTypes.INT,
+                                        OpenApiParameter.PATH,
+                                        description="Database ID of ingest batch returned when uploading.")]),
     favourite_file=extend_schema(exclude=True),
     observations=extend_schema(exclude=True),
     deployment_datafiles_queryset_count=extend_schema(
@@ -815,7 +908,8 @@ class DeviceViewSet(AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
         responses=inline_job_start_serializer,
     ),
 )
-class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixIn):
+class DataFileViewSet(CheckAttachmentViewSetMixIn, ExportViewSetMixIn, KeysetPaginationViewSetMixIn,
+                      OptionalPaginationViewSetMixIn):
     """
     API endpoint for managing DataFile objects.
 
@@ -830,10 +924,13 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
         - Retrieve associated observations.
         - Bulk operations (count, start jobs) on filtered/queryset results.
         - Project, deployment, and device-specific filtering.
+        - Keyset pagination with 'pagination=cursor', ordered by recording datetime by default.
 
     Custom Actions:
         - check_existing: Check which files already exist.
+        - ingest_status: Get the results of an asynchronous upload.
         - ids_count, queryset_count, start_job: Bulk operations.
+        - export: Stream filtered files as CSV or NDJSON.
         - observations: List observations for a datafile.
         - favourite_file: Toggle favorite status.
         - deployment_datafiles, project_datafiles, device_datafiles: Scoped file queries.
@@ -841,11 +938,35 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
     """
     http_method_names = ['get', 'patch', 'delete', 'post', 'head']
     filterset_class = DataFileFilter
-
-    search_fields = ['=tag',
-                     'file_name',
-                     'observations__taxon__species_name',
-                     'observations__taxon__species_common_name']
+    keyset_ordering = ['-recording_dt']
+    export_fields = ['id', 'file_name', 'file_format', 'original_name', 'deployment__deployment_device_ID',
+                     'file_type__name', 'recording_dt', 'upload_dt', 'file_size', 'local_storage',
+                     'archived', 'tag', 'has_human', 'file_url', 'md5_checksum']
+
+    # Search terms are matched against the search document of each file, combining file name,
+    # tag and observed taxon names, see DataFileSearchFilter
+    search_fields = ['search_text']
+    filter_backends = [DataFileSearchFilter if x is SearchFilter else x
+                       for x in viewsets.ModelViewSet.filter_backends]
+
+    # Actions returning DataFiles serialized with DataFileSerializer
+    serialized_actions = ['list', 'retrieve', 'deployment_datafiles', 'project_datafiles',
+                          'device_datafiles', 'user_favourite_datafiles', 'favourited_datafiles']
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action in self.serialized_actions:
+            # Work out the favourite flag in the same query rather than once per file
+            queryset = queryset.annotate_favourite(self.request.user)
+        return queryset
+
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        if self.action == 'create':
+            # Stream uploads larger than FILE_UPLOAD_MAX_MEMORY_SIZE directly onto the storage filesystem
+            request.upload_handlers = [MemoryFileUploadHandler(request),
+                                       StorageStagingUploadHandler(request)]
+        return drf_request
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -880,17 +1001,21 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
             queryset = queryfilter.qs
 
         if (original_names := serializer.validated_data.get('original_names')):
-            existing_names = queryset.filter(
-                original_name__in=original_names).values_list('original_name', flat=True)
-            existing_names = list(existing_names)
+            # If filtered to a single device, only names in its index need to be checked in the database
+            if filter_params and (device := queryfilter.form.cleaned_data.get('deployment__device')):
+                existing_names = OriginalNameIndex(
+                    device.pk).existing_names(original_names, queryset)
+            else:
+                existing_names = set(queryset.filter(
+                    original_name__in=original_names).values_list('original_name', flat=True))
             missing_names = [
                 x for x in original_names if x not in existing_names]
 
         elif (file_names := serializer.validated_data.get('file_names')):
-            existing_names = queryset.filter(
-                file_name__in=file_names).values_list('file_name', flat=True)
+            existing_names = set(queryset.filter(
+                file_name__in=file_names).values_list('file_name', flat=True))
             missing_names = [
-                x for x in original_names if x not in existing_names]
+                x for x in file_names if x not in existing_names]
         else:
             return Response({"detail": "Either 'original_names' or 'file_names' must be provided."},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -905,7 +1030,9 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
     @action(detail=False, methods=['get'])
     def queryset_count(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
-        return Response(queryset.file_count(), status=status.HTTP_200_OK)
+        file_count = cached_file_count(
+            request, "queryset_count", get_count_scope(request.query_params), queryset.file_count)
+        return Response(file_count, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path=r'start_job/(?P<job_name>\w+)')
     def start_job(self, request, job_name, *args, **kwargs):
@@ -914,14 +1041,17 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
 
         user_pk = request.user.pk
 
-        if not (obj_pks := request.data.get("ids")):
-            obj_pks = list(queryset.values_list('pk', flat=True))
-        else:
+        obj_pks = request.data.get("ids")
+        if "ids" in request.data:
             request.data.pop("ids")
 
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "datafile", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "datafile", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "datafile", queryset, job_args, user_pk)
 
         return Response({"detail": detail}, status=job_status)
 
@@ -980,15 +1110,36 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
         device_object = instance.get('device_object')
         data_types = instance.get('data_types')
         check_filename = instance.get('check_filename')
+        deduplicate = instance.get('deduplicate')
 
         multipart = 'HTTP_CONTENT_RANGE' in request.META
+        multipart_start = None
+        if multipart:
+            # Content-Range: bytes <start>-<end>/<total>
+            content_range_match = re.match(
+                r'bytes (\d+)-\d+/', request.META['HTTP_CONTENT_RANGE'])
+            if content_range_match:
+                multipart_start = int(content_range_match.group(1))
+
+        if instance.get('asynchronous'):
+            if multipart:
+                return Response({"detail": "Multipart uploads cannot be ingested asynchronously."},
+                                status=status.HTTP_400_BAD_REQUEST)
+            ingest_batch = stage_ingest_batch(
+                files, check_filename, recording_dt, extra_data, deployment_object, device_object,
+                data_types, self.request.user, deduplicate=deduplicate)
+            ingest_batch_task.apply_async([ingest_batch.pk])
+            logger.info(f"Staged {len(files)} files in {ingest_batch}")
+            return Response({"ingest_batch": ingest_batch.pk, "status": ingest_batch.status},
+                            status=status.HTTP_202_ACCEPTED, headers=headers)
 
         with transaction.atomic(), connection.cursor() as cursor:
             # Remove db limits during this function.
             cursor.execute('SET LOCAL statement_timeout TO 0;')
             uploaded_files, invalid_files, existing_files, status_code = create_file_objects(
                 files, check_filename, recording_dt, extra_data, deployment_object, device_object,
-                data_types, self.request.user, multipart)
+                data_types, self.request.user, multipart, multipart_start=multipart_start,
+                deduplicate=deduplicate)
 
         logger.info(
             f"Uploaded files: {uploaded_files}, Invalid files: {invalid_files}, Existing files: {existing_files}, Status code: {status_code}")
@@ -1001,6 +1152,24 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
         return Response({"uploaded_files": uploaded_files, "invalid_files": invalid_files, "existing_files": existing_files},
                         status=status_code, headers=headers)
 
+    @action(detail=False, methods=['get'], url_path=r'ingest/(?P<ingest_batch_pk>\w+)', pagination_class=None)
+    def ingest_status(self, request, ingest_batch_pk=None):
+        ingest_batch = IngestBatch.objects.filter(pk=ingest_batch_pk).first()
+        if ingest_batch is None or \
+                (ingest_batch.owner != request.user and not request.user.is_superuser):
+            return Response({"detail": "Ingest batch not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        uploaded_files = DataFileSerializer(
+            DataFile.objects.filter(pk__in=ingest_batch.uploaded_files), many=True,
+            context={'request': request}).data
+
+        return Response({"status": ingest_batch.status,
+                         "status_code": ingest_batch.status_code,
+                         "uploaded_files": uploaded_files,
+                         "invalid_files": ingest_batch.invalid_files,
+                         "existing_files": ingest_batch.existing_files},
+                        status=status.HTTP_200_OK)
+
     # --- Deployment DataFiles ---
 
     @action(detail=False, methods=['get'], url_path=r'deployment/(?P<deployment_pk>\w+)', url_name="deployment_datafiles")
@@ -1030,20 +1199,25 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
     def deployment_datafiles_queryset_count(self, request, deployment_pk=None):
         queryset = self.filter_queryset(
             DataFile.objects.filter(deployment__pk=deployment_pk))
-        return Response(queryset.file_count(), status=status.HTTP_200_OK)
+        file_count = cached_file_count(request, f"deployment_queryset_count:{deployment_pk}",
+                                       f"deployment:{deployment_pk}", queryset.file_count)
+        return Response(file_count, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path=r'deployment/(?P<deployment_pk>\w+)/start_job/(?P<job_name>\w+)')
     def deployment_datafiles_start_job(self, request, deployment_pk=None, job_name=None):
         queryset = self.filter_queryset(
             DataFile.objects.filter(deployment__pk=deployment_pk))
         user_pk = request.user.pk
-        obj_pks = request.data.get("ids") or list(
-            queryset.values_list('pk', flat=True))
+        obj_pks = request.data.get("ids")
         if "ids" in request.data:
             request.data.pop("ids")
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "datafile", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "datafile", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "datafile", queryset, job_args, user_pk)
         return Response({"detail": detail}, status=job_status)
 
     # --- Project DataFiles ---
@@ -1076,20 +1250,25 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
     def project_datafiles_queryset_count(self, request, project_id=None):
         queryset = self.filter_queryset(
             DataFile.objects.filter(project__pk=project_id))
-        return Response(queryset.file_count(), status=status.HTTP_200_OK)
+        file_count = cached_file_count(request, f"project_queryset_count:{project_id}",
+                                       f"project:{project_id}", queryset.file_count)
+        return Response(file_count, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path=r'project/(?P<project_id>\w+)/start_job/(?P<job_name>\w+)')
     def project_datafiles_start_job(self, request, project_id=None, job_name=None):
         queryset = self.filter_queryset(
             DataFile.objects.filter(project__pk=project_id))
         user_pk = request.user.pk
-        obj_pks = request.data.get("ids") or list(
-            queryset.values_list('pk', flat=True))
+        obj_pks = request.data.get("ids")
         if "ids" in request.data:
             request.data.pop("ids")
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "datafile", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "datafile", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "datafile", queryset, job_args, user_pk)
         return Response({"detail": detail}, status=job_status)
 
     # --- Device DataFiles ---
@@ -1123,20 +1302,25 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
     def device_datafiles_queryset_count(self, request, device_id=None):
         queryset = self.filter_queryset(
             DataFile.objects.filter(device__pk=device_id))
-        return Response(queryset.file_count(), status=status.HTTP_200_OK)
+        file_count = cached_file_count(request, f"device_queryset_count:{device_id}",
+                                       f"device:{device_id}", queryset.file_count)
+        return Response(file_count, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path=r'device/(?P<device_id>\w+)/start_job/(?P<job_name>\w+)')
     def device_datafiles_start_job(self, request, device_id=None, job_name=None):
         queryset = self.filter_queryset(
             DataFile.objects.filter(device__pk=device_id))
         user_pk = request.user.pk
-        obj_pks = request.data.get("ids") or list(
-            queryset.values_list('pk', flat=True))
+        obj_pks = request.data.get("ids")
         if "ids" in request.data:
             request.data.pop("ids")
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "datafile", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "datafile", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "datafile", queryset, job_args, user_pk)
         return Response({"detail": detail}, status=job_status)
 
     # --- User Favourite DataFiles ---
@@ -1171,21 +1355,26 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
     @action(detail=False, methods=['get'], url_path='user_favourite/queryset_count')
     def user_favourite_datafiles_queryset_count(self, request):
         queryset = self.filter_queryset(
-            DataFile.objects.filter(favourites=request.user))
-        return Response(queryset.file_count(), status=status.HTTP_200_OK)
+            DataFile.objects.filter(favourite_of=request.user))
+        file_count = cached_file_count(
+            request, "user_favourite_queryset_count", f"favourite:{request.user.pk}", queryset.file_count)
+        return Response(file_count, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path='user_favourite/start_job/(?P<job_name>\w+)')
     def user_favourite_datafiles_start_job(self, request, job_name=None):
         queryset = self.filter_queryset(
-            DataFile.objects.filter(favourites=request.user))
+            DataFile.objects.filter(favourite_of=request.user))
         user_pk = request.user.pk
-        obj_pks = request.data.get("ids") or list(
-            queryset.values_list('pk', flat=True))
+        obj_pks = request.data.get("ids")
         if "ids" in request.data:
             request.data.pop("ids")
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "datafile", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "datafile", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "datafile", queryset, job_args, user_pk)
         return Response({"detail": detail}, status=job_status)
 
     # --- Favourited DataFiles (by any user) ---
@@ -1222,21 +1411,26 @@ class DataFileViewSet(CheckAttachmentViewSetMixIn, OptionalPaginationViewSetMixI
     @action(detail=False, methods=['get'], url_path='favourited/queryset_count')
     def favourited_datafiles_queryset_count(self, request):
         queryset = self.filter_queryset(
-            DataFile.objects.filter(favourites__isnull=False).distinct())
-        return Response(queryset.file_count(), status=status.HTTP_200_OK)
+            DataFile.objects.filter(favourite_of__isnull=False).distinct())
+        file_count = cached_file_count(
+            request, "favourited_queryset_count", "favourite", queryset.file_count)
+        return Response(file_count, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['post'], url_path='favourited/start_job/(?P<job_name>\w+)')
     def favourited_datafiles_start_job(self, request, job_name=None):
         queryset = self.filter_queryset(
-            DataFile.objects.filter(favourites__isnull=False).distinct())
+            DataFile.objects.filter(favourite_of__isnull=False).distinct())
         user_pk = request.user.pk
-        obj_pks = request.data.get("ids") or list(
-            queryset.values_list('pk', flat=True))
+        obj_pks = request.data.get("ids")
         if "ids" in request.data:
             request.data.pop("ids")
         job_args = request.data
-        success, detail, job_status = start_job_from_name(
-            job_name, "datafile", obj_pks, job_args, user_pk)
+        if obj_pks:
+            success, detail, job_status = start_job_from_name(
+                job_name, "datafile", obj_pks, job_args, user_pk)
+        else:
+            success, detail, job_status = start_job_from_queryset(
+                job_name, "datafile", queryset, job_args, user_pk)
         return Response({"detail": detail}, status=job_status)
 
 
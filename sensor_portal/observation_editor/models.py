@@ -1,12 +1,15 @@
 import logging
 
 from data_models.models import DataFile
+from data_models.search_functions import (update_search_documents,
+                                          update_search_documents_pks)
 from django.conf import settings
 from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
 from django.db.models import Case, F, Min, Q, Value, When
 from django.db.models.functions import Upper
-from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.dispatch import receiver
 from requests.exceptions import ConnectionError, ConnectTimeout
 from utils.models import BaseModel
@@ -151,8 +154,11 @@ class Taxon(BaseModel):
             if existing != self:
                 if self.pk is not None:
                     # get all existing observations and change them, then delete this instance
+                    data_file_pks = list(DataFile.objects.filter(
+                        observations__taxon=self).values_list('pk', flat=True))
                     Observation.objects.filter(
                         taxon=self).update(taxon=existing)
+                    update_search_documents_pks(data_file_pks)
                     self.delete()
                     return
         except Taxon.DoesNotExist:
@@ -169,6 +175,16 @@ def post_taxon_save(sender, instance, created, **kwargs):
         create_taxon_parents.apply_async([instance.pk])
 
 
+@receiver(post_save, sender=Taxon)
+def update_taxon_search_documents(sender, instance, created, **kwargs):
+    """
+    Signal handler to update the search documents of data files observed with this taxon, as its names may have changed.
+    """
+    if not created:
+        update_search_documents(
+            DataFile.objects.filter(observations__taxon=instance).distinct())
+
+
 class ObservationQuerySet(ApproximateCountQuerySet):
     """
     Custom QuerySet for the Observation model, providing helper methods for taxonomic queries.
@@ -324,6 +340,42 @@ def update_observation_data_files(sender, instance, action, reverse, *args, **kw
         instance.save()
 
 
+@receiver(m2m_changed, sender=Observation.data_files.through)
+def update_data_files_search_documents(sender, instance, action, reverse, pk_set, *args, **kwargs):
+    """
+    Signal handler to update the search documents of data files when observations are linked to or unlinked from them.
+    """
+    if reverse:
+        # instance is a DataFile
+        if action in ['post_add', 'post_remove', 'post_clear']:
+            update_search_documents_pks([instance.pk])
+    elif action == 'pre_clear':
+        instance._search_data_file_pks = list(
+            instance.data_files.all().values_list('pk', flat=True))
+    elif action == 'post_clear':
+        update_search_documents_pks(
+            getattr(instance, '_search_data_file_pks', []))
+    elif action in ['post_add', 'post_remove']:
+        update_search_documents_pks(pk_set)
+
+
+@receiver(pre_delete, sender=Observation)
+def pre_delete_observation(sender, instance, **kwargs):
+    """
+    Signal handler to remember the data files of an observation before it is deleted, as their links are removed with it.
+    """
+    instance._search_data_file_pks = list(
+        instance.data_files.all().values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Observation)
+def post_delete_observation(sender, instance, **kwargs):
+    """
+    Signal handler to update the search documents of the data files of a deleted observation.
+    """
+    update_search_documents_pks(getattr(instance, '_search_data_file_pks', []))
+
+
 @receiver(post_delete, sender=Observation)
 def check_human_delete(sender, instance, **kwargs):
     """
@@ -340,3 +392,13 @@ def check_human_save(sender, instance, created, **kwargs):
     """
     if instance.taxon.taxon_code == settings.HUMAN_TAXON_CODE:
         instance.check_data_files_human()
+
+
+@receiver(post_save, sender=Observation)
+def update_observation_search_documents(sender, instance, created, **kwargs):
+    """
+    Signal handler to update the search documents of an observation's data files, as its taxon may have changed.
+    New observations are handled when their data files are linked.
+    """
+    if not created:
+        update_search_documents(DataFile.objects.filter(observations=instance))
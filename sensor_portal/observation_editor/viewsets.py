@@ -11,6 +11,7 @@ from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from utils.viewsets import (AddOwnerViewSetMixIn, CheckAttachmentViewSetMixIn,
+                            KeysetPaginationViewSetMixIn,
                             OptionalPaginationViewSetMixIn)
 
 from .filtersets import ObservationFilter
@@ -91,7 +92,8 @@ obs_extra_parameters = [OpenApiParameter("target_taxon_level",
                                                   OpenApiParameter.PATH,
                                                   description="Database ID of deployment from which to get observations.")]),
 )
-class ObservationViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, OptionalPaginationViewSetMixIn):
+class ObservationViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, KeysetPaginationViewSetMixIn,
+                         OptionalPaginationViewSetMixIn):
     """
 
     A ViewSet for listing, creating, updating, and deleting observations. 
@@ -99,6 +101,8 @@ class ObservationViewSet(CheckAttachmentViewSetMixIn, AddOwnerViewSetMixIn, Opti
     """
     search_fields = ["taxon__species_name", "taxon__species_common_name"]
     ordering_fields = ["obs_dt", "created_on"]
+    # Observations are created in primary key order
+    keyset_ordering = ["-pk"]
     queryset = Observation.objects.all().prefetch_related("taxon")
     serializer_class = ObservationSerializer
     filter_backend = viewsets.ModelViewSet.filter_backends
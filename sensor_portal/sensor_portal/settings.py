@@ -350,6 +350,14 @@ CELERY_BEAT_SCHEDULE = {
         "task": "data_models.tasks.clean_all_files",
         "schedule": crontab(hour="1", minute="0"),
     },
+    "sweep_tar_retrievals": {
+        "task": "archiving.tasks.sweep_tar_retrievals_task",
+        "schedule": crontab(minute="*/15"),
+    },
+    "parse_report_files": {
+        "task": "data_models.tasks.parse_report_files_task",
+        "schedule": crontab(minute="*/15"),
+    },
 }
 
 if not DEVMODE:
@@ -371,6 +379,10 @@ DATA_HANDLERS = DataTypeHandlerCollection()
 
 ONLY_SUPER_UNARCHIVE = False
 
+# Maximum number of threads used by a data handler to extract metadata from a batch of uploaded files.
+# Data handlers can opt out of concurrent handling by setting concurrent_handling to False.
+DATA_HANDLER_MAX_WORKERS = int(os.environ.get("DATA_HANDLER_MAX_WORKERS", 4))
+
 # Maximum number of files that can be submitted to a job through the start_job API endpoint.
 MAX_JOB_SIZE = 5000
 
@@ -380,6 +392,19 @@ MIN_ARCHIVE_SIZE_GB = 1
 # Maximum TAR size in GB when archiving.
 MAX_ARCHIVE_SIZE_GB = 10
 
+# Seconds to wait before retrieving files from a TAR, so that requests for the same TAR can be combined.
+ARCHIVE_RETRIEVAL_WINDOW = 60
+
+# Seconds after which a TAR retrieval which has not started is started again, such as if its task was lost.
+ARCHIVE_RETRIEVAL_PENDING_TIMEOUT = 60 * 60
+
+# Seconds after which a running TAR retrieval which has not finished is marked as failed.
+# Should allow for TARs being staged from tape, and for waiting for a concurrency slot.
+ARCHIVE_RETRIEVAL_RUNNING_TIMEOUT = 60 * 60 * 24 * 2
+
+# Days for which finished TAR retrievals and retrieval requests are kept.
+ARCHIVE_RETRIEVAL_KEEP_DAYS = 7
+
 if DEVMODE:
     # Smaller values for testing
     MIN_ARCHIVE_SIZE_GB = 0.01
@@ -391,6 +416,42 @@ HUMAN_TAXON_CODE = "2436436"
 # path in FILE_STORAGE_ROOT where data packages will be saved
 PACKAGE_PATH = "data_packages"
 
+# path in FILE_STORAGE_ROOT where asynchronously ingested uploads are staged
+INGEST_STAGING_PATH = "ingest_staging"
+
+# Number of staged files passed to create_file_objects at once when ingesting asynchronously
+INGEST_CHUNK_SIZE = 200
+
+# path in FILE_STORAGE_ROOT where uploaded files are streamed before being moved into place.
+# Must be on the same filesystem as the rest of FILE_STORAGE_ROOT so that files can be renamed.
+UPLOAD_STAGING_PATH = "upload_staging"
+
+# Seconds for which the checksum state of an unfinished multipart upload is kept between chunks.
+# Uploads resumed after this are hashed again once complete.
+MULTIPART_MD5_STATE_TIMEOUT = 60 * 60 * 24 * 2
+
+# Seconds before a device's index of original file names is rebuilt from the database
+ORIGINAL_NAME_INDEX_TIMEOUT = 60 * 60 * 24
+
+# Seconds for which DataFile queryset counts are cached, unless invalidated earlier by changes to their files
+FILE_COUNT_CACHE_TIMEOUT = 60
+
+# Number of objects passed to each call of a chunked generic job, when it is run over a stored job selection
+JOB_SELECTION_CHUNK_SIZE = 1000
+
+# Maximum number of simultaneous instances of tasks limited with limit_concurrency, by task name.
+# Overrides the default limit given to the decorator.
+TASK_CONCURRENCY_LIMITS = {
+    "archiving.tasks.get_files_from_archived_tar_task": 4,
+}
+
+# Seconds before the concurrency slot of a task which stops renewing it, such as on a crashed worker, is freed.
+TASK_SEMAPHORE_LEASE = 60
+
+# Seconds after its last attempt before a task waiting for a concurrency slot is removed from the queue.
+# Should be longer than the maximum retry backoff of limited tasks.
+TASK_SEMAPHORE_QUEUE_TIMEOUT = 2 * 60 * 60
+
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST')
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Callable, Iterable, Optional, Tuple
+
+from django.db.models import Count, Max, QuerySet
+from django.http import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+logger = logging.getLogger(__name__)
+
+
+def make_validators(scope: Tuple[Any, ...], last_modified: Optional[datetime],
+                    n_objects: int) -> Tuple[str, Optional[int]]:
+    """
+    Build the ETag and Last-Modified validators of a response.
+
+    Args:
+        scope (Tuple[Any, ...]): Anything else that changes the response, such as the user and request path.
+        last_modified (datetime, optional): Latest modification time of the objects in the response.
+        n_objects (int): Number of objects in the response, so that deletions also change the ETag.
+
+    Returns:
+        Tuple[str, Optional[int]]: Quoted ETag, and the Last-Modified time as a timestamp.
+    """
+    etag_base = ":".join(str(x) for x in scope + (last_modified, n_objects))
+    etag = quote_etag(hashlib.md5(etag_base.encode()).hexdigest())
+    last_modified_ts = int(last_modified.timestamp()) \
+        if last_modified is not None else None
+    return etag, last_modified_ts
+
+
+def queryset_validators(queryset: QuerySet, scope: Tuple[Any, ...],
+                        related_fields: Iterable[str] = ()) -> Tuple[str, Optional[int]]:
+    """
+    Build the ETag and Last-Modified validators of a response from the queryset it is serialized from.
+    Uses a single aggregate query over modified_on, so the queryset is not evaluated.
+
+    Args:
+        queryset (QuerySet): Filtered queryset of a model with a modified_on field.
+        scope (Tuple[Any, ...]): Anything else that changes the response, such as the user and request path.
+        related_fields (Iterable[str], optional): modified_on lookups of related objects which are also
+            serialized, such as 'device__modified_on'. Defaults to ().
+
+    Returns:
+        Tuple[str, Optional[int]]: Quoted ETag, and the Last-Modified time as a timestamp.
+    """
+    related_fields = list(related_fields)
+    aggregates = queryset.order_by().aggregate(
+        Max('modified_on'), *[Max(x) for x in related_fields], n_objects=Count('pk', distinct=True))
+    modified_times = [aggregates[f"{x}__max"]
+                      for x in ['modified_on'] + related_fields]
+    last_modified = max([x for x in modified_times if x is not None], default=None)
+    return make_validators(scope + tuple(modified_times), last_modified, aggregates['n_objects'])
+
+
+def conditional_response(request: Any, etag: str, last_modified: Optional[int],
+                         get_response: Callable[[], HttpResponseBase]) -> HttpResponseBase:
+    """
+    Return 304 Not Modified if the request's If-None-Match or If-Modified-Since headers match the validators,
+    otherwise build the response with get_response. The validators are added to the response either way.
+
+    As deleting an object does not change the latest modification time, If-None-Match is preferred,
+    and If-Modified-Since is only checked if it is not sent.
+
+    Args:
+        request (Request): Request being responded to.
+        etag (str): Quoted ETag of the response.
+        last_modified (int, optional): Last-Modified time of the response as a timestamp.
+        get_response (Callable[[], HttpResponseBase]): Function building the full response.
+
+    Returns:
+        HttpResponseBase: 304 response, or the full response.
+    """
+    response = get_conditional_response(
+        request._request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = get_response()
+    else:
+        logger.debug(f"Not modified: {request.path}")
+
+    if 200 <= response.status_code < 300 or response.status_code == 304:
+        response.headers['ETag'] = etag
+        if last_modified is not None:
+            response.headers['Last-Modified'] = http_date(last_modified)
+        # Clients should always revalidate, and only the requesting user's client may store the response
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,85 @@
+import csv
+import json
+from typing import Any, Generator, List
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {"csv": "text/csv",
+                  "ndjson": "application/x-ndjson"}
+
+
+class ExportJSONEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder which falls back to the string representation of values such as time zones.
+    """
+
+    def default(self, o: Any) -> Any:
+        try:
+            return super().default(o)
+        except TypeError:
+            return str(o)
+
+
+class Echo():
+    """
+    File-like object which returns what is written to it, so that csv.writer rows can be streamed.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def iterate_export_rows(
+    queryset: QuerySet,
+    fields: List[str],
+    export_format: str,
+    chunk_size: int = 2000
+) -> Generator[str, None, None]:
+    """
+    Yield the rows of a queryset as CSV or NDJSON lines, reading them from the database in chunks.
+
+    Args:
+        queryset (QuerySet): Queryset to export.
+        fields (List[str]): Fields to export, as passed to `values()`.
+        export_format (str): 'csv' or 'ndjson'.
+        chunk_size (int, optional): Number of rows fetched from the database at a time. Defaults to 2000.
+
+    Yields:
+        str: Line of the export.
+    """
+    rows = queryset.prefetch_related(None).values(
+        *fields).iterator(chunk_size=chunk_size)
+    if export_format == "csv":
+        writer = csv.writer(Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([row[x] for x in fields])
+    else:
+        for row in rows:
+            yield json.dumps(row, cls=ExportJSONEncoder) + "\n"
+
+
+def stream_export(
+    queryset: QuerySet,
+    fields: List[str],
+    export_format: str,
+    file_name: str
+) -> StreamingHttpResponse:
+    """
+    Stream a queryset as a CSV or NDJSON attachment, with memory use independent of the number of rows.
+
+    Args:
+        queryset (QuerySet): Queryset to export.
+        fields (List[str]): Fields to export, as passed to `values()`.
+        export_format (str): 'csv' or 'ndjson'.
+        file_name (str): Name of the attachment, without extension.
+
+    Returns:
+        StreamingHttpResponse: Response streaming the export.
+    """
+    response = StreamingHttpResponse(iterate_export_rows(queryset, fields, export_format),
+                                     content_type=EXPORT_FORMATS[export_format])
+    response["Content-Disposition"] = f'attachment; filename="{file_name}.{export_format}"'
+    return response
@@ -1,8 +1,11 @@
+import ctypes
+import ctypes.util
 import hashlib
 import logging
 import os
+import struct
 import subprocess
-from typing import Any, Generator, Iterable
+from typing import Any, Generator, Iterable, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -81,6 +84,170 @@ def get_md5(file_path: str) -> str:
     return hash_md5.hexdigest()
 
 
+class _MD5Context(ctypes.Structure):
+    """
+    MD5_CTX as declared in OpenSSL's public md5.h.
+    """
+    _fields_ = [("A", ctypes.c_uint), ("B", ctypes.c_uint), ("C", ctypes.c_uint), ("D", ctypes.c_uint),
+                ("Nl", ctypes.c_uint), ("Nh", ctypes.c_uint),
+                ("data", ctypes.c_uint * 16), ("num", ctypes.c_uint)]
+
+
+class ResumableMD5():
+    """
+    MD5 hash whose internal state can be saved and restored.
+
+    hashlib hash objects cannot be serialised, so a hash computed across several requests
+    (such as the chunks of a multipart upload) would otherwise need the whole file to be re-read.
+    This hashes with OpenSSL's MD5 functions through ctypes, and saves the state defined by MD5 itself
+    (the four chaining values, the length hashed so far and any unhashed bytes), rather than OpenSSL's
+    memory layout, so that saved states can be resumed with another libcrypto build.
+    Check `ResumableMD5.is_available()` before use, as this relies on libcrypto providing MD5_Init,
+    MD5_Update and MD5_Final, which are missing from some builds (such as FIPS builds).
+    """
+    # Chaining values and bit length, followed by the unhashed bytes
+    _STATE_HEADER = struct.Struct("<4IQ")
+    _libcrypto = None
+    _loaded = False
+
+    @classmethod
+    def _load_libcrypto(cls) -> Optional[ctypes.CDLL]:
+        if not cls._loaded:
+            cls._loaded = True
+            try:
+                libcrypto = ctypes.CDLL(ctypes.util.find_library('crypto'))
+                context_pointer = ctypes.POINTER(_MD5Context)
+                libcrypto.MD5_Init.argtypes = [context_pointer]
+                libcrypto.MD5_Update.argtypes = [
+                    context_pointer, ctypes.c_char_p, ctypes.c_size_t]
+                libcrypto.MD5_Final.argtypes = [
+                    ctypes.c_char_p, context_pointer]
+                cls._libcrypto = libcrypto
+                if not cls._check_libcrypto():
+                    cls._libcrypto = None
+                    logger.warning("Resumable MD5 unavailable: libcrypto MD5 does not match hashlib")
+            except (OSError, AttributeError, TypeError, ValueError) as e:
+                cls._libcrypto = None
+                logger.warning(f"Resumable MD5 unavailable: {repr(e)}")
+        return cls._libcrypto
+
+    @classmethod
+    def _check_libcrypto(cls) -> bool:
+        """
+        Check that a hash saved and resumed part way through a block matches hashlib.
+
+        Returns:
+            bool: True if the hashes match.
+        """
+        data = bytes(range(256)) * 2
+        hasher = cls()
+        hasher.update(data[:100])
+        hasher = cls(hasher.get_state())
+        hasher.update(data[100:])
+        return hasher.hexdigest() == hashlib.md5(data).hexdigest()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """
+        Check whether resumable hashing is supported on this system.
+
+        Returns:
+            bool: True if libcrypto could be loaded.
+        """
+        return cls._load_libcrypto() is not None
+
+    def __init__(self, state: Optional[bytes] = None) -> None:
+        """
+        Start a new hash, or continue one from a saved state.
+
+        Args:
+            state (bytes, optional): State previously returned by `get_state`. Defaults to None.
+
+        Raises:
+            ValueError: If the state is not valid.
+        """
+        libcrypto = self._load_libcrypto()
+        if libcrypto is None:
+            raise RuntimeError("libcrypto is not available")
+        self._ctx = _MD5Context()
+        if not libcrypto.MD5_Init(ctypes.byref(self._ctx)):
+            raise RuntimeError("MD5_Init failed")
+        if state is not None:
+            if len(state) < self._STATE_HEADER.size:
+                raise ValueError("Invalid MD5 state")
+            a, b, c, d, n_bits = self._STATE_HEADER.unpack_from(state)
+            unhashed = state[self._STATE_HEADER.size:]
+            if len(unhashed) >= 64 or n_bits % 8 or (n_bits // 8) % 64 != len(unhashed):
+                raise ValueError("Invalid MD5 state")
+            self._ctx.A, self._ctx.B, self._ctx.C, self._ctx.D = a, b, c, d
+            self._ctx.Nl = n_bits & 0xffffffff
+            self._ctx.Nh = n_bits >> 32
+            ctypes.memmove(self._ctx.data, unhashed, len(unhashed))
+            self._ctx.num = len(unhashed)
+
+    def update(self, data: bytes) -> None:
+        """
+        Add data to the hash.
+
+        Args:
+            data (bytes): Data to hash.
+        """
+        self._libcrypto.MD5_Update(ctypes.byref(self._ctx), data, len(data))
+
+    def get_state(self) -> bytes:
+        """
+        Get the current state of the hash so that it can be resumed later.
+
+        Returns:
+            bytes: Chaining values and bit length as little endian integers, followed by the unhashed bytes.
+        """
+        n_bits = (self._ctx.Nh << 32) | self._ctx.Nl
+        unhashed = ctypes.string_at(self._ctx.data, self._ctx.num)
+        return self._STATE_HEADER.pack(self._ctx.A, self._ctx.B, self._ctx.C, self._ctx.D, n_bits) + unhashed
+
+    def hexdigest(self) -> str:
+        """
+        Get the MD5 hash of all data so far. The hash can still be updated afterwards.
+
+        Returns:
+            str: MD5 hash.
+        """
+        ctx = _MD5Context.from_buffer_copy(self._ctx)
+        digest = ctypes.create_string_buffer(16)
+        self._libcrypto.MD5_Final(digest, ctypes.byref(ctx))
+        return digest.raw.hex()
+
+
+class HashingReader():
+    """
+    File wrapper that hashes everything read through it, so that a file can be checksummed
+    while it is copied elsewhere (such as into a TAR) without being read twice.
+    """
+
+    def __init__(self, file_object: Any, hash_object: Optional[Any] = None) -> None:
+        """
+        Args:
+            file_object (Any): Binary file object to read from.
+            hash_object (Any, optional): hashlib hash to update. Defaults to a new MD5 hash.
+        """
+        self.file_object = file_object
+        self.hash_object = hash_object if hash_object is not None else hashlib.md5()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.file_object.read(size)
+        self.hash_object.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        """
+        Get the hash of the data read so far.
+
+        Returns:
+            str: Hex digest of the hash.
+        """
+        return self.hash_object.hexdigest()
+
+
 def divide_chunks(list_to_chunk: list[Any], chunk_size: int) -> Generator[list[Any], None, None]:
     """
     Yield successive chunk_size-sized chunks from list_to_chunk.
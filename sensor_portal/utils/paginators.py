@@ -1,7 +1,22 @@
+import binascii
+import datetime
+import json
+import uuid
+from base64 import b64decode, b64encode
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist
 from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import OperationalError, connection, transaction
+from django.db.models import F, Q
 from django.utils.functional import cached_property
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
 class LargeTablePaginator(Paginator):
@@ -53,3 +68,198 @@ class VariablePagePaginator(PageNumberPagination):
     django_paginator_class = LargeTablePaginator
     page_size_query_param = 'page_size'
     max_page_size = 50
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on the values of the ordering fields of the last object of a page, rather than an OFFSET.
+    Every page costs the same as the first, and no count is required.
+
+    The ordering is taken from the OrderingFilter if the request sets one, otherwise from the view's
+    `keyset_ordering`. The primary key is always added as a final ordering field so that objects with equal
+    values are not skipped or repeated. NULLs are ordered as by PostgreSQL (last when ascending, first when descending).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 50
+    default_ordering = ('-created_on',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        cursor = self.decode_cursor(request)
+        self.reverse = cursor is not None and cursor.get("reverse", False)
+        ordering = [self.invert(x)
+                    for x in self.ordering] if self.reverse else self.ordering
+
+        queryset = queryset.annotate(
+            **{f"keyset_{idx}": F(x.lstrip('-')) for idx, x in enumerate(ordering)}).order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(
+                self.get_after_query(queryset.model, ordering, cursor["values"]))
+
+        # Fetch one extra object to find out if there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.next_values = self.previous_values = None
+        if len(results) > 0:
+            if has_more or self.reverse:
+                self.next_values = self.get_values(results[-1], ordering)
+            if (has_more and self.reverse) or (cursor is not None and not self.reverse):
+                self.previous_values = self.get_values(results[0], ordering)
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for filter_backend in getattr(view, 'filter_backends', []):
+            if issubclass(filter_backend, OrderingFilter):
+                # Ordering from the request, otherwise the view's default ordering
+                ordering = filter_backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = getattr(view, 'keyset_ordering', self.default_ordering)
+        # Primary key as a tie breaker, in the same direction as the last field
+        last_descending = len(ordering) > 0 and ordering[-1].startswith('-')
+        ordering = [x for x in ordering if x.lstrip('-') not in ('pk', 'id')]
+        return ordering + ['-pk' if last_descending else 'pk']
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f"-{field}"
+
+    @staticmethod
+    def get_values(obj, ordering):
+        return [getattr(obj, f"keyset_{idx}") for idx in range(len(ordering))]
+
+    @staticmethod
+    def is_nullable(model, field):
+        if field == 'pk':
+            return False
+        try:
+            return model._meta.get_field(field).null
+        except FieldDoesNotExist:
+            # Lookups across relations may be NULL through the join
+            return True
+
+    @classmethod
+    def get_after_query(cls, model, ordering, values):
+        """
+        Build a filter for objects which come after the given ordering values.
+
+        Args:
+            model (Model): Model being paginated.
+            ordering (list[str]): Ordering fields.
+            values (list): Value of each ordering field for the last object of the previous page.
+
+        Returns:
+            Q: Query matching objects after these values.
+        """
+        after_query = Q(pk__in=[])
+        equal_query = Q()
+        for field, value in zip(ordering, values):
+            descending = field.startswith('-')
+            field = field.lstrip('-')
+            if value is None:
+                # Ascending NULLs come last, descending NULLs come first
+                field_after = Q(pk__in=[]) if not descending else Q(
+                    **{f"{field}__isnull": False})
+                field_equal = Q(**{f"{field}__isnull": True})
+            else:
+                field_after = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+                if not descending and cls.is_nullable(model, field):
+                    field_after |= Q(**{f"{field}__isnull": True})
+                field_equal = Q(**{field: value})
+            after_query |= equal_query & field_after
+            equal_query &= field_equal
+        return after_query
+
+    @staticmethod
+    def encode_value(value):
+        """
+        Convert an ordering value to JSON, tagging types that JSON cannot represent.
+        Datetimes and times keep their microseconds, so that objects sharing a truncated value are not skipped.
+        """
+        for value_type, type_name in [(datetime.datetime, "datetime"), (datetime.date, "date"),
+                                      (datetime.time, "time")]:
+            if isinstance(value, value_type):
+                return {"type": type_name, "value": value.isoformat()}
+        if isinstance(value, Decimal):
+            return {"type": "decimal", "value": str(value)}
+        if isinstance(value, (uuid.UUID, datetime.timedelta)):
+            return DjangoJSONEncoder().default(value)
+        return value
+
+    @staticmethod
+    def decode_value(value):
+        """
+        Convert an ordering value from encode_value back to its type.
+        """
+        if not isinstance(value, dict):
+            return value
+        value_types = {"datetime": datetime.datetime.fromisoformat,
+                       "date": datetime.date.fromisoformat,
+                       "time": datetime.time.fromisoformat,
+                       "decimal": Decimal}
+        return value_types[value["type"]](value["value"])
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if len(cursor["values"]) != len(self.ordering):
+                raise ValueError("Cursor does not match ordering")
+            cursor["values"] = [self.decode_value(x) for x in cursor["values"]]
+            return cursor
+        except (TypeError, ValueError, KeyError, ArithmeticError, binascii.Error, UnicodeDecodeError):
+            raise NotFound("Invalid cursor")
+
+    def encode_cursor(self, values, reverse):
+        cursor = json.dumps({"values": [self.encode_value(x) for x in values], "reverse": reverse})
+        encoded = b64encode(cursor.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        return self.encode_cursor(self.next_values, False)
+
+    def get_previous_link(self):
+        if self.previous_values is None:
+            return None
+        return self.encode_cursor(self.previous_values, True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -1,27 +1,74 @@
+import functools
 import logging
-from typing import Any
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
 
-from sensor_portal.celery import app
+import redis
+from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+# Redis key prefix of task concurrency semaphores
+SEMAPHORE_KEY_PREFIX = "task_semaphore"
+
+# Remove expired leases, then take a slot if one is free, otherwise join the queue.
+# KEYS: holders (holder -> lease expiry), queue (holder -> first attempt), queue last seen (holder -> last attempt)
+# ARGV: holder, limit, now, lease expiry, queue timeout
+# Returns 0 if a slot was taken, otherwise the holder's 1-based position in the queue.
+ACQUIRE_SCRIPT = """
+local holder = ARGV[1]
+local limit = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local stale = redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now - tonumber(ARGV[5]))
+for _, member in ipairs(stale) do
+    redis.call('ZREM', KEYS[2], member)
+    redis.call('ZREM', KEYS[3], member)
+end
+if redis.call('ZSCORE', KEYS[1], holder) or redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], ARGV[4], holder)
+    redis.call('ZREM', KEYS[2], holder)
+    redis.call('ZREM', KEYS[3], holder)
+    return 0
+end
+redis.call('ZADD', KEYS[2], 'NX', now, holder)
+redis.call('ZADD', KEYS[3], now, holder)
+return redis.call('ZRANK', KEYS[2], holder) + 1
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def get_redis_client() -> redis.Redis:
+    """
+    Get a Redis client connected to the Celery broker.
+
+    Returns:
+        redis.Redis: Redis client.
+    """
+    return redis.Redis.from_url(settings.CELERY_BROKER_URL)
+
 
 class TooManyTasks(Exception):
     """
     Exception raised when too many instances of a specific task are running.
     """
 
-    def __init__(self, task: Any) -> None:
+    def __init__(self, task: Any, queue_position: Optional[int] = None) -> None:
         """
         Initialize the TooManyTasks exception.
 
         Args:
             task: The Celery task instance that triggered the exception.
+            queue_position (int, optional): Position of the task among those waiting for a slot. Defaults to None.
         """
         self.task_id: str = task.request.id
         self.task_name: str = task.name
         self.current_retries: int = task.request.retries
         self.max_retries: int = task.max_retries
+        self.queue_position: Optional[int] = queue_position
         super(TooManyTasks, self).__init__()
 
     def __str__(self) -> str:
@@ -33,28 +80,130 @@ class TooManyTasks(Exception):
         """
         return (
             f"{self.task_id} not run. Too many {self.task_name} tasks already running. "
+            f"Queue position {self.queue_position}. "
             f"Try {self.current_retries}/{self.max_retries}"
         )
 
 
-def check_simultaneous_tasks(task: Any, max_tasks: int) -> None:
+class TaskSemaphore:
+    """
+    Distributed semaphore limiting the number of simultaneous instances of a task.
+
+    Each running instance holds a lease in a Redis sorted set, scored by its expiry time and renewed by a heartbeat.
+    Leases of workers which crash are not renewed, and are removed once they expire.
+    Instances which cannot take a slot are queued in order of their first attempt, so that they can report their position.
     """
-    Check the number of currently running instances of a given task and
-    raise an exception if the number exceeds the allowed maximum.
+
+    def __init__(self, name: str, limit: int) -> None:
+        """
+        Args:
+            name (str): Name of the limited task.
+            limit (int): Maximum number of simultaneous instances.
+        """
+        self.name = name
+        self.limit = limit
+        self.holders_key = f"{SEMAPHORE_KEY_PREFIX}:{name}:holders"
+        self.queue_key = f"{SEMAPHORE_KEY_PREFIX}:{name}:queue"
+        self.queue_seen_key = f"{SEMAPHORE_KEY_PREFIX}:{name}:queue_seen"
+        self.client = get_redis_client()
+        self.acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def acquire(self, holder: str) -> int:
+        """
+        Try to take a slot, without waiting.
+
+        Args:
+            holder (str): Unique ID of the instance, such as its task ID.
+
+        Returns:
+            int: 0 if a slot was taken, otherwise the position of the instance in the queue.
+        """
+        now = time.time()
+        return int(self.acquire_script(
+            keys=[self.holders_key, self.queue_key, self.queue_seen_key],
+            args=[holder, self.limit, now, now + settings.TASK_SEMAPHORE_LEASE,
+                  settings.TASK_SEMAPHORE_QUEUE_TIMEOUT]))
+
+    def renew(self, holder: str) -> None:
+        """
+        Extend the lease of a slot that is held.
+
+        Args:
+            holder (str): Unique ID of the instance.
+        """
+        self.client.zadd(self.holders_key,
+                         {holder: time.time() + settings.TASK_SEMAPHORE_LEASE}, xx=True)
+
+    def release(self, holder: str) -> None:
+        """
+        Release a slot, and leave the queue.
+
+        Args:
+            holder (str): Unique ID of the instance.
+        """
+        pipeline = self.client.pipeline()
+        pipeline.zrem(self.holders_key, holder)
+        pipeline.zrem(self.queue_key, holder)
+        pipeline.zrem(self.queue_seen_key, holder)
+        pipeline.execute()
+
+    @contextmanager
+    def heartbeat(self, holder: str) -> Iterator[None]:
+        """
+        Renew the lease of a slot from a background thread while the context is open.
+
+        Args:
+            holder (str): Unique ID of the instance.
+        """
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(settings.TASK_SEMAPHORE_LEASE / 3):
+                try:
+                    self.renew(holder)
+                except redis.RedisError as e:
+                    logger.warning(f"{self.name}: could not renew lease of {holder}: {e}")
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+
+def limit_concurrency(max_tasks: int) -> Callable:
+    """
+    Decorator limiting the number of simultaneous instances of a bound Celery task across all workers.
+    The limit can be overridden per task name in settings.TASK_CONCURRENCY_LIMITS.
+
+    If no slot is free, TooManyTasks is raised, so the task should include it in autoretry_for.
+    Must be applied below the task decorator, so that the exception is raised inside the task.
 
     Args:
-        task: The Celery task instance to check for.
-        max_tasks: The maximum allowed number of simultaneous task instances.
-
-    Raises:
-        TooManyTasks: If the maximum number of simultaneous tasks is exceeded.
-    """
-    active_tasks = app.control.inspect().active()
-    all_tasks = []
-    for worker, running_tasks in active_tasks.items():
-        for running_task in running_tasks:
-            if (task.name in running_task["name"] and running_task["id"] != task.request.id):
-                all_tasks.append(task)
-    logger.info(f"{len(all_tasks)} running")
-    if len(all_tasks) + 1 > max_tasks:
-        raise TooManyTasks(task)
+        max_tasks (int): Default maximum number of simultaneous instances.
+
+    Returns:
+        Callable: Decorator.
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(task: Any, *args: Any, **kwargs: Any) -> Any:
+            limit = settings.TASK_CONCURRENCY_LIMITS.get(task.name, max_tasks)
+            semaphore = TaskSemaphore(task.name, limit)
+            # Task ID is kept across retries, so the task keeps its place in the queue
+            holder = task.request.id or str(uuid.uuid4())
+
+            queue_position = semaphore.acquire(holder)
+            if queue_position > 0:
+                logger.info(f"{holder}: {task.name} queued at position {queue_position}")
+                raise TooManyTasks(task, queue_position)
+
+            try:
+                with semaphore.heartbeat(holder):
+                    return func(task, *args, **kwargs)
+            finally:
+                semaphore.release(holder)
+        return wrapper
+    return decorator
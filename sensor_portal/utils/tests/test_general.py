@@ -0,0 +1,21 @@
+import hashlib
+
+import pytest
+from utils.general import ResumableMD5
+
+
+@pytest.mark.skipif(not ResumableMD5.is_available(), reason="libcrypto MD5 is not available")
+def test_resumable_md5_state():
+    """
+    Test: Does a hash resumed from saved states match hashlib, including states saved part way through a block?
+    """
+    data = bytes(range(256)) * 40
+    hasher = ResumableMD5()
+    for start in range(0, len(data), 1000):
+        hasher = ResumableMD5(hasher.get_state())
+        hasher.update(data[start:start + 1000])
+        # The hash can be continued after getting the digest
+        assert hasher.hexdigest() == hashlib.md5(data[:start + 1000]).hexdigest()
+
+    with pytest.raises(ValueError):
+        ResumableMD5(hasher.get_state() + b"0")
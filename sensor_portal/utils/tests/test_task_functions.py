@@ -0,0 +1,80 @@
+import time
+import uuid
+
+import pytest
+from utils.task_functions import TaskSemaphore
+
+
+@pytest.fixture
+def semaphore():
+    """
+    Semaphore with a limit of 2 and a unique name, whose keys are removed afterwards.
+    """
+    new_semaphore = TaskSemaphore(f"test_{uuid.uuid4()}", 2)
+    yield new_semaphore
+    new_semaphore.client.delete(new_semaphore.holders_key, new_semaphore.queue_key,
+                                new_semaphore.queue_seen_key)
+
+
+def test_task_semaphore_acquire_release(semaphore):
+    """
+    Test: Are slots taken up to the limit, are later instances queued in order of their first attempt,
+    and does releasing a slot let the first queued instance take it?
+    """
+    assert semaphore.acquire("holder_1") == 0
+    assert semaphore.acquire("holder_2") == 0
+    # Holders keep their slot when they try again
+    assert semaphore.acquire("holder_1") == 0
+
+    assert semaphore.acquire("holder_3") == 1
+    assert semaphore.acquire("holder_4") == 2
+    # Queued instances keep their position when they try again
+    assert semaphore.acquire("holder_4") == 2
+    assert semaphore.acquire("holder_3") == 1
+
+    semaphore.release("holder_1")
+    assert semaphore.acquire("holder_3") == 0
+    assert semaphore.acquire("holder_4") == 1
+
+    # Leaving the queue moves later instances up
+    assert semaphore.acquire("holder_5") == 2
+    semaphore.release("holder_4")
+    assert semaphore.acquire("holder_5") == 1
+
+
+def test_task_semaphore_lease_expiry(semaphore, settings):
+    """
+    Test: Is the slot of an instance that stops renewing its lease freed once the lease expires,
+    and does the heartbeat keep a lease from expiring?
+    """
+    settings.TASK_SEMAPHORE_LEASE = 0.5
+
+    assert semaphore.acquire("holder_1") == 0
+    assert semaphore.acquire("holder_2") == 0
+    assert semaphore.acquire("holder_3") == 1
+
+    with semaphore.heartbeat("holder_2"):
+        time.sleep(1)
+        # holder_1 has not renewed its lease, so its slot is free
+        assert semaphore.acquire("holder_3") == 0
+        assert semaphore.acquire("holder_4") == 1
+    assert semaphore.client.zscore(semaphore.holders_key, "holder_1") is None
+    assert semaphore.client.zscore(semaphore.holders_key, "holder_2") is not None
+
+
+def test_task_semaphore_queue_timeout(semaphore, settings):
+    """
+    Test: Are queued instances which stop trying to take a slot removed from the queue?
+    """
+    settings.TASK_SEMAPHORE_QUEUE_TIMEOUT = 60
+
+    assert semaphore.acquire("holder_1") == 0
+    assert semaphore.acquire("holder_2") == 0
+    assert semaphore.acquire("holder_3") == 1
+    assert semaphore.acquire("holder_4") == 2
+
+    # holder_3 last tried longer ago than the queue timeout
+    semaphore.client.zadd(semaphore.queue_seen_key,
+                          {"holder_3": time.time() - 61})
+    assert semaphore.acquire("holder_4") == 1
+    assert semaphore.client.zscore(semaphore.queue_key, "holder_3") is None
@@ -1,8 +1,16 @@
 import logging
 
 from django.conf import settings
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from .conditional_functions import (conditional_response, make_validators,
+                                    queryset_validators)
+from .export_functions import EXPORT_FORMATS, stream_export
+from .paginators import KeysetPagination
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,6 +31,87 @@ class OptionalPaginationViewSetMixIn(ModelViewSet):
         return super().paginate_queryset(queryset)
 
 
+class KeysetPaginationViewSetMixIn(ModelViewSet):
+    """Use KeysetPagination instead of the default paginator if the request sets 'pagination=cursor'
+    or passes a cursor. Results are ordered by the requested ordering, otherwise by keyset_ordering.
+    Actions with pagination disabled are left unpaginated."""
+    keyset_ordering = ['-created_on']
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.pagination_class is not None and \
+                    (self.request.query_params.get('pagination') == 'cursor'
+                     or KeysetPagination.cursor_query_param in self.request.query_params):
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
+    def paginate_queryset(self, queryset):
+        if isinstance(self.paginator, KeysetPagination):
+            # Always paginate, as pages are cheap
+            return self.paginator.paginate_queryset(queryset, self.request, view=self)
+        return super().paginate_queryset(queryset)
+
+
+class ExportViewSetMixIn(ModelViewSet):
+    """Adds an 'export' action, which streams the filtered queryset as CSV or NDJSON.
+    The same filters, search and permissions as the list action are applied.
+    export_fields should be overriden inside the inheriting viewset."""
+    export_fields = ['id']
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def export(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in EXPORT_FORMATS.keys():
+            return Response({"detail": f"export_format must be one of {', '.join(EXPORT_FORMATS.keys())}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        return stream_export(queryset, self.export_fields, export_format,
+                             queryset.model._meta.model_name)
+
+
+class ConditionalGetViewSetMixIn(ModelViewSet):
+    """Adds ETag and Last-Modified headers to list and retrieve responses, and returns 304 Not Modified
+    without serializing if the client's copy is current. Validators are built from the modified_on of
+    the filtered queryset or object and of the related objects in validator_related_fields, scoped to
+    the user and their superuser status, request path and renderer. Changes to many-to-many fields
+    must update modified_on of the object for the validators to change.
+    Other actions can use validate_queryset for the same behaviour.
+    validator_related_fields should be overriden inside the inheriting viewset."""
+    validator_related_fields = []
+
+    def get_validator_scope(self):
+        return (self.request.user.pk, self.request.user.is_superuser, self.request.get_full_path(),
+                self.request.accepted_renderer.format)
+
+    def validate_queryset(self, queryset, get_response, related_fields=()):
+        etag, last_modified = queryset_validators(
+            queryset, self.get_validator_scope(), related_fields)
+        return conditional_response(self.request, etag, last_modified, get_response)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.validate_queryset(queryset, lambda: super(ConditionalGetViewSetMixIn, self).list(
+            request, *args, **kwargs), self.validator_related_fields)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if self.validator_related_fields:
+            etag, last_modified = queryset_validators(
+                type(instance).objects.filter(pk=instance.pk), self.get_validator_scope(),
+                self.validator_related_fields)
+        else:
+            etag, last_modified = make_validators(
+                self.get_validator_scope(), instance.modified_on, 1)
+
+        def get_response():
+            serializer = self.get_serializer(instance)
+            return Response(serializer.data)
+        return conditional_response(request, etag, last_modified, get_response)
+
+
 class AddOwnerViewSetMixIn(ModelViewSet):
     def perform_create(self, serializer):
         logger.info("Add owner")